@@ -16,6 +16,18 @@ from api.utils.app_logger_standard import (
     get_error_logger,
     get_system_logger,
 )
+from api.utils.compression import compress_response, supported_encodings
+from api.utils.executors import start_process_executor
+from api.utils.jobs import start_job_runner
+from api.utils.json_provider import AFMJSONProvider, orjson
+from api.utils.profile_data import BINARY_PROFILE_HEADERS
+
+try:
+    # Only importable when running under uwsgi
+    import uwsgi
+    from uwsgidecorators import postfork
+except ImportError:
+    uwsgi = None
 
 
 def create_app():
@@ -28,12 +40,16 @@ def create_app():
     static_folder = "front-end" if os.path.exists("front-end") else None
     app = Flask(__name__, static_folder=static_folder, static_url_path="")
 
+    # Encode numpy/pandas values from measurement pickles natively
+    app.json = AFMJSONProvider(app)
+
     # Log application initialization
     system_logger.info(
         "AFM Data Platform Backend starting",
         extra={
             "mode": "production" if static_folder else "development",
             "static_folder": static_folder,
+            "json_backend": "orjson" if orjson is not None else "json",
         },
     )
 
@@ -45,6 +61,7 @@ def create_app():
         app,
         origins=allowed_origins,
         allow_headers=["Content-Type", "Authorization", "X-Requested-With", "Accept"],
+        expose_headers=BINARY_PROFILE_HEADERS,
         supports_credentials=True,
     )
 
@@ -99,6 +116,13 @@ def create_app():
 
         return response
 
+    # Compress JSON/text responses negotiated from Accept-Encoding
+    @app.after_request
+    def after_request_compress(response):
+        return compress_response(response)
+
+    system_logger.info("Response compression enabled", extra={"encodings": supported_encodings()})
+
     # Add error handler
     @app.errorhandler(Exception)
     def handle_error(error):
@@ -157,6 +181,12 @@ def run_dev_server():
             "Starting Flask development server",
             extra={"host": "127.0.0.1", "port": 5000, "debug": True},
         )
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            # Reloader child (the process serving requests): run background jobs
+            # in a runner forked before any request thread exists
+            start_job_runner()
+            # Fork the CPU pool now too, before the server starts its request threads
+            start_process_executor()
         application.run(debug=True)
     except OSError as error:
         error_logger.error(
@@ -178,3 +208,11 @@ application = create_app()
 
 # Register cleanup function
 atexit.register(cleanup_loggers)
+
+if uwsgi is not None:
+    @postfork
+    def start_worker_pools():
+        # Runs in each worker right after the fork, before its request threads start.
+        # Request workers only: the job runner mule forks job processes itself.
+        if uwsgi.mule_id() == 0:
+            start_process_executor()
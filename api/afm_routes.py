@@ -2,17 +2,58 @@
 AFM Data API Routes
 Handles AFM file data retrieval and profile data operations
 """
-import pickle
-from flask import Blueprint, jsonify, request
+from concurrent.futures import as_completed
+from flask import Blueprint, Response, current_app, jsonify, request
 from pathlib import Path
-from urllib.parse import unquote
+from urllib.parse import quote, unquote, urlencode
 from datetime import datetime
 from .utils.app_logger_standard import get_activity_logger
+from .utils.artifact_locator import artifact_locator
+from .utils.compression import enable_compressed_cache, get_cached_compressed_response
 from .utils.file_parser import (
     load_afm_file_list, 
+    get_file_list_cache_path,
     get_pickle_file_path_by_filename,
     get_profile_file_path_by_filename,
 )
+from .utils.executors import get_io_executor
+from .utils.http_cache import json_validators
+from .utils.json_stream import StreamedArray, iter_json
+from .utils.measurement_export import (
+    EXPORT_FORMATS,
+    EXPORT_SECTIONS,
+    iter_csv_export,
+    iter_measurement_records,
+    iter_parquet_export,
+    pa,
+    select_measurements,
+)
+from .utils.measurement_data import (
+    get_available_points,
+    iter_detail_record_chunks,
+    load_measurement_detail,
+    read_measurement_pickle,
+    site_info_for_point,
+    summary_to_records,
+)
+from .utils.profile_data import (
+    build_binary_profile_body,
+    build_typed_profile_payload,
+    profile_to_arrays,
+    read_profile_pickle,
+)
+from .utils.profile_downsampling import get_downsampled_profile
+from .utils.profile_leveling import leveling_summary, load_profile_arrays_leveled, parse_leveling
+from .utils.result_cache import file_signature
+
+# Smallest point budget accepted by ?max_points= (LTTB keeps both endpoints)
+MIN_PROFILE_POINTS = 3
+
+# Point budget per profile in a measurement bundle unless ?max_points= is given
+BUNDLE_DEFAULT_MAX_POINTS = 4096
+
+# Measurements per CSV/Parquet export
+MAX_EXPORT_MEASUREMENTS = 5000
 
 # Create AFM data blueprint
 afm_bp = Blueprint('afm', __name__)
@@ -45,6 +86,23 @@ def get_afm_files():
         tool_name = request.args.get('tool', 'MAP608')
         print(f"=== AFM Files API Called for tool: {tool_name} ===")
         
+        cache_path = get_file_list_cache_path(tool_name)
+        validators = None
+        if cache_path.exists():
+            # Answer revalidation from the parsed cache file's metadata alone
+            validators = json_validators(cache_path)
+            if validators.is_not_modified():
+                return validators.not_modified_response()
+            
+            # Serve the already-compressed catalog while the parsed cache file is unchanged
+            cache_key = ('catalog', str(cache_path), request.full_path)
+            signature = file_signature(cache_path)
+            cached_response = get_cached_compressed_response(cache_key, signature, current_app.response_class)
+            if cached_response is not None:
+                log_afm_access(action="list_files", tool=tool_name, cached=True)
+                return validators.apply(cached_response)
+            enable_compressed_cache(cache_key, signature)
+        
         # Load and parse the file list for the specified tool
         parsed_data = load_afm_file_list(tool_name)
         
@@ -62,13 +120,14 @@ def get_afm_files():
             print(f"Sample measurement data: {len(parsed_data[0])}")
             # print(f"  First item: {parsed_data[0]}")
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': parsed_data,
             'total': len(parsed_data),
             'tool': tool_name,
             'message': f'Successfully loaded {len(parsed_data)} AFM measurements for {tool_name}'
         })
+        return validators.apply(response) if validators else response
         
     except Exception as e:
         print(f"Error in get_afm_files: {e}")
@@ -84,6 +143,8 @@ def get_afm_file_detail(filename):
     """Get detailed AFM measurement data from pickle file for a specific tool"""
     try:
         tool_name = request.args.get('tool', 'MAP608')
+        # Stream the detail rows instead of building the whole response in memory
+        stream_requested = request.args.get('stream', 'false').lower() in ('1', 'true', 'yes')
         # URL decode the filename
         decoded_filename = unquote(filename)
         print(f"=== AFM Detail API Called for tool: {tool_name}, filename: '{decoded_filename}' ===")
@@ -99,70 +160,69 @@ def get_afm_file_detail(filename):
                 'tool': tool_name
             }), 404
         
-        # Load pickle file
+        # Answer revalidation from the pickle file's metadata without loading it
+        validators = json_validators(pickle_path)
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        if not stream_requested:
+            # Serve the already-compressed payload while the pickle file is unchanged
+            cache_key = ('detail', str(pickle_path), request.full_path)
+            signature = file_signature(pickle_path)
+            cached_response = get_cached_compressed_response(cache_key, signature, current_app.response_class)
+            if cached_response is not None:
+                log_afm_access(
+                    action="get_detail",
+                    tool=tool_name,
+                    filename=decoded_filename,
+                    pickle_file=pickle_path.name,
+                    cached=True
+                )
+                return validators.apply(cached_response)
+            enable_compressed_cache(cache_key, signature)
+        
+        # Load pickle file (concurrent requests for the same file share one load)
         print(f"Loading pickle file: {pickle_path}")
         
-        with open(pickle_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        # Extract measurement information from 'info' key (dict)
-        data_info = data.get('info', {})
-        
-        # Extract summary data and convert to records using pandas if available
-        data_summary = data.get('summary', {})
-        if hasattr(data_summary, 'to_dict'):
-            # It's a DataFrame
-            summary_records = data_summary.to_dict('records')
-        elif isinstance(data_summary, dict) and 'Site' in data_summary and 'ITEM' in data_summary:
-            # Dict with columnar data - convert to records
-            summary_records = []
-            num_rows = len(data_summary.get('Site', []))
-            for i in range(num_rows):
-                record = {}
-                for key, values in data_summary.items():
-                    if isinstance(values, list) and i < len(values):
-                        record[key] = values[i]
-                if record:
-                    summary_records.append(record)
-        elif isinstance(data_summary, list):
-            # Already in records format
-            summary_records = data_summary
-        else:
-            summary_records = []
-        
-        # Extract detailed data and convert to records
-        data_detail = data.get('data', {})
-        if hasattr(data_detail, 'to_dict'):
-            # It's a DataFrame
-            detail_records = data_detail.to_dict('records')
-        elif isinstance(data_detail, dict):
-            # Dict with measurement points as keys
-            detail_records = []
-            for point_key, point_data in data_detail.items():
-                if isinstance(point_data, dict) and any(isinstance(v, list) for v in point_data.values()):
-                    # Convert columnar data to records
-                    num_rows = max(len(v) for v in point_data.values() if isinstance(v, list))
-                    for i in range(num_rows):
-                        record = {'measurement_point': point_key}
-                        for key, values in point_data.items():
-                            if isinstance(values, list) and i < len(values):
-                                record[key] = values[i]
-                        detail_records.append(record)
-        elif isinstance(data_detail, list):
-            # Already in records format
-            detail_records = data_detail
-        else:
-            detail_records = []
-        
-        # Extract available measurement points
-        available_points = []
-        if isinstance(data_detail, dict):
-            # Get measurement points directly from data keys
-            available_points = sorted(list(data_detail.keys()))
-        elif summary_records:
-            # Extract unique sites from summary records
-            sites = {record.get('Site') for record in summary_records if 'Site' in record}
-            available_points = sorted(list(sites))
+        if stream_requested:
+            data = read_measurement_pickle(pickle_path)
+            data_info = data.get('info', {})
+            summary_records = summary_to_records(data.get('summary', {}))
+            data_detail = data.get('data', {})
+            available_points = get_available_points(data_detail, summary_records)
+            
+            # Encode detail rows chunk by chunk instead of building the full payload
+            print(f"Streaming detail records for: {pickle_path.name}")
+            log_afm_access(
+                action="get_detail",
+                tool=tool_name,
+                filename=decoded_filename,
+                pickle_file=pickle_path.name,
+                summary_count=len(summary_records),
+                available_points=available_points,
+                streamed=True
+            )
+            document = {
+                'success': True,
+                'data': {
+                    'filename': decoded_filename,
+                    'tool': tool_name,
+                    'pickle_filename': pickle_path.name,
+                    'information': data_info,
+                    'summary': summary_records,
+                    'available_points': available_points,
+                    'data': StreamedArray(iter_detail_record_chunks(data_detail)),
+                },
+                'message': f'Successfully loaded measurement data for {decoded_filename} from {tool_name}'
+            }
+            response = Response(iter_json(document, current_app.json.dumps), mimetype='application/json')
+            return validators.apply(response)
+        
+        detail = load_measurement_detail(pickle_path)
+        data_info = detail['information']
+        summary_records = detail['summary']
+        detail_records = detail['data']
+        available_points = detail['available_points']
 
         response_data = {
             'success': True,
@@ -199,7 +259,7 @@ def get_afm_file_detail(filename):
             available_points=available_points
         )
         
-        return jsonify(response_data)
+        return validators.apply(jsonify(response_data))
         
     except Exception as e:
         print(f"Error in get_afm_file_detail: {e}")
@@ -212,6 +272,38 @@ def get_afm_file_detail(filename):
         }), 500
 
 
+def _profile_arrays_data(x, y, z, profile_format):
+    """Build the JSON 'data' of a profile from X/Y/Z arrays ('points' or 'grid' format)"""
+    if profile_format == 'grid':
+        return build_typed_profile_payload(x, y, z)
+    return [{'x': xv, 'y': yv, 'z': zv} for xv, yv, zv in zip(x.tolist(), y.tolist(), z.tolist())]
+
+
+def _profile_arrays_response(x, y, z, profile_format, tool_name, message, downsampling=None, leveling=None):
+    """Build a profile response from X/Y/Z arrays in the requested format"""
+    if profile_format == 'binary':
+        body, headers = build_binary_profile_body(x, y, z)
+        if downsampling:
+            headers['X-Profile-Original-Count'] = str(downsampling['original_count'])
+        if leveling:
+            headers['X-Profile-Leveling'] = f"{leveling[0]}:{leveling[1]}"
+        return Response(body, mimetype='application/octet-stream', headers=headers)
+    
+    payload = {
+        'success': True,
+        'format': profile_format,
+        'data': _profile_arrays_data(x, y, z, profile_format),
+        'count': len(z),
+        'tool': tool_name,
+        'message': message
+    }
+    if downsampling:
+        payload['downsampling'] = downsampling
+    if leveling:
+        payload['leveling'] = leveling_summary(leveling)
+    return jsonify(payload)
+
+
 @afm_bp.route('/afm-files/profile/<path:filename>/<path:decoded_point_number>', methods=['GET'])
 def get_profile_data(filename, decoded_point_number):
     """Get profile data (x,y,z) from profile_dir for a specific measurement point"""
@@ -229,6 +321,42 @@ def get_profile_data(filename, decoded_point_number):
             'point_no': request.args.get('point_no')    # Will convert to int
         }
         
+        # Response format: 'points' (list of x/y/z dicts), 'grid' (typed JSON) or 'binary'
+        profile_format = request.args.get('format', 'points').lower()
+        if profile_format not in ('points', 'grid', 'binary'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid format',
+                'message': f"format must be one of: points, grid, binary (got '{profile_format}')",
+                'tool': tool_name
+            }), 400
+        
+        # Optional point budget: downsample the profile server-side
+        max_points = request.args.get('max_points')
+        if max_points is not None:
+            try:
+                max_points = int(max_points)
+            except ValueError:
+                max_points = 0
+            if max_points < MIN_PROFILE_POINTS:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid max_points',
+                    'message': f'max_points must be an integer >= {MIN_PROFILE_POINTS}',
+                    'tool': tool_name
+                }), 400
+        
+        # Optional tilt/bow removal: ?level=plane|polynomial|line (&order=)
+        try:
+            leveling = parse_leveling(request.args.get('level'), request.args.get('order'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid leveling',
+                'message': str(e),
+                'tool': tool_name
+            }), 400
+        
         # Only convert point_no to integer (for 4-digit formatting)
         if site_info['point_no']:
             try:
@@ -255,8 +383,10 @@ def get_profile_data(filename, decoded_point_number):
                 'tool': tool_name
             }), 404
         
-        # Check if file exists
-        if not profile_path.exists():
+        # Validators come from a single stat call, which also covers the existence check
+        try:
+            validators = json_validators(profile_path)
+        except FileNotFoundError:
             return jsonify({
                 'success': False,
                 'error': 'Profile file not accessible',
@@ -264,14 +394,88 @@ def get_profile_data(filename, decoded_point_number):
                 'tool': tool_name
             }), 404
         
+        # Answer revalidation from the profile file's metadata without loading it
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        # Serve the already-compressed payload while the profile file is unchanged
+        cache_key = ('profile', str(profile_path), request.full_path)
+        signature = file_signature(profile_path)
+        cached_response = get_cached_compressed_response(cache_key, signature, current_app.response_class)
+        if cached_response is not None:
+            return validators.apply(cached_response)
+        enable_compressed_cache(cache_key, signature)
+        
+        if max_points is not None:
+            # Downsampled profiles are cached per (file, max_points, leveling)
+            try:
+                downsampled = get_downsampled_profile(profile_path, max_points, leveling)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': 'Leveling failed',
+                    'message': str(e),
+                    'tool': tool_name
+                }), 400
+            if downsampled is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unsupported profile data format',
+                    'message': f'Profile data in {profile_path.name} has no X/Y/Z coordinates',
+                    'tool': tool_name
+                }), 400
+            print(f"Downsampled profile: {downsampled.summary()}")
+            message = f'Successfully loaded profile data for {decoded_filename}, point {decoded_point_number} from {tool_name}'
+            response = _profile_arrays_response(
+                downsampled.x, downsampled.y, downsampled.z, profile_format, tool_name, message,
+                downsampling=downsampled.summary(), leveling=leveling
+            )
+            return validators.apply(response)
+        
+        if leveling is not None:
+            # Leveled profiles are cached per (file, method, order)
+            try:
+                arrays = load_profile_arrays_leveled(profile_path, leveling)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': 'Leveling failed',
+                    'message': str(e),
+                    'tool': tool_name
+                }), 400
+            if arrays is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unsupported profile data format',
+                    'message': f'Profile data in {profile_path.name} has no X/Y/Z coordinates',
+                    'tool': tool_name
+                }), 400
+            message = f'Successfully loaded profile data for {decoded_filename}, point {decoded_point_number} from {tool_name}'
+            response = _profile_arrays_response(*arrays, profile_format, tool_name, message, leveling=leveling)
+            return validators.apply(response)
+        
         # Load profile data from pickle file
         try:
-            with open(profile_path, 'rb') as f:
-                profile_data = pickle.load(f)
+            # Concurrent requests for the same profile file share one read
+            profile_data = read_profile_pickle(profile_path)
             
             print(f"Profile data type: {type(profile_data)}")
             print(f"Profile data structure: {profile_data if isinstance(profile_data, dict) and len(str(profile_data)) < 500 else 'Too large to display'}")
             
+            if profile_format in ('grid', 'binary'):
+                # Typed payload: regular grids are sent as origin/spacing/shape plus float32 Z
+                arrays = profile_to_arrays(profile_data)
+                if arrays is None:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Unsupported profile data format',
+                        'message': f'Profile data in {profile_path.name} has no X/Y/Z coordinates',
+                        'tool': tool_name
+                    }), 400
+                message = f'Successfully loaded profile data for {decoded_filename}, point {decoded_point_number} from {tool_name}'
+                response = _profile_arrays_response(*arrays, profile_format, tool_name, message)
+                return validators.apply(response)
+            
             # Handle different profile data formats
             if isinstance(profile_data, list):
                 # Already in the expected format
@@ -349,13 +553,13 @@ def get_profile_data(filename, decoded_point_number):
             if final_profile_data:
                 print(f"Sample profile data point: {final_profile_data[0]}")
             
-            return jsonify({
+            return validators.apply(jsonify({
                 'success': True,
                 'data': final_profile_data,
                 'count': len(final_profile_data),
                 'tool': tool_name,
                 'message': f'Successfully loaded profile data for {decoded_filename}, point {decoded_point_number} from {tool_name}'
-            })
+            }))
             
         except Exception as e:
             print(f"Error loading profile pickle file: {e}")
@@ -374,4 +578,259 @@ def get_profile_data(filename, decoded_point_number):
             'success': False,
             'error': str(e),
             'message': f'Failed to get profile data for {decoded_filename}, point {decoded_point_number}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+def _image_file_url(decoded_filename, measurement_point, tool_name, site_info):
+    """URL of the image-file route for a measurement point, with the site info it resolves by"""
+    query = {'tool': tool_name}
+    query.update({key: value for key, value in site_info.items() if value is not None})
+    return (f"/api/afm-files/image-file/{quote(decoded_filename, safe='')}"
+            f"/{quote(str(measurement_point), safe='')}?{urlencode(query)}")
+
+
+def _load_bundle_point(decoded_filename, measurement_point, site_info, tool_name, max_points, profile_format, leveling):
+    """Resolve and load the profile and image of one measurement point (runs on the I/O pool)"""
+    entry = {'point': measurement_point, 'site_info': site_info, 'profile': None, 'image': None}
+    try:
+        profile_path, _ = artifact_locator.find('profile', decoded_filename, measurement_point, tool_name, site_info)
+        if profile_path is not None:
+            downsampled = get_downsampled_profile(profile_path, max_points, leveling)
+            if downsampled is not None:
+                entry['profile'] = {
+                    'filename': profile_path.name,
+                    'format': profile_format,
+                    'data': _profile_arrays_data(downsampled.x, downsampled.y, downsampled.z, profile_format),
+                    'count': len(downsampled.z),
+                    'downsampling': downsampled.summary(),
+                    'leveling': leveling_summary(leveling) if leveling else None,
+                }
+        
+        image_path, _ = artifact_locator.find('tiff', decoded_filename, measurement_point, tool_name, site_info)
+        if image_path is not None:
+            entry['image'] = {
+                'filename': image_path.name,
+                'url': _image_file_url(decoded_filename, measurement_point, tool_name, site_info),
+            }
+    except Exception as e:
+        # One unreadable point should not fail the whole bundle
+        print(f"Error loading bundle point {measurement_point}: {e}")
+        entry['error'] = str(e)
+    return entry
+
+
+@afm_bp.route('/afm-files/bundle/<path:filename>', methods=['GET'])
+def get_measurement_bundle(filename):
+    """
+    Get measurement detail plus every point's profile and image URL in one request
+
+    Profiles are leveled (?level=), downsampled to ?max_points= (default
+    BUNDLE_DEFAULT_MAX_POINTS) and loaded concurrently on the I/O thread pool. ?stream=ndjson sends one JSON line for
+    the measurement and then one per point as soon as it is loaded.
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        decoded_filename = unquote(filename)
+        stream_requested = request.args.get('stream', '').lower() == 'ndjson'
+        print(f"=== AFM Bundle API Called for tool: {tool_name}, filename: '{decoded_filename}' ===")
+        
+        # Profile format inside the bundle: 'points' (list of x/y/z dicts) or 'grid' (typed JSON)
+        profile_format = request.args.get('format', 'points').lower()
+        if profile_format not in ('points', 'grid'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid format',
+                'message': f"format must be one of: points, grid (got '{profile_format}')",
+                'tool': tool_name
+            }), 400
+        
+        try:
+            max_points = int(request.args.get('max_points', BUNDLE_DEFAULT_MAX_POINTS))
+        except ValueError:
+            max_points = 0
+        if max_points < MIN_PROFILE_POINTS:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid max_points',
+                'message': f'max_points must be an integer >= {MIN_PROFILE_POINTS}',
+                'tool': tool_name
+            }), 400
+        
+        try:
+            leveling = parse_leveling(request.args.get('level'), request.args.get('order'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid leveling',
+                'message': str(e),
+                'tool': tool_name
+            }), 400
+        
+        pickle_path = get_pickle_file_path_by_filename(decoded_filename, tool_name)
+        if not pickle_path:
+            return jsonify({
+                'success': False,
+                'error': 'Measurement file not found',
+                'message': f'No pickle file found for filename: {decoded_filename} in tool {tool_name}',
+                'tool': tool_name
+            }), 404
+        
+        detail = load_measurement_detail(pickle_path)
+        measurement = {
+            'filename': decoded_filename,
+            'tool': tool_name,
+            'pickle_filename': pickle_path.name,
+            **detail,
+        }
+        points = detail['available_points']
+        
+        log_afm_access(
+            action="get_bundle",
+            tool=tool_name,
+            filename=decoded_filename,
+            pickle_file=pickle_path.name,
+            available_points=points,
+            max_points=max_points,
+            streamed=stream_requested
+        )
+        
+        executor = get_io_executor()
+        futures = [
+            executor.submit(
+                _load_bundle_point, decoded_filename, point, site_info_for_point(detail['data'], point),
+                tool_name, max_points, profile_format, leveling
+            )
+            for point in points
+        ]
+        message = f'Successfully loaded measurement bundle for {decoded_filename} from {tool_name}'
+        
+        if stream_requested:
+            dumps = current_app.json.dumps
+            
+            def generate():
+                try:
+                    yield dumps({'type': 'measurement', 'data': measurement}) + '\n'
+                    for future in as_completed(futures):
+                        yield dumps({'type': 'point', 'data': future.result()}) + '\n'
+                    yield dumps({'type': 'end', 'success': True, 'count': len(futures), 'message': message}) + '\n'
+                finally:
+                    # Client went away: drop the points that have not started yet
+                    for future in futures:
+                        future.cancel()
+            
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        measurement['points'] = [future.result() for future in futures]
+        print(f"Bundle loaded: {len(points)} points, "
+              f"{sum(1 for entry in measurement['points'] if entry['profile'])} profiles, "
+              f"{sum(1 for entry in measurement['points'] if entry['image'])} images")
+        
+        return jsonify({
+            'success': True,
+            'data': measurement,
+            'message': message
+        })
+        
+    except Exception as e:
+        print(f"Error in get_measurement_bundle: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to load measurement bundle for {decoded_filename}'
+        }), 500
+
+
+@afm_bp.route('/afm-files/export', methods=['GET', 'POST'])
+def export_measurements():
+    """
+    Export the rows of many measurements as one CSV or Parquet file, streamed as they are read
+
+    Options come from the query string or, for long selections, a JSON body:
+        format: csv (default) or parquet (needs pyarrow)
+        section: data (detail rows, default) or summary
+        filenames: measurements to export; without it the catalog is filtered by
+            q (search text), date_from and date_to (YYYY-MM-DD)
+    Pickles are read on the I/O pool a few measurements ahead of the writer, so
+    memory per export stays bounded.
+    """
+    try:
+        body = request.get_json(silent=True) if request.method == 'POST' else None
+        options = body if isinstance(body, dict) else {}
+        
+        def option(name, default=None):
+            value = options.get(name)
+            return request.args.get(name, default) if value is None else value
+        
+        tool_name = option('tool', 'MAP608')
+        export_format = str(option('format', 'csv')).lower()
+        section = str(option('section', 'data')).lower()
+        filenames = options.get('filenames') or request.args.getlist('filename')
+        
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid format',
+                'message': f"format must be one of: {', '.join(EXPORT_FORMATS)} (got '{export_format}')",
+                'tool': tool_name
+            }), 400
+        if export_format == 'parquet' and pa is None:
+            return jsonify({
+                'success': False,
+                'error': 'Parquet export unavailable',
+                'message': 'pyarrow is not installed on the server; use format=csv',
+                'tool': tool_name
+            }), 501
+        if section not in EXPORT_SECTIONS:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid section',
+                'message': f"section must be one of: {', '.join(EXPORT_SECTIONS)} (got '{section}')",
+                'tool': tool_name
+            }), 400
+        if not isinstance(filenames, list):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid filenames',
+                'message': 'filenames must be a list of measurement filenames',
+                'tool': tool_name
+            }), 400
+        
+        # Catalog records carry the identification columns written in front of each row
+        measurements = select_measurements(tool_name, filenames, option('q'), option('date_from'), option('date_to'))
+        
+        if len(measurements) > MAX_EXPORT_MEASUREMENTS:
+            return jsonify({
+                'success': False,
+                'error': 'Selection too large',
+                'message': f'{len(measurements)} measurements selected; at most {MAX_EXPORT_MEASUREMENTS} can be exported at once',
+                'tool': tool_name
+            }), 400
+        
+        log_afm_access(
+            action="export_measurements",
+            tool=tool_name,
+            format=export_format,
+            section=section,
+            measurements=len(measurements)
+        )
+        print(f"Exporting {section} of {len(measurements)} measurements from {tool_name} as {export_format}")
+        
+        batches = iter_measurement_records(measurements, tool_name, section)
+        chunks = iter_parquet_export(batches) if export_format == 'parquet' else iter_csv_export(batches)
+        mimetype, suffix = EXPORT_FORMATS[export_format]
+        response = Response(chunks, mimetype=mimetype, direct_passthrough=True)
+        download_name = f"AFM_{tool_name}_{section}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+        
+    except Exception as e:
+        print(f"Error in export_measurements: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to export measurements'
+        }), 500
@@ -0,0 +1,520 @@
+"""
+Profile Analysis API Routes
+Server-side analysis of AFM height profiles (statistics, roughness, histograms, spectra, line cuts, tiles)
+"""
+from flask import Blueprint, Response, jsonify, request
+from urllib.parse import unquote
+from datetime import datetime
+from .utils.app_logger_standard import get_activity_logger
+from .utils.artifact_locator import artifact_locator, get_artifact_dir
+from .utils.executors import get_io_executor
+from .utils.file_parser import get_profile_file_path_by_filename
+from .utils.http_cache import json_validators
+from .utils.profile_data import build_grid_binary_body, build_grid_payload
+from .utils.profile_linecut import (
+    MAX_LINECUT_SAMPLES,
+    extract_line_cut,
+    get_profile_grid,
+    line_from_angle,
+)
+from .utils.profile_spectrum import (
+    DEFAULT_WINDOW,
+    MAX_RADIAL_BINS,
+    MIN_RADIAL_BINS,
+    SPECTRUM_WINDOWS,
+    get_profile_spectrum,
+)
+from .utils.profile_leveling import leveling_summary, parse_leveling
+from .utils.profile_tiles import get_tile_pyramid
+from .utils.profile_stats import (
+    DEFAULT_HISTOGRAM_BINS,
+    MAX_HISTOGRAM_BINS,
+    MIN_HISTOGRAM_BINS,
+    get_profile_stats,
+)
+
+# Create profile analysis blueprint
+analysis_bp = Blueprint('analysis', __name__)
+
+# Get activity logger
+activity_logger = get_activity_logger()
+
+def log_analysis_access(action, **kwargs):
+    """Log profile analysis activities"""
+    try:
+        # Get user from cookie
+        user_id = request.cookies.get('LAST_USER', 'anonymous')
+        
+        # Log with structured data
+        activity_logger.info(f"Analysis {action}", extra={
+                           'user': user_id,
+                           'action': action,
+                           'timestamp': datetime.now().isoformat(),
+                           **kwargs})
+    except Exception:
+        # Don't let logging errors break the API
+        pass
+
+
+def _error(error, message, tool_name, status):
+    """Build an error response in the API's standard shape"""
+    return jsonify({
+        'success': False,
+        'error': error,
+        'message': message,
+        'tool': tool_name
+    }), status
+
+
+def _site_info_from_request():
+    """Extract the site information query parameters sent with per-point requests"""
+    site_info = {
+        'site_id': request.args.get('site_id'),     # Keep as string
+        'site_x': request.args.get('site_x'),       # Keep as string
+        'site_y': request.args.get('site_y'),       # Keep as string
+        'point_no': request.args.get('point_no')    # Will convert to int
+    }
+    
+    # Only convert point_no to integer (for 4-digit formatting)
+    if site_info['point_no']:
+        try:
+            site_info['point_no'] = int(site_info['point_no'])
+        except ValueError:
+            site_info['point_no'] = None
+    return site_info
+
+
+def _resolve_profile(filename, point_number, tool_name):
+    """
+    Resolve the profile file of a measurement point for an analysis request
+
+    Returns:
+        (profile_path, validators, None) or (None, None, error response)
+    """
+    decoded_filename = unquote(filename)
+    decoded_point_number = unquote(point_number)
+    site_info = _site_info_from_request()
+    
+    profile_path = get_profile_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
+    if not profile_path:
+        return None, None, _error(
+            'Profile file not found',
+            f'No profile file found for filename: {decoded_filename}, point: {decoded_point_number} in tool {tool_name}',
+            tool_name, 404
+        )
+    
+    # Validators come from a single stat call, which also covers the existence check
+    try:
+        validators = json_validators(profile_path)
+    except FileNotFoundError:
+        return None, None, _error(
+            'Profile file not accessible',
+            f'Profile file {profile_path.name} exists in listing but not accessible',
+            tool_name, 404
+        )
+    return profile_path, validators, None
+
+
+def _leveling_arg(tool_name):
+    """
+    Read the ?level= and ?order= leveling parameters
+
+    Returns:
+        (leveling or None, None) or (None, error response)
+    """
+    try:
+        return parse_leveling(request.args.get('level'), request.args.get('order')), None
+    except ValueError as e:
+        return None, _error('Invalid leveling', str(e), tool_name, 400)
+
+
+def _int_arg(name, default, minimum, maximum):
+    """Read an integer query parameter, returning None when it is invalid or out of range"""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        return None
+    return value if minimum <= value <= maximum else None
+
+
+def _float_args(*names):
+    """
+    Read float query parameters
+
+    Returns:
+        List of floats (None for missing parameters)
+
+    Raises:
+        ValueError: When a given parameter is not a finite number
+    """
+    values = []
+    for name in names:
+        raw = request.args.get(name)
+        if raw is None or raw == '':
+            values.append(None)
+            continue
+        try:
+            value = float(raw)
+        except ValueError:
+            value = float('nan')
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError(f'{name} must be a finite number')
+        values.append(value)
+    return values
+
+
+@analysis_bp.route('/afm-files/profile-stats/<path:filename>/<path:point_number>', methods=['GET'])
+def get_profile_stats_for_point(filename, point_number):
+    """Get roughness parameters, distribution statistics and histogram of one point's profile"""
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        bins = _int_arg('bins', DEFAULT_HISTOGRAM_BINS, MIN_HISTOGRAM_BINS, MAX_HISTOGRAM_BINS)
+        if bins is None:
+            return _error('Invalid bins', f'bins must be an integer between {MIN_HISTOGRAM_BINS} and {MAX_HISTOGRAM_BINS}', tool_name, 400)
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        profile_path, validators, error_response = _resolve_profile(filename, point_number, tool_name)
+        if error_response is not None:
+            return error_response
+        
+        # Answer revalidation from the profile file's metadata without loading it
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        try:
+            stats = get_profile_stats(profile_path, bins, leveling)
+        except ValueError as e:
+            return _error('Leveling failed', str(e), tool_name, 400)
+        if stats is None:
+            return _error('Unsupported profile data format', f'Profile data in {profile_path.name} has no X/Y/Z coordinates', tool_name, 400)
+        
+        log_analysis_access(action="get_profile_stats", tool=tool_name, profile_file=profile_path.name, bins=bins)
+        
+        return validators.apply(jsonify({
+            'success': True,
+            'data': stats,
+            'leveling': leveling_summary(leveling) if leveling else None,
+            'profile_filename': profile_path.name,
+            'tool': tool_name,
+            'message': f'Successfully computed profile statistics for {profile_path.name} from {tool_name}'
+        }))
+        
+    except Exception as e:
+        print(f"Error in get_profile_stats_for_point: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to compute profile statistics for {filename}, point {point_number}'
+        }), 500
+
+
+def _point_stats_entry(profile_dir, point, bins, leveling):
+    """Statistics of one listed profile file (runs on the I/O pool)"""
+    entry = dict(point)
+    try:
+        entry['stats'] = get_profile_stats(profile_dir / point['filename'], bins, leveling)
+    except Exception as e:
+        # One unreadable point should not fail the whole batch
+        print(f"Error computing stats for {point['filename']}: {e}")
+        entry['stats'] = None
+        entry['error'] = str(e)
+    return entry
+
+
+@analysis_bp.route('/afm-files/profile-stats/<path:filename>', methods=['GET'])
+def get_profile_stats_batch(filename):
+    """Get profile statistics for every point of a measurement in one request"""
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        decoded_filename = unquote(filename)
+        bins = _int_arg('bins', DEFAULT_HISTOGRAM_BINS, MIN_HISTOGRAM_BINS, MAX_HISTOGRAM_BINS)
+        if bins is None:
+            return _error('Invalid bins', f'bins must be an integer between {MIN_HISTOGRAM_BINS} and {MAX_HISTOGRAM_BINS}', tool_name, 400)
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        print(f"=== Profile Stats Batch API Called for tool: {tool_name}, filename: '{decoded_filename}' ===")
+        
+        points = artifact_locator.list_points('profile', decoded_filename, tool_name)
+        if not points:
+            return _error(
+                'Profile files not found',
+                f'No profile files found for filename: {decoded_filename} in tool {tool_name}',
+                tool_name, 404
+            )
+        
+        # Cached points return immediately; the rest are loaded concurrently
+        profile_dir = get_artifact_dir(tool_name, 'profile')
+        executor = get_io_executor()
+        results = list(executor.map(lambda point: _point_stats_entry(profile_dir, point, bins, leveling), points))
+        
+        log_analysis_access(action="get_profile_stats_batch", tool=tool_name, filename=decoded_filename, point_count=len(results), bins=bins)
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'count': len(results),
+            'leveling': leveling_summary(leveling) if leveling else None,
+            'tool': tool_name,
+            'message': f'Successfully computed profile statistics for {len(results)} points of {decoded_filename} from {tool_name}'
+        })
+        
+    except Exception as e:
+        print(f"Error in get_profile_stats_batch: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to compute profile statistics for {filename}'
+        }), 500
+
+
+@analysis_bp.route('/afm-files/profile-psd/<path:filename>/<path:point_number>', methods=['GET'])
+def get_profile_psd(filename, point_number):
+    """
+    Get the power spectral density and dominant spatial frequencies of one point's profile
+
+    Query parameters: window (none/hann/hamming/blackman), bins (radial bins),
+    include_2d (also return the centred 2D PSD), level/order (leveling first).
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        window = request.args.get('window', DEFAULT_WINDOW).lower()
+        if window not in SPECTRUM_WINDOWS:
+            return _error('Invalid window', f"window must be one of: {', '.join(SPECTRUM_WINDOWS)} (got '{window}')", tool_name, 400)
+        
+        radial_bins = None
+        if request.args.get('bins'):
+            radial_bins = _int_arg('bins', None, MIN_RADIAL_BINS, MAX_RADIAL_BINS)
+            if radial_bins is None:
+                return _error('Invalid bins', f'bins must be an integer between {MIN_RADIAL_BINS} and {MAX_RADIAL_BINS}', tool_name, 400)
+        include_2d = request.args.get('include_2d', 'false').lower() in ('1', 'true', 'yes')
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        profile_path, validators, error_response = _resolve_profile(filename, point_number, tool_name)
+        if error_response is not None:
+            return error_response
+        
+        # Answer revalidation from the profile file's metadata without loading it
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        # The FFT runs on the process pool; results are cached per profile and parameters
+        try:
+            spectrum = get_profile_spectrum(profile_path, window, radial_bins, include_2d, leveling)
+        except ValueError as e:
+            return _error('Spectral analysis failed', str(e), tool_name, 400)
+        if spectrum is None:
+            return _error('Unsupported profile data format', f'Profile data in {profile_path.name} has no X/Y/Z coordinates', tool_name, 400)
+        
+        log_analysis_access(action="get_profile_psd", tool=tool_name, profile_file=profile_path.name, window=window)
+        
+        return validators.apply(jsonify({
+            'success': True,
+            'data': spectrum,
+            'leveling': leveling_summary(leveling) if leveling else None,
+            'profile_filename': profile_path.name,
+            'tool': tool_name,
+            'message': f'Successfully computed power spectral density for {profile_path.name} from {tool_name}'
+        }))
+        
+    except Exception as e:
+        print(f"Error in get_profile_psd: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to compute power spectral density for {filename}, point {point_number}'
+        }), 500
+
+
+@analysis_bp.route('/afm-files/profile-linecut/<path:filename>/<path:point_number>', methods=['GET'])
+def get_profile_linecut(filename, point_number):
+    """
+    Get a bilinearly interpolated cross-section through one point's height map
+
+    The cut is given either by endpoints (x0, y0, x1, y1 in profile coordinates) or
+    by angle (degrees from +X) and offset (perpendicular distance from the map
+    centre), spanning the whole map. Optional: samples, level/order.
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        try:
+            x0, y0, x1, y1, angle, offset = _float_args('x0', 'y0', 'x1', 'y1', 'angle', 'offset')
+        except ValueError as e:
+            return _error('Invalid line cut', str(e), tool_name, 400)
+        
+        endpoints = (x0, y0, x1, y1)
+        if all(value is not None for value in endpoints):
+            use_endpoints = True
+        elif angle is not None and all(value is None for value in endpoints):
+            use_endpoints = False
+        else:
+            return _error('Invalid line cut', 'Provide either x0, y0, x1 and y1, or angle (and optional offset)', tool_name, 400)
+        
+        samples = None
+        if request.args.get('samples'):
+            samples = _int_arg('samples', None, 2, MAX_LINECUT_SAMPLES)
+            if samples is None:
+                return _error('Invalid samples', f'samples must be an integer between 2 and {MAX_LINECUT_SAMPLES}', tool_name, 400)
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        profile_path, validators, error_response = _resolve_profile(filename, point_number, tool_name)
+        if error_response is not None:
+            return error_response
+        
+        # Answer revalidation from the profile file's metadata without loading it
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        # Repeated cuts on the same point reuse the cached grid
+        try:
+            grid = get_profile_grid(profile_path, leveling)
+            if grid is None:
+                return _error('Unsupported profile data format', f'Profile data in {profile_path.name} has no X/Y/Z coordinates', tool_name, 400)
+            if not use_endpoints:
+                x0, y0, x1, y1 = line_from_angle(grid, angle, offset or 0.0)
+        except ValueError as e:
+            return _error('Line cut failed', str(e), tool_name, 400)
+        
+        line_cut = extract_line_cut(grid, (x0, y0), (x1, y1), samples)
+        
+        log_analysis_access(action="get_profile_linecut", tool=tool_name, profile_file=profile_path.name, samples=line_cut['summary']['samples'])
+        
+        return validators.apply(jsonify({
+            'success': True,
+            'data': line_cut,
+            'leveling': leveling_summary(leveling) if leveling else None,
+            'profile_filename': profile_path.name,
+            'tool': tool_name,
+            'message': f'Successfully extracted line cut from {profile_path.name} from {tool_name}'
+        }))
+        
+    except Exception as e:
+        print(f"Error in get_profile_linecut: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to extract line cut for {filename}, point {point_number}'
+        }), 500
+
+
+@analysis_bp.route('/afm-files/profile-tiles/<path:filename>/<path:point_number>', methods=['GET'])
+def get_profile_tile_pyramid(filename, point_number):
+    """Get the tile pyramid layout (levels, shapes, tile counts, Z range) of one point's height map"""
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        profile_path, validators, error_response = _resolve_profile(filename, point_number, tool_name)
+        if error_response is not None:
+            return error_response
+        
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        # Built and stored on first access, read from the local cache afterwards
+        try:
+            pyramid = get_tile_pyramid(profile_path, leveling)
+        except ValueError as e:
+            return _error('Tiling failed', str(e), tool_name, 400)
+        if pyramid is None:
+            return _error('Unsupported profile data format', f'Profile data in {profile_path.name} has no X/Y/Z coordinates', tool_name, 400)
+        
+        log_analysis_access(action="get_profile_tile_pyramid", tool=tool_name, profile_file=profile_path.name)
+        
+        return validators.apply(jsonify({
+            'success': True,
+            'data': pyramid.describe(),
+            'leveling': leveling_summary(leveling) if leveling else None,
+            'profile_filename': profile_path.name,
+            'tool': tool_name,
+            'message': f'Tile pyramid for {profile_path.name} from {tool_name}'
+        }))
+        
+    except Exception as e:
+        print(f"Error in get_profile_tile_pyramid: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to get tile pyramid for {filename}, point {point_number}'
+        }), 500
+
+
+@analysis_bp.route('/afm-files/profile-tiles/<path:filename>/<path:point_number>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_profile_tile(filename, point_number, z, x, y):
+    """
+    Get one tile of a point's height map pyramid
+
+    z is the level (0 = coarsest), x the tile column and y the tile row. Tiles are
+    sent as typed grid JSON, or as raw float32 with ?format=binary.
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        tile_format = request.args.get('format', 'json').lower()
+        if tile_format not in ('json', 'binary'):
+            return _error('Invalid format', f"format must be one of: json, binary (got '{tile_format}')", tool_name, 400)
+        leveling, error_response = _leveling_arg(tool_name)
+        if error_response is not None:
+            return error_response
+        
+        profile_path, validators, error_response = _resolve_profile(filename, point_number, tool_name)
+        if error_response is not None:
+            return error_response
+        
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        try:
+            pyramid = get_tile_pyramid(profile_path, leveling)
+        except ValueError as e:
+            return _error('Tiling failed', str(e), tool_name, 400)
+        if pyramid is None:
+            return _error('Unsupported profile data format', f'Profile data in {profile_path.name} has no X/Y/Z coordinates', tool_name, 400)
+        
+        if not pyramid.has_tile(z, x, y):
+            return _error('Tile not found', f'No tile {z}/{x}/{y} in the pyramid of {profile_path.name}', tool_name, 404)
+        
+        try:
+            tile = pyramid.tile(z, x, y)
+        except FileNotFoundError:
+            # A level was evicted from the local cache: rebuild the pyramid once
+            tile = get_tile_pyramid(profile_path, leveling, missing_level=z).tile(z, x, y)
+        
+        if tile_format == 'binary':
+            body, headers = build_grid_binary_body(tile)
+            return validators.apply(Response(body, mimetype='application/octet-stream', headers=headers))
+        
+        return validators.apply(jsonify({
+            'success': True,
+            'data': build_grid_payload(tile),
+            'tile': {'z': z, 'x': x, 'y': y},
+            'tool': tool_name
+        }))
+        
+    except Exception as e:
+        print(f"Error in get_profile_tile: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': f'Failed to get tile {z}/{x}/{y} for {filename}, point {point_number}'
+        }), 500
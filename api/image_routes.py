@@ -2,15 +2,204 @@
 Image Handling API Routes
 Handles image retrieval and serving from different directories
 """
-from flask import Blueprint, jsonify, request, send_file, make_response
+from flask import Blueprint, Response, current_app, jsonify, request
+from collections import deque
 from pathlib import Path
-from urllib.parse import unquote
-from .utils.file_parser import get_image_file_path_by_filename
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote
+from .utils.artifact_locator import NAMED_ARTIFACT_DIRECTORIES, artifact_locator, get_artifact_dir
+from .utils.file_transfer import send_artifact
+from .utils.deep_zoom import DEFAULT_DZI_FORMAT, DZI_FORMATS, get_deep_zoom_image
+from .utils.executors import get_io_executor
+from .utils.file_parser import (
+    get_image_file_path_by_filename,
+    get_pickle_file_path_by_filename,
+    get_profile_file_path_by_filename,
+)
+from .utils.http_cache import artifact_validators, json_validators, thumbnail_validators
+from .utils.measurement_data import load_measurement_detail, site_info_for_point
+from .utils.profile_leveling import parse_leveling
+from .utils.profile_render import (
+    COLORMAPS,
+    DEFAULT_COLORMAP,
+    DEFAULT_RENDER_FORMAT,
+    RANGE_MODES,
+    RENDER_FORMATS,
+    render_profile_image,
+)
+from .utils.thumbnails import get_thumbnail, snap_thumbnail_width
+from .utils.transcoding import (
+    TRANSCODE_FORMATS, get_transcoded_image, is_transcodable, resolve_transcode_format, schedule_transcodes
+)
+from .utils.zip_stream import iter_zip_stream, safe_archive_name
+import math
 import mimetypes
 
 # Create image handling blueprint
 image_bp = Blueprint('image', __name__)
 
+# TIFFs of an image listing page transcoded in the background, ahead of their first view
+TRANSCODE_PREFETCH = 16
+
+# Measurements per raw image export, and how many are resolved ahead of the one being zipped
+MAX_EXPORT_MEASUREMENTS = 200
+EXPORT_PREFETCH = 4
+
+
+def _render_options_from_request():
+    """
+    Read the profile rendering options (colormap, format, range, vmin/vmax, level/order)
+
+    Returns:
+        (options dict, None) or (None, error message)
+    """
+    colormap = request.args.get('colormap', DEFAULT_COLORMAP).lower()
+    if colormap not in COLORMAPS:
+        return None, f"colormap must be one of: {', '.join(COLORMAPS)}"
+    
+    image_format = request.args.get('format', DEFAULT_RENDER_FORMAT).lower()
+    if image_format not in RENDER_FORMATS:
+        return None, f"format must be one of: {', '.join(RENDER_FORMATS)}"
+    
+    range_mode = request.args.get('range', 'minmax').lower()
+    if range_mode not in RANGE_MODES:
+        return None, f"range must be one of: {', '.join(RANGE_MODES)}"
+    
+    limits = {}
+    for name in ('vmin', 'vmax'):
+        value = request.args.get(name)
+        if value in (None, ''):
+            limits[name] = None
+            continue
+        try:
+            limits[name] = float(value)
+        except ValueError:
+            return None, f'{name} must be a finite number'
+        if not math.isfinite(limits[name]):
+            return None, f'{name} must be a finite number'
+    if limits['vmin'] is not None and limits['vmax'] is not None and limits['vmin'] >= limits['vmax']:
+        return None, 'vmin must be less than vmax'
+    
+    try:
+        leveling = parse_leveling(request.args.get('level'), request.args.get('order'))
+    except ValueError as e:
+        return None, str(e)
+    
+    return {
+        'colormap': colormap,
+        'image_format': image_format,
+        'range_mode': range_mode,
+        'vmin': limits['vmin'],
+        'vmax': limits['vmax'],
+        'leveling': leveling,
+    }, None
+
+
+def _is_plain_file_name(name):
+    """
+    Whether a URL segment names a file directly inside a directory
+
+    Flask has already URL-decoded the segment; it must not be decoded again, or
+    %252e%252e%252f would turn into ../ here.
+    """
+    return bool(name) and name not in ('.', '..') and not any(c in name for c in '/\\\0')
+
+
+def _thumbnail_width_from_request():
+    """
+    Read the ?w= thumbnail width
+
+    Returns:
+        (width snapped to a supported size, or None for the original, None) or (None, error message)
+    """
+    width = request.args.get('w')
+    if width in (None, ''):
+        return None, None
+    try:
+        width = int(width)
+    except ValueError:
+        width = 0
+    if width < 1:
+        return None, 'w must be a positive integer'
+    return snap_thumbnail_width(width), None
+
+
+def _send_thumbnail(source_path, width):
+    """Serve a downscaled WebP variant of an image file (generated once, then from the disk cache)"""
+    validators = thumbnail_validators(source_path, width)
+    if validators.is_not_modified():
+        return validators.not_modified_response()
+    
+    thumbnail_path = get_thumbnail(source_path, width)
+    return send_artifact(thumbnail_path, 'image/webp', validators)
+
+
+def _send_rendered_profile(profile_path, options, width=None):
+    """
+    Serve a colormapped rendering of a profile file (rendered once, then from the disk cache)
+
+    Returns:
+        Response, or None when the profile has no X/Y/Z data
+    """
+    # Validators come from the profile file; the render options are part of the ETag
+    validators = artifact_validators(profile_path, variant=request.query_string.decode('utf-8'))
+    if validators.is_not_modified():
+        return validators.not_modified_response()
+    
+    image_path = render_profile_image(profile_path, **options)
+    if image_path is None:
+        return None
+    
+    mimetype = RENDER_FORMATS[options['image_format']][1]
+    if width is not None:
+        image_path = get_thumbnail(image_path, width)
+        mimetype = 'image/webp'
+    
+    response = send_artifact(image_path, mimetype, validators)
+    response.headers['X-Image-Source'] = 'rendered'
+    return response
+
+
+def _web_format_from_request(image_path):
+    """
+    Web format a TIFF is transcoded to for this request
+
+    ?format=webp|png picks one and ?format=original sends the TIFF itself;
+    otherwise clients that accept image/webp (browsers loading an <img>) get WebP.
+
+    Returns:
+        (format or None, error message or None)
+    """
+    requested = request.args.get('format', '').lower()
+    if requested == 'original' or not is_transcodable(image_path):
+        return None, None
+    if requested:
+        if requested not in TRANSCODE_FORMATS:
+            return None, f"format must be one of: original, {', '.join(TRANSCODE_FORMATS)}"
+        return requested, None
+    if any(mimetype == 'image/webp' and quality > 0 for mimetype, quality in request.accept_mimetypes):
+        return 'webp', None
+    return None, None
+
+
+def _vary_on_accept(response, image_path):
+    """Mark responses whose representation was picked from the Accept header"""
+    if is_transcodable(image_path) and 'format' not in request.args:
+        response.vary.add('Accept')
+    return response
+
+
+def _send_transcoded(source_path, image_format):
+    """Serve the web version of a TIFF (transcoded once, then from the disk cache)"""
+    validators = artifact_validators(source_path, variant=f"transcode:{image_format}")
+    if validators.is_not_modified():
+        return validators.not_modified_response()
+    
+    transcoded_path = get_transcoded_image(source_path, image_format)
+    response = send_artifact(transcoded_path, TRANSCODE_FORMATS[image_format][1], validators)
+    response.headers['X-Image-Source'] = 'transcoded'
+    return response
+
 
 @image_bp.route('/afm-files/image/<path:filename>/<path:decoded_point_number>', methods=['GET'])
 def get_profile_image(filename, decoded_point_number):
@@ -48,6 +237,20 @@ def get_profile_image(filename, decoded_point_number):
         image_path = get_image_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
         
         if not image_path:
+            # No tiff_dir image: a preview can still be rendered from the profile data
+            profile_path = get_profile_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
+            if profile_path:
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'filename': profile_path.name,
+                        'source': 'rendered',
+                        'url': f'/api/afm-files/profile-render/{quote(decoded_filename, safe="")}/{quote(decoded_point_number, safe="")}?{request.query_string.decode("utf-8")}'
+                    },
+                    'tool': tool_name,
+                    'message': f'No image file for {decoded_filename}, point {decoded_point_number}; rendered from profile data'
+                })
+            
             return jsonify({
                 'success': False,
                 'error': 'Image file not found',
@@ -55,8 +258,10 @@ def get_profile_image(filename, decoded_point_number):
                 'tool': tool_name
             }), 404
         
-        # Check if file exists
-        if not image_path.exists():
+        # Validators come from a single stat call, which also covers the existence check
+        try:
+            validators = json_validators(image_path)
+        except FileNotFoundError:
             return jsonify({
                 'success': False,
                 'error': 'Image file not accessible',
@@ -64,17 +269,22 @@ def get_profile_image(filename, decoded_point_number):
                 'tool': tool_name
             }), 404
         
-        return jsonify({
+        # Answer revalidation from the image file's metadata
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        return validators.apply(jsonify({
             'success': True,
             'data': {
                 'filename': image_path.name,
                 'path': str(image_path),
                 'relative_path': f'tiff_dir/{image_path.name}',
+                'source': 'tiff_dir',
                 'url': f'/api/afm-files/image-file/{decoded_filename}/{decoded_point_number}?tool={tool_name}'
             },
             'tool': tool_name,
             'message': f'Successfully found image for {decoded_filename}, point {decoded_point_number} from {tool_name}'
-        })
+        }))
         
     except Exception as e:
         print(f"Error in get_profile_image: {e}")
@@ -111,6 +321,11 @@ def serve_profile_image(filename, point_number):
             except ValueError:
                 site_info['point_no'] = None
         
+        # Optional thumbnail width (?w=256)
+        width, error_message = _thumbnail_width_from_request()
+        if error_message:
+            return error_message, 400
+        
         print(f"\n=== IMAGE FILE SERVE REQUEST ===")
         print(f"Tool: {tool_name}")
         print(f"Filename (encoded): '{filename}'")
@@ -122,53 +337,185 @@ def serve_profile_image(filename, point_number):
         # Find matching image file using the utility function
         image_path = get_image_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
         
-        if not image_path or not image_path.exists():
+        # Validators come from a single stat call, which also covers the existence check
+        try:
+            validators = artifact_validators(image_path) if image_path else None
+        except FileNotFoundError:
+            validators = None
+        
+        if validators is None:
+            # No tiff_dir image: fall back to a preview rendered from the profile data
+            profile_path = get_profile_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
+            if profile_path:
+                options, error_message = _render_options_from_request()
+                if options is None:
+                    return error_message, 400
+                try:
+                    response = _send_rendered_profile(profile_path, options, width)
+                except (FileNotFoundError, ValueError):
+                    response = None
+                if response is not None:
+                    return response
             return "Image file not found", 404
         
-        return send_file(image_path, mimetype='image/webp')
+        if width is not None:
+            return _send_thumbnail(image_path, width)
+        
+        # Answer revalidation without opening the image
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        return send_artifact(image_path, 'image/webp', validators)
         
     except Exception as e:
         print(f"Error serving image: {e}")
         return f"Error serving image: {str(e)}", 500
 
 
-# Note: This endpoint is currently not used by the frontend
-# Keeping it for potential future use
+@image_bp.route('/afm-files/profile-render/<path:filename>/<path:point_number>', methods=['GET'])
+def serve_rendered_profile(filename, point_number):
+    """
+    Serve a colormapped image rendered from a point's profile data
+
+    Query parameters: colormap, format (png/webp), range (minmax/percentile),
+    vmin/vmax (explicit color limits) and level/order (leveling first).
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        # URL decode the filename and point number
+        decoded_filename = unquote(filename)
+        decoded_point_number = unquote(point_number)
+        
+        # Extract site information from query parameters
+        site_info = {
+            'site_id': request.args.get('site_id'),     # Keep as string
+            'site_x': request.args.get('site_x'),       # Keep as string
+            'site_y': request.args.get('site_y'),       # Keep as string
+            'point_no': request.args.get('point_no')    # Will convert to int
+        }
+        
+        # Only convert point_no to integer (for 4-digit formatting)
+        if site_info['point_no']:
+            try:
+                site_info['point_no'] = int(site_info['point_no'])
+            except ValueError:
+                site_info['point_no'] = None
+        
+        options, error_message = _render_options_from_request()
+        if options is None:
+            return error_message, 400
+        width, error_message = _thumbnail_width_from_request()
+        if error_message:
+            return error_message, 400
+        
+        profile_path = get_profile_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
+        if not profile_path:
+            return "Profile file not found", 404
+        
+        try:
+            response = _send_rendered_profile(profile_path, options, width)
+        except FileNotFoundError:
+            return "Profile file not found", 404
+        except ValueError as e:
+            return f"Cannot render profile: {str(e)}", 400
+        if response is None:
+            return "Unsupported profile data format", 400
+        return response
+        
+    except Exception as e:
+        print(f"Error rendering profile image: {e}")
+        return f"Error rendering profile image: {str(e)}", 500
+
+
+# Largest page accepted by the image listing
+MAX_IMAGE_LIST_LIMIT = 1000
+
+
 @image_bp.route('/afm-files/images/<image_type>', methods=['GET'])
 def get_images_by_type(image_type):
-    """Get list of images from specific directory type (profile, tiff, align, tip, capture)"""
+    """
+    Get list of images from specific directory type (profile, tiff, align, tip, capture)
+
+    Served from an incrementally refreshed in-memory listing of the directory.
+    Query parameters: filename (only files of this measurement), search (substring),
+    sort (name or mtime), offset and limit (pagination).
+    """
     try:
         tool_name = request.args.get('tool', 'MAP608')
         
-        # Define base directory for the tool
-        base_dir = Path(f"itc-afm-data-platform-pjt-shared/AFM_DB/{tool_name}")
+        if image_type not in NAMED_ARTIFACT_DIRECTORIES:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid image type',
+                'message': f'Image type must be one of: {list(NAMED_ARTIFACT_DIRECTORIES.keys())}'
+            }), 400
         
-        # Map image types to directory names
-        dir_mapping = {
-            'profile': 'profile_dir',
-            'tiff': 'tiff_dir',
-            'align': 'align_dir',
-            'tip': 'tip_dir',
-            'capture': 'capture_dir'
-        }
+        measurement_filename = request.args.get('filename')
+        search = request.args.get('search')
+        sort = request.args.get('sort', 'name').lower()
+        if sort not in ('name', 'mtime'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid sort',
+                'message': f"sort must be one of: name, mtime (got '{sort}')"
+            }), 400
         
-        if image_type not in dir_mapping:
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            offset, limit = -1, -1
+        if offset < 0 or not 1 <= limit <= MAX_IMAGE_LIST_LIMIT:
             return jsonify({
                 'success': False,
-                'error': 'Invalid image type',
-                'message': f'Image type must be one of: {list(dir_mapping.keys())}'
+                'error': 'Invalid pagination',
+                'message': f'offset must be >= 0 and limit between 1 and {MAX_IMAGE_LIST_LIMIT}'
             }), 400
         
-        # For now, just return empty list since frontend doesn't use this
+        total, files = artifact_locator.list_directory(
+            image_type, tool_name, measurement_filename, search, sort, offset, limit
+        )
+        
+        # URLs for the typed image route (the measurement/point segments are informational there)
+        measurement_segment = quote(measurement_filename or 'all', safe='')
+        images = []
+        for entry in files:
+            image = {
+                'name': entry['filename'],
+                'size': entry['size'],
+                'modified': datetime.fromtimestamp(entry['mtime_ns'] / 1e9, tz=timezone.utc).isoformat(),
+            }
+            if image_type != 'profile':
+                url = f"/api/afm-files/image-file/{measurement_segment}/default/{image_type}/{quote(entry['filename'], safe='')}?tool={quote(tool_name)}"
+                image['url'] = url
+                image['thumbnail_url'] = f"{url}&w=256"
+                image['dzi_url'] = f"/api/afm-files/deep-zoom/{image_type}/{quote(entry['filename'], safe='')}.dzi?tool={quote(tool_name)}"
+                if is_transcodable(Path(entry['filename'])):
+                    image['web_url'] = f"{url}&format=webp"
+            images.append(image)
+        
+        # The TIFFs on this page are likely viewed next: transcode them in the background
+        if image_type != 'profile':
+            image_dir = get_artifact_dir(tool_name, image_type)
+            schedule_transcodes(image_dir / entry['filename'] for entry in files[:TRANSCODE_PREFETCH])
+        
         return jsonify({
             'success': True,
             'data': {
-                'images': [],
-                'type': image_type
-            }
+                'images': images,
+                'type': image_type,
+                'total': total,
+                'offset': offset,
+                'limit': limit,
+                'has_more': offset + len(images) < total
+            },
+            'tool': tool_name
         })
         
     except Exception as e:
+        print(f"Error in get_images_by_type: {e}")
+        import traceback
+        traceback.print_exc()
         return jsonify({
             'success': False,
             'error': str(e)
@@ -181,8 +528,11 @@ def serve_image_by_type(filename, point_id, image_type, image_name):
     try:
         tool_name = request.args.get('tool', 'MAP608')
         
-        # URL decode image name (filename and point_id are handled by Flask)
-        decoded_image_name = unquote(image_name)
+        # The image name is joined to a directory path: it must be a bare file name
+        # (Flask has already URL-decoded it, as it does filename and point_id)
+        if not _is_plain_file_name(image_name):
+            return "Invalid image name", 400
+        decoded_image_name = image_name
         
         # Map image types to directory names
         dir_mapping = {
@@ -196,9 +546,42 @@ def serve_image_by_type(filename, point_id, image_type, image_name):
         if image_type not in dir_mapping:
             return "Invalid image type", 400
         
-        # Build image path directly - no existence check needed
+        # Optional thumbnail width (?w=256)
+        width, error_message = _thumbnail_width_from_request()
+        if error_message:
+            return error_message, 400
+        
+        # Build image path directly
         image_path = Path(f"itc-afm-data-platform-pjt-shared/AFM_DB/{tool_name}/{dir_mapping[image_type]}/{decoded_image_name}")
         
+        # TIFFs are transcoded for clients asking for a web format
+        web_format, error_message = _web_format_from_request(image_path)
+        if error_message:
+            return error_message, 400
+        
+        # Known-absent files are answered from the Bloom filter / negative cache
+        if not artifact_locator.may_exist(image_type, decoded_image_name, tool_name):
+            return "Image file not found", 404
+        
+        # Validators come from a single stat call, which also covers the existence check
+        try:
+            validators = artifact_validators(image_path)
+        except FileNotFoundError:
+            artifact_locator.record_missing(image_type, decoded_image_name, tool_name)
+            return "Image file not found", 404
+        
+        if width is not None:
+            return _send_thumbnail(image_path, width)
+        
+        # WebP has a size limit: larger TIFFs go out as PNG, or untouched if Pillow cannot decode them
+        if web_format is not None:
+            web_format = resolve_transcode_format(image_path, web_format)
+        if web_format is not None:
+            return _vary_on_accept(_send_transcoded(image_path, web_format), image_path)
+        
+        if validators.is_not_modified():
+            return _vary_on_accept(validators.not_modified_response(), image_path)
+        
         # Determine mimetype based on extension
         ext = image_path.suffix.lower()
         mimetype_mapping = {
@@ -212,8 +595,7 @@ def serve_image_by_type(filename, point_id, image_type, image_name):
         
         mimetype = mimetype_mapping.get(ext, 'application/octet-stream')
         
-        # Let send_file handle the 404 if file doesn't exist
-        return send_file(image_path, mimetype=mimetype)
+        return _vary_on_accept(send_artifact(image_path, mimetype, validators), image_path)
         
     except Exception as e:
         return f"Error serving image: {str(e)}", 500
@@ -252,13 +634,23 @@ def download_raw_image(filename, point_number):
         # Find matching image file using the utility function
         image_path = get_image_file_path_by_filename(decoded_filename, decoded_point_number, tool_name, site_info)
         
-        if not image_path or not image_path.exists():
+        # Validators come from a single stat call, which also covers the existence check
+        try:
+            validators = artifact_validators(image_path) if image_path else None
+        except FileNotFoundError:
+            validators = None
+        
+        if validators is None:
             return jsonify({
                 'success': False,
                 'error': 'Image file not found',
                 'message': f'No image found for {decoded_filename}, point {decoded_point_number}'
             }), 404
         
+        # Answer revalidation without opening the image
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
         # Get the file extension and determine mimetype
         ext = image_path.suffix.lower()
         
@@ -278,18 +670,8 @@ def download_raw_image(filename, point_number):
         safe_filename = decoded_filename.replace('#', '_').replace('/', '_')
         download_filename = f"{safe_filename}_point_{decoded_point_number}{download_ext}"
         
-        # Create response with file
-        response = make_response(send_file(
-            image_path, 
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=download_filename
-        ))
-        
-        # Add Content-Disposition header for download
-        response.headers['Content-Disposition'] = f'attachment; filename="{download_filename}"'
-        
-        return response
+        # Create response with file (sent as an attachment)
+        return send_artifact(image_path, mimetype, validators, download_name=download_filename)
         
     except Exception as e:
         print(f"Error downloading raw image: {e}")
@@ -297,4 +679,276 @@ def download_raw_image(filename, point_number):
             'success': False,
             'error': str(e),
             'message': 'Failed to download image'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+def _resolve_export_images(decoded_filename, points, tool_name):
+    """
+    Resolve the raw image files of one measurement for a ZIP export (runs on the I/O pool)
+
+    Errors are recorded as missing entries rather than raised: the archive is
+    already streaming, so one unreadable measurement must not cut it short.
+
+    Returns:
+        (entries, missing): (arcname, path) pairs, and the points without an image
+    """
+    try:
+        pickle_path = get_pickle_file_path_by_filename(decoded_filename, tool_name)
+        if not pickle_path:
+            return [], [{'filename': decoded_filename, 'point': None, 'reason': 'measurement not found'}]
+        detail = load_measurement_detail(pickle_path)
+        points = points or detail['available_points']
+    except Exception as e:
+        print(f"Error reading {decoded_filename} for raw image export: {e}")
+        return [], [{'filename': decoded_filename, 'point': None, 'reason': f'measurement could not be read: {e}'}]
+    
+    folder = safe_archive_name(decoded_filename)
+    entries = []
+    missing = []
+    for point in points:
+        try:
+            site_info = site_info_for_point(detail['data'], point)
+            image_path = get_image_file_path_by_filename(decoded_filename, point, tool_name, site_info)
+        except Exception as e:
+            print(f"Error finding the image of {decoded_filename}, point {point}: {e}")
+            missing.append({'filename': decoded_filename, 'point': point, 'reason': f'image lookup failed: {e}'})
+            continue
+        if image_path is None or not image_path.is_file():
+            missing.append({'filename': decoded_filename, 'point': point, 'reason': 'image not found'})
+            continue
+        # Same naming as /afm-files/download-raw-image
+        arcname = f"{folder}/{folder}_point_{safe_archive_name(str(point))}{image_path.suffix.lower()}"
+        entries.append((arcname, image_path))
+    return entries, missing
+
+
+def _iter_export_entries(selection, tool_name, dumps):
+    """
+    Yield (arcname, path) for every selected image, then a manifest.json entry
+
+    Measurements are resolved on the I/O pool at most EXPORT_PREFETCH ahead of
+    the one being zipped, so the first bytes go out before the last path is found.
+    """
+    executor = get_io_executor()
+    remaining = iter(selection)
+    pending = deque()
+    
+    def submit_next():
+        item = next(remaining, None)
+        if item is not None:
+            pending.append(executor.submit(_resolve_export_images, item[0], item[1], tool_name))
+    
+    for _ in range(EXPORT_PREFETCH):
+        submit_next()
+    
+    manifest = {'tool': tool_name, 'files': [], 'missing': []}
+    try:
+        while pending:
+            entries, missing = pending.popleft().result()
+            submit_next()
+            manifest['missing'].extend(missing)
+            for arcname, image_path in entries:
+                manifest['files'].append(arcname)
+                yield arcname, image_path
+        yield 'manifest.json', dumps(manifest).encode('utf-8')
+    finally:
+        # Client went away: drop the measurements that have not started yet
+        for future in pending:
+            future.cancel()
+
+
+def _raw_image_archive_response(selection, tool_name, archive_name):
+    """Stream a ZIP of the raw images of [(filename, points or None), ...]"""
+    print(f"Exporting raw images of {len(selection)} measurement(s) from {tool_name} as {archive_name}")
+    response = Response(
+        # The generator runs after the request context is gone: bind the JSON encoder now
+        iter_zip_stream(_iter_export_entries(selection, tool_name, current_app.json.dumps)),
+        mimetype='application/zip',
+        direct_passthrough=True
+    )
+    response.headers.set('Content-Disposition', 'attachment', filename=archive_name)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _point_list(points):
+    """Deduplicated list of point names, or None for all points"""
+    if not points:
+        return None
+    return list(dict.fromkeys(str(point).strip() for point in points if str(point).strip())) or None
+
+
+@image_bp.route('/afm-files/export-raw-images/<path:filename>', methods=['GET'])
+def export_raw_images(filename):
+    """
+    Download the raw images of a measurement as a ZIP archive streamed on the fly
+
+    ?points=1_UL,2_UR limits the archive to some points. Images are stored
+    (webp/png) or deflated (tiff) and a manifest.json lists missing points.
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        decoded_filename = unquote(filename)
+        points = _point_list(request.args.get('points', '').split(','))
+        
+        archive_name = f"{safe_archive_name(decoded_filename)}_raw_images.zip"
+        return _raw_image_archive_response([(decoded_filename, points)], tool_name, archive_name)
+        
+    except Exception as e:
+        print(f"Error exporting raw images: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to export raw images'
+        }), 500
+
+
+@image_bp.route('/afm-files/export-raw-images', methods=['POST'])
+def export_selected_raw_images():
+    """
+    Download the raw images of several measurements as one streamed ZIP archive
+
+    Body: {"tool": "MAP608", "measurements": [{"filename": "...", "points": ["1_UL"]}, ...]}
+    where "points" is optional (all points).
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        tool_name = body.get('tool') or request.args.get('tool', 'MAP608')
+        measurements = body.get('measurements')
+        
+        if (not isinstance(measurements, list) or not measurements
+                or not all(isinstance(item, dict) and item.get('filename') for item in measurements)):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid selection',
+                'message': 'measurements must be a non-empty list of {"filename", "points"} objects',
+                'tool': tool_name
+            }), 400
+        
+        if len(measurements) > MAX_EXPORT_MEASUREMENTS:
+            return jsonify({
+                'success': False,
+                'error': 'Selection too large',
+                'message': f'At most {MAX_EXPORT_MEASUREMENTS} measurements can be exported at once',
+                'tool': tool_name
+            }), 400
+        
+        # Merge repeated measurements so no archive entry is written twice
+        selection = {}
+        for item in measurements:
+            points = item.get('points')
+            points = _point_list(points if isinstance(points, list) else None)
+            filename = str(item['filename'])
+            if filename in selection:
+                previous = selection[filename]
+                points = None if previous is None or points is None else _point_list(previous + points)
+            selection[filename] = points
+        
+        return _raw_image_archive_response(list(selection.items()), tool_name, 'afm_raw_images.zip')
+        
+    except Exception as e:
+        print(f"Error exporting raw images: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Failed to export raw images'
+        }), 500
+
+
+def _deep_zoom_source(image_type, image_name, tool_name, variant):
+    """
+    Find the source image of a deep zoom request in the typed image directories
+
+    Returns:
+        (image_path, validators, error) where error is a (message, status) tuple or None
+    """
+    if image_type not in NAMED_ARTIFACT_DIRECTORIES or image_type == 'profile':
+        return None, None, ("Invalid image type", 400)
+    
+    # Already URL-decoded by Flask; it is joined to a directory path, so only bare file names
+    if not _is_plain_file_name(image_name):
+        return None, None, ("Invalid image name", 400)
+    decoded_image_name = image_name
+    if not artifact_locator.may_exist(image_type, decoded_image_name, tool_name):
+        return None, None, ("Image file not found", 404)
+    
+    image_path = get_artifact_dir(tool_name, image_type) / decoded_image_name
+    try:
+        validators = artifact_validators(image_path, variant=variant)
+    except FileNotFoundError:
+        artifact_locator.record_missing(image_type, decoded_image_name, tool_name)
+        return None, None, ("Image file not found", 404)
+    return image_path, validators, None
+
+
+@image_bp.route('/afm-files/deep-zoom/<image_type>/<image_name>.dzi', methods=['GET'])
+def get_deep_zoom_descriptor(image_type, image_name):
+    """
+    Get the DZI descriptor of a large image for a deep zoom viewer (e.g. OpenSeadragon)
+
+    Viewers fetch tiles from <image_name>_files/<level>/<col>_<row>.<format> next
+    to this URL. ?format= picks the tile format (webp, jpg or png). The first
+    request decodes the image once and stores its levels; tiles are encoded lazily.
+    """
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        tile_format = request.args.get('format', DEFAULT_DZI_FORMAT).lower()
+        if tile_format not in DZI_FORMATS:
+            return f"format must be one of: {', '.join(DZI_FORMATS)}", 400
+        
+        image_path, validators, error = _deep_zoom_source(image_type, image_name, tool_name, f"dzi:{tile_format}")
+        if error is not None:
+            return error
+        
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        deep_zoom_image = get_deep_zoom_image(image_path)
+        response = Response(deep_zoom_image.descriptor(tile_format), mimetype='application/xml')
+        return validators.apply(response)
+        
+    except Exception as e:
+        print(f"Error serving deep zoom descriptor: {e}")
+        import traceback
+        traceback.print_exc()
+        return f"Error serving deep zoom descriptor: {str(e)}", 500
+
+
+@image_bp.route('/afm-files/deep-zoom/<image_type>/<image_name>_files/<int:level>/<int:col>_<int:row>.<tile_format>', methods=['GET'])
+def get_deep_zoom_tile(image_type, image_name, level, col, row, tile_format):
+    """Get one tile of a DZI pyramid (level max_level is full size, level 0 is 1x1)"""
+    try:
+        tool_name = request.args.get('tool', 'MAP608')
+        if tile_format not in DZI_FORMATS:
+            return f"Tile format must be one of: {', '.join(DZI_FORMATS)}", 400
+        
+        image_path, validators, error = _deep_zoom_source(
+            image_type, image_name, tool_name, f"dzi:{level}/{col}_{row}.{tile_format}"
+        )
+        if error is not None:
+            return error
+        
+        if validators.is_not_modified():
+            return validators.not_modified_response()
+        
+        deep_zoom_image = get_deep_zoom_image(image_path)
+        if not deep_zoom_image.has_tile(level, col, row):
+            return "Tile not found", 404
+        
+        try:
+            tile_path = deep_zoom_image.tile(level, col, row, tile_format)
+        except FileNotFoundError:
+            # A level was evicted from the local cache: rebuild the pyramid once
+            tile_path = get_deep_zoom_image(image_path, missing_level=level).tile(level, col, row, tile_format)
+        
+        return send_artifact(tile_path, DZI_FORMATS[tile_format][1], validators)
+        
+    except Exception as e:
+        print(f"Error serving deep zoom tile: {e}")
+        import traceback
+        traceback.print_exc()
+        return f"Error serving deep zoom tile: {str(e)}", 500
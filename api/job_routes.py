@@ -0,0 +1,160 @@
+"""
+Background Job API Routes
+Submit long-running exports, trend aggregations and catalog rebuilds, then poll, download or cancel them
+"""
+from flask import Blueprint, jsonify, request
+from datetime import datetime
+from .utils.app_logger_standard import get_activity_logger
+from .utils.file_transfer import send_artifact
+from .utils.http_cache import job_result_validators
+from .utils.jobs import FINISHED_STATES, cancel_job, job_store, submit_job, validate_job
+
+# Create background job blueprint
+jobs_bp = Blueprint('jobs', __name__)
+
+# Get activity logger
+activity_logger = get_activity_logger()
+
+def log_job_access(action, **kwargs):
+    """Log background job activities"""
+    try:
+        # Get user from cookie
+        user_id = request.cookies.get('LAST_USER', 'anonymous')
+
+        # Log with structured data
+        activity_logger.info(f"Job {action}", extra={
+                           'user': user_id,
+                           'action': action,
+                           'timestamp': datetime.now().isoformat(),
+                           **kwargs})
+    except Exception:
+        # Don't let logging errors break the API
+        pass
+
+
+def _error(error, message, status):
+    """Build an error response in the API's standard shape"""
+    return jsonify({
+        'success': False,
+        'error': error,
+        'message': message
+    }), status
+
+
+def _job_payload(job):
+    """Job document as returned to clients, with its status and result URLs"""
+    return {
+        **job,
+        'cancel_requested': job['state'] not in FINISHED_STATES and job_store.cancel_requested(job['id']),
+        'status_url': f"/api/jobs/{job['id']}",
+        'result_url': f"/api/jobs/{job['id']}/result" if job['state'] == 'succeeded' and job['result'] else None,
+    }
+
+
+@jobs_bp.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Submit a background job
+
+    JSON body: {"type": "export" | "trend-data" | "catalog-rebuild", "params": {...}}
+        export: tool, format (csv/parquet), section (data/summary), and filenames
+            or q/date_from/date_to, as for /afm-files/export
+        trend-data: tool and the same selection; result is the info and summary
+            records of every measurement as one JSON document
+        catalog-rebuild: tool
+    Returns 202 with the job; poll its status_url until the state is finished.
+    """
+    try:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return _error('Invalid request', 'Expected a JSON body with type and params', 400)
+        job_type = body.get('type')
+        try:
+            params = validate_job(job_type, body.get('params') or {})
+        except ValueError as e:
+            return _error('Invalid job', str(e), 400)
+
+        job = submit_job(job_type, params)
+        log_job_access(action="create_job", job_id=job['id'], job_type=job_type, tool=params.get('tool'))
+        print(f"Queued {job_type} job {job['id']}")
+
+        response = jsonify({'success': True, 'job': _job_payload(job)})
+        response.headers['Location'] = f"/api/jobs/{job['id']}"
+        return response, 202
+
+    except Exception as e:
+        print(f"Error in create_job: {e}")
+        import traceback
+        traceback.print_exc()
+        return _error(str(e), 'Failed to submit job', 500)
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List stored jobs, newest first (?state= filters by state)"""
+    try:
+        job_store.maybe_sweep()
+        state = request.args.get('state')
+        jobs = [job for job in job_store.list() if not state or job['state'] == state]
+        return jsonify({'success': True, 'jobs': [_job_payload(job) for job in jobs], 'total': len(jobs)})
+    except Exception as e:
+        print(f"Error in list_jobs: {e}")
+        import traceback
+        traceback.print_exc()
+        return _error(str(e), 'Failed to list jobs', 500)
+
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's state and progress"""
+    job = job_store.read(job_id)
+    if job is None:
+        return _error('Job not found', f'No job {job_id} (unknown or expired)', 404)
+    response = jsonify({'success': True, 'job': _job_payload(job)})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@jobs_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Download a finished job's result file (supports Range and conditional requests)"""
+    try:
+        job = job_store.read(job_id)
+        if job is None:
+            return _error('Job not found', f'No job {job_id} (unknown or expired)', 404)
+        if job['state'] != 'succeeded':
+            return _error('Result not available', f"Job {job_id} is {job['state']}", 409)
+        result_path = job_store.result_path(job)
+        if result_path is None or not result_path.exists():
+            return _error('Result not available', f'Job {job_id} has no result file', 404)
+
+        log_job_access(action="get_job_result", job_id=job_id, job_type=job['type'])
+        return send_artifact(
+            result_path,
+            job['result']['mimetype'],
+            job_result_validators(result_path),
+            download_name=job['result']['download_name']
+        )
+
+    except Exception as e:
+        print(f"Error in get_job_result: {e}")
+        import traceback
+        traceback.print_exc()
+        return _error(str(e), 'Failed to send job result', 500)
+
+
+@jobs_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    """Cancel a queued or running job (finished jobs are returned unchanged)"""
+    try:
+        job = cancel_job(job_id)
+        if job is None:
+            return _error('Job not found', f'No job {job_id} (unknown or expired)', 404)
+        log_job_access(action="cancel_job", job_id=job_id, job_type=job['type'])
+        print(f"Cancel requested for job {job_id} ({job['state']})")
+        return jsonify({'success': True, 'job': _job_payload(job)})
+    except Exception as e:
+        print(f"Error in cancel_job: {e}")
+        import traceback
+        traceback.print_exc()
+        return _error(str(e), 'Failed to cancel job', 500)
@@ -7,7 +7,9 @@ from flask import Blueprint, jsonify
 # Import all blueprints
 from .activity_routes import activity_bp
 from .afm_routes import afm_bp
+from .analysis_routes import analysis_bp
 from .image_routes import image_bp
+from .job_routes import jobs_bp
 
 # Create main API blueprint
 api_bp = Blueprint('api', __name__)
@@ -34,9 +36,13 @@ def register_blueprints(app):
     app.register_blueprint(activity_bp, url_prefix='/api')  # User activity routes
     app.register_blueprint(afm_bp, url_prefix='/api')       # AFM data routes  
     app.register_blueprint(image_bp, url_prefix='/api')     # Image handling routes
+    app.register_blueprint(analysis_bp, url_prefix='/api')  # Profile analysis routes
+    app.register_blueprint(jobs_bp, url_prefix='/api')      # Background job routes
     
     print("✅ All API blueprints registered successfully:")
     print("   - /api/health (Health check)")
     print("   - /api/user-activities, /api/my-activities (Activity tracking)")
     print("   - /api/afm-files/* (AFM data operations)")
-    print("   - /api/afm-files/image* (Image handling)")
\ No newline at end of file
+    print("   - /api/afm-files/image* (Image handling)")
+    print("   - /api/afm-files/profile-stats/*, /api/afm-files/profile-psd/*, /api/afm-files/profile-linecut/*, /api/afm-files/profile-tiles/* (Profile analysis)")
+    print("   - /api/jobs, /api/jobs/<id>, /api/jobs/<id>/result, /api/jobs/<id>/cancel (Background jobs)")
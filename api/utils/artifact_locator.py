@@ -0,0 +1,498 @@
+"""
+Artifact locator
+In-memory index of per-point artifact files (profile pickles, height images) for path resolution
+"""
+import bisect
+import os
+from abc import ABC, abstractmethod
+import stat
+import threading
+import time
+from pathlib import Path
+
+from .bloom_filter import BloomFilter
+
+# Artifact kinds resolved per measurement point: kind -> (directory name, file extension)
+ARTIFACT_DIRECTORIES = {
+    'profile': ('profile_dir', '.pkl'),
+    'tiff': ('tiff_dir', '.webp'),
+}
+
+# Artifact directories served by name (image_type -> directory name)
+NAMED_ARTIFACT_DIRECTORIES = {
+    'profile': 'profile_dir',
+    'tiff': 'tiff_dir',
+    'align': 'align_dir',
+    'tip': 'tip_dir',
+    'capture': 'capture_dir',
+}
+
+# How long a directory listing is trusted before its mtime is checked again.
+# Lookups within this window cost no filesystem calls at all.
+DIRECTORY_RECHECK_SECONDS = 10.0
+
+# How long a confirmed miss is remembered (dropped earlier if the directory changes)
+NEGATIVE_CACHE_SECONDS = 30.0
+NEGATIVE_CACHE_MAX_ENTRIES = 10000
+
+# Target false-positive rate of the per-directory Bloom filters
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# Position codes tried when a site ID carries no position (e.g. '1' -> '1_UL')
+POSITION_CODES = ['UL', 'UR', 'LL', 'LR', 'C']
+
+
+def get_artifact_dir(tool_name, kind):
+    """Get the directory holding one kind of artifact for a tool"""
+    dir_name = NAMED_ARTIFACT_DIRECTORIES[kind]
+    return Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / dir_name
+
+
+def measurement_prefix(base_filename):
+    """Get the artifact filename prefix of a measurement ('#...#' followed by the point suffix)"""
+    filename_no_ext = base_filename.replace('.csv', '').replace('.pkl', '')
+    return filename_no_ext if filename_no_ext.endswith('#') else f"{filename_no_ext}#"
+
+
+def resolve_point_identity(site_id_param, site_info=None):
+    """
+    Work out point number, site ID and site coordinates for a point request
+
+    Returns:
+        (point_no, site_id, site_x, site_y)
+    """
+    if site_info and site_info.get('point_no') is not None:
+        return (
+            site_info['point_no'],
+            site_info.get('site_id', site_id_param),
+            site_info.get('site_x'),
+            site_info.get('site_y'),
+        )
+
+    # Fallback: extract point number from site_id_param (e.g. '1_UL' -> 1)
+    try:
+        if '_' in str(site_id_param):
+            point_no = int(site_id_param.split('_')[0])
+        else:
+            point_no = int(site_id_param)
+    except (ValueError, TypeError):
+        point_no = 1
+    return point_no, site_id_param, None, None
+
+
+def build_candidate_suffixes(site_id_param, site_info, extension):
+    """
+    Build the artifact filename suffixes to try for a point, most specific first
+
+    Returns:
+        List of (suffix, description) tuples, e.g. ('_1_UL_0001_Height.pkl', 'Site_ID + Point_No')
+    """
+    point_no, site_id, site_x, site_y = resolve_point_identity(site_id_param, site_info)
+    point_no_4digit = f"{point_no:04d}"
+    candidates = []
+
+    # Pattern 1: With Site_ID, Site_X, Site_Y, Point_No (most specific)
+    if site_x is not None and site_y is not None:
+        candidates.append((f"_{site_id}_{site_x}_{site_y}_{point_no_4digit}_Height{extension}",
+                           "Site_ID + Site_X + Site_Y + Point_No"))
+
+    # Pattern 2: With Site_ID and Point_No (site_id like '1_UL')
+    if site_id:
+        candidates.append((f"_{site_id}_{point_no_4digit}_Height{extension}", "Site_ID + Point_No"))
+
+    # Pattern 3: Just Point_No (no Site_ID)
+    candidates.append((f"_{point_no_4digit}_Height{extension}", "Point_No only"))
+
+    # Pattern 4: Position split out of Site_ID combined with point number
+    if '_' in str(site_id):
+        site_num, position = str(site_id).split('_', 1)
+        candidates.append((f"_{site_num}_{position}_{point_no_4digit}_Height{extension}",
+                           "Site_Num + Position + Point_No"))
+
+    # Pattern 5: Common position codes if Site_ID doesn't have a position
+    if '_' not in str(site_id):
+        for position in POSITION_CODES:
+            candidates.append((f"_{site_id}_{position}_{point_no_4digit}_Height{extension}",
+                               f"Site_ID + {position} + Point_No"))
+
+    return candidates
+
+
+def parse_point_suffix(suffix, extension):
+    """
+    Parse an artifact suffix such as '_1_UL_0001_Height.pkl'
+
+    Returns:
+        (point_no, site_id) or None when the suffix is not a per-point artifact
+    """
+    tail = f"_Height{extension}"
+    if not suffix.startswith('_') or not suffix.endswith(tail):
+        return None
+    tokens = suffix[1:-len(tail)].split('_')
+    if not tokens or not tokens[-1].isdigit():
+        return None
+    site_tokens = tokens[:-1]
+    # Drop the Site_X/Site_Y coordinates of the most specific naming pattern
+    if len(site_tokens) >= 4:
+        site_tokens = site_tokens[:-2]
+    return int(tokens[-1]), '_'.join(site_tokens) or None
+
+
+class _WatchedDirectory(ABC):
+    """
+    Base for in-memory views of a directory that are rebuilt when its mtime changes
+
+    The mtime itself is checked at most once per DIRECTORY_RECHECK_SECONDS.
+    `generation` increases on every rebuild so dependent caches can detect changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime_ns = None
+        self.checked_at = 0.0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def ensure_current(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < DIRECTORY_RECHECK_SECONDS:
+            return
+        with self._lock:
+            if not force and now - self.checked_at < DIRECTORY_RECHECK_SECONDS:
+                return
+            try:
+                mtime_ns = os.stat(self.path).st_mtime_ns
+            except OSError:
+                # Missing directory: empty view until it appears
+                if self.mtime_ns is not None or self.generation == 0:
+                    self._reset()
+                    self.generation += 1
+                self.mtime_ns = None
+                self.checked_at = now
+                return
+            if force or mtime_ns != self.mtime_ns:
+                with os.scandir(self.path) as entries:
+                    self._rebuild([entry.name for entry in entries])
+                self.mtime_ns = mtime_ns
+                self.generation += 1
+            self.checked_at = now
+
+    @abstractmethod
+    def _reset(self):
+        """Empty the view (the directory is missing)"""
+
+    @abstractmethod
+    def _rebuild(self, names):
+        """Rebuild the view from the directory's current file names"""
+
+
+class DirectoryIndex(_WatchedDirectory):
+    """Listing of one per-point artifact directory grouped by measurement prefix"""
+
+    def __init__(self, path, extension):
+        super().__init__(path)
+        self.extension = extension
+        # prefix -> {suffix: filename}
+        self.by_prefix = {}
+
+    def _reset(self):
+        self.by_prefix = {}
+
+    def _rebuild(self, names):
+        by_prefix = {}
+        for name in names:
+            if not name.endswith(self.extension):
+                continue
+            split_at = name.rfind('#')
+            if split_at < 0:
+                continue
+            prefix, suffix = name[:split_at + 1], name[split_at + 1:]
+            by_prefix.setdefault(prefix, {})[suffix] = name
+        # Swap in the finished index so concurrent readers never see a partial one
+        self.by_prefix = by_prefix
+        print(f"Indexed {sum(len(v) for v in by_prefix.values())} artifacts in {self.path}")
+
+    def files_for(self, prefix):
+        self.ensure_current()
+        return self.by_prefix.get(prefix, {})
+
+
+class DirectoryMembership(_WatchedDirectory):
+    """Bloom filter over every filename of a directory, for cheap "definitely absent" answers"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.bloom = BloomFilter([])
+
+    def _reset(self):
+        self.bloom = BloomFilter([])
+
+    def _rebuild(self, names):
+        self.bloom = BloomFilter(names, BLOOM_FALSE_POSITIVE_RATE)
+        print(f"Built Bloom filter for {len(names)} files in {self.path} ({self.bloom.nbytes} bytes)")
+
+    def may_contain(self, name):
+        self.ensure_current()
+        return name in self.bloom
+
+
+class _ListingSnapshot:
+    """
+    One state of a directory listing: entries, sorted names and (lazily) mtime order
+
+    Never modified once built; a refresh swaps in a new snapshot, so readers
+    holding this one keep a consistent view.
+    """
+
+    def __init__(self, entries):
+        # name -> (size, mtime_ns)
+        self.entries = entries
+        self.names = sorted(entries)
+        self._by_mtime = None
+
+    def mtime_order(self):
+        """name -> rank, newest first (computed on first use)"""
+        if self._by_mtime is None:
+            entries = self.entries
+            self._by_mtime = {name: rank for rank, name in enumerate(
+                sorted(entries, key=lambda name: entries[name][1], reverse=True))}
+        return self._by_mtime
+
+
+class DirectoryListing(_WatchedDirectory):
+    """
+    Sorted listing of a directory with size and mtime per file
+
+    Rebuilt when the directory changes, with one stat per file so files rewritten
+    or replaced under the same name report their new size and mtime.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.snapshot = _ListingSnapshot({})
+
+    def _reset(self):
+        self.snapshot = _ListingSnapshot({})
+
+    def _rebuild(self, names):
+        previous = self.snapshot.entries
+        entries = {}
+        added = changed = 0
+        for name in names:
+            if name.startswith('.'):
+                continue
+            try:
+                file_stat = os.stat(self.path / name)
+            except OSError:
+                continue
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+            entry = (file_stat.st_size, file_stat.st_mtime_ns)
+            old_entry = previous.get(name)
+            if old_entry is None:
+                added += 1
+            elif old_entry != entry:
+                changed += 1
+            entries[name] = entry
+        removed = len(previous.keys() - entries.keys())
+        # Swap in the finished listing so concurrent readers never see a partial one
+        self.snapshot = _ListingSnapshot(entries)
+        print(f"Listed {len(entries)} files in {self.path} (+{added} / ~{changed} / -{removed})")
+
+    def select(self, prefix=None, search=None, sort='name'):
+        """
+        Names matching a filename prefix and/or substring, in the requested order
+
+        Args:
+            prefix: Only names starting with this (binary search on the sorted listing)
+            search: Only names containing this, case-insensitive
+            sort: 'name' (ascending) or 'mtime' (newest first)
+
+        Returns:
+            (names, entries): the matching names and the name -> (size, mtime_ns)
+            mapping of the snapshot they were selected from
+        """
+        self.ensure_current()
+        snapshot = self.snapshot
+        names = snapshot.names
+        if prefix:
+            start = bisect.bisect_left(names, prefix)
+            end = bisect.bisect_left(names, prefix + '\U0010ffff', lo=start)
+            names = names[start:end]
+        if search:
+            needle = search.lower()
+            names = [name for name in names if needle in name.lower()]
+        if sort == 'mtime':
+            names = sorted(names, key=snapshot.mtime_order().__getitem__)
+        return names, snapshot.entries
+
+
+class NegativeLookupCache:
+    """
+    Short-lived memory of lookups that found nothing
+
+    Entries expire after NEGATIVE_CACHE_SECONDS and are ignored as soon as the
+    directory they were checked against has been rebuilt.
+    """
+
+    def __init__(self, ttl=NEGATIVE_CACHE_SECONDS, max_entries=NEGATIVE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_missing(self, key, generation):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        expires_at, entry_generation = entry
+        return entry_generation == generation and time.monotonic() < expires_at
+
+    def record(self, key, generation):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl, generation)
+
+
+class ArtifactLocator:
+    """Resolves per-point artifact paths from directory indexes instead of per-candidate stat calls"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._memberships = {}
+        self._listings = {}
+        self._lock = threading.Lock()
+        self.negative_cache = NegativeLookupCache()
+
+    def _index(self, tool_name, kind):
+        key = (tool_name, kind)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    _, extension = ARTIFACT_DIRECTORIES[kind]
+                    index = DirectoryIndex(get_artifact_dir(tool_name, kind), extension)
+                    self._indexes[key] = index
+        return index
+
+    def _membership(self, tool_name, kind):
+        key = (tool_name, kind)
+        membership = self._memberships.get(key)
+        if membership is None:
+            with self._lock:
+                membership = self._memberships.get(key)
+                if membership is None:
+                    membership = DirectoryMembership(get_artifact_dir(tool_name, kind))
+                    self._memberships[key] = membership
+        return membership
+
+    def _listing(self, tool_name, kind):
+        key = (tool_name, kind)
+        listing = self._listings.get(key)
+        if listing is None:
+            with self._lock:
+                listing = self._listings.get(key)
+                if listing is None:
+                    listing = DirectoryListing(get_artifact_dir(tool_name, kind))
+                    self._listings[key] = listing
+        return listing
+
+    def find(self, kind, base_filename, site_id_param, tool_name='MAP608', site_info=None):
+        """
+        Find the artifact file for a measurement point
+
+        Returns:
+            (Path or None, list of (suffix, description) candidates tried)
+        """
+        index = self._index(tool_name, kind)
+        prefix = measurement_prefix(base_filename)
+        files = index.files_for(prefix)
+        candidates = build_candidate_suffixes(site_id_param, site_info, index.extension)
+
+        # Points the ResultPage keeps retrying are answered from the negative cache
+        miss_key = ('point', tool_name, kind, prefix, tuple(suffix for suffix, _ in candidates))
+        if self.negative_cache.is_missing(miss_key, index.generation):
+            return None, candidates
+
+        for suffix, _ in candidates:
+            name = files.get(suffix)
+            if name is not None:
+                return index.path / name, candidates
+
+        self.negative_cache.record(miss_key, index.generation)
+        return None, candidates
+
+    def may_exist(self, kind, filename, tool_name='MAP608'):
+        """
+        Check whether an artifact file may exist, without touching the filesystem
+
+        False means the file is definitely absent (Bloom filter negative, or a miss
+        confirmed within NEGATIVE_CACHE_SECONDS); True means it is worth a stat.
+        """
+        membership = self._membership(tool_name, kind)
+        if not membership.may_contain(filename):
+            return False
+        return not self.negative_cache.is_missing(('file', tool_name, kind, filename), membership.generation)
+
+    def record_missing(self, kind, filename, tool_name='MAP608'):
+        """Remember a file that passed may_exist() but was not found (Bloom false positive or stale listing)"""
+        membership = self._membership(tool_name, kind)
+        self.negative_cache.record(('file', tool_name, kind, filename), membership.generation)
+
+    def list_points(self, kind, base_filename, tool_name='MAP608'):
+        """
+        List the artifacts of one measurement
+
+        Returns:
+            List of dicts with point_no, site_id and filename, sorted by point number
+        """
+        index = self._index(tool_name, kind)
+        points = []
+        for suffix, name in index.files_for(measurement_prefix(base_filename)).items():
+            parsed = parse_point_suffix(suffix, index.extension)
+            if parsed is None:
+                continue
+            point_no, site_id = parsed
+            points.append({'point_no': point_no, 'site_id': site_id, 'filename': name})
+        points.sort(key=lambda point: (point['point_no'], point['filename']))
+        return points
+
+    def list_directory(self, kind, tool_name='MAP608', base_filename=None, search=None,
+                       sort='name', offset=0, limit=100):
+        """
+        Page through the files of an artifact directory
+
+        Args:
+            kind: Artifact type ('profile', 'tiff', 'align', 'tip', 'capture')
+            base_filename: Only files of this measurement
+            search: Only files whose name contains this (case-insensitive)
+            sort: 'name' or 'mtime' (newest first)
+            offset, limit: Page window
+
+        Returns:
+            (total matching files, list of dicts with filename, size and mtime_ns)
+        """
+        listing = self._listing(tool_name, kind)
+        prefix = measurement_prefix(base_filename) if base_filename else None
+        names, entries = listing.select(prefix, search, sort)
+        page = []
+        for name in names[offset:offset + limit]:
+            size, mtime_ns = entries[name]
+            page.append({'filename': name, 'size': size, 'mtime_ns': mtime_ns})
+        return len(names), page
+
+    def refresh(self, tool_name):
+        """Rebuild every index of a tool now (e.g. after the catalog is regenerated)"""
+        for kind in ARTIFACT_DIRECTORIES:
+            self._index(tool_name, kind).ensure_current(force=True)
+        for kind in NAMED_ARTIFACT_DIRECTORIES:
+            self._membership(tool_name, kind).ensure_current(force=True)
+
+
+# Shared locator for this worker process
+artifact_locator = ArtifactLocator()
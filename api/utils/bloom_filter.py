@@ -0,0 +1,52 @@
+"""
+Bloom filter
+Compact probabilistic set membership for large artifact directory listings
+"""
+import hashlib
+import math
+
+import numpy as np
+
+
+def _hash_pair(item):
+    """Two independent 64-bit hashes of a string for double hashing"""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """
+    Immutable Bloom filter built from a collection of strings
+
+    A negative answer is certain ("definitely absent"); a positive answer is
+    wrong with probability of about false_positive_rate.
+    """
+
+    def __init__(self, items, false_positive_rate=0.01):
+        items = list(items)
+        count = max(len(items), 1)
+        self.size = max(64, int(math.ceil(-count * math.log(false_positive_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / count * math.log(2))))
+        self.item_count = len(items)
+
+        bits = np.zeros(self.size, dtype=bool)
+        if items:
+            pairs = np.array([_hash_pair(item) for item in items], dtype=np.uint64)
+            rounds = np.arange(self.hash_count, dtype=np.uint64)
+            # position_i = h1 + i * h2 (mod size), with uint64 wrap-around
+            positions = (pairs[:, :1] + rounds * pairs[:, 1:]) % np.uint64(self.size)
+            bits[positions.ravel().astype(np.int64)] = True
+        self._bits = np.packbits(bits)
+
+    def __contains__(self, item):
+        h1, h2 = _hash_pair(item)
+        bits = self._bits
+        for i in range(self.hash_count):
+            position = ((h1 + i * h2) & 0xFFFFFFFFFFFFFFFF) % self.size
+            if not bits[position >> 3] & (0x80 >> (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self):
+        return self._bits.nbytes
@@ -0,0 +1,209 @@
+"""
+Response compression utilities
+Negotiates gzip/brotli from Accept-Encoding and caches compressed payloads per source file
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import g, request
+
+try:
+    # Optional brotli support
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+# Compression levels (balanced for numeric JSON payloads)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Upper bound for compressed payloads kept in memory per worker process
+COMPRESSED_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'image/svg+xml',
+}
+
+
+def supported_encodings():
+    """Content encodings this server can produce, in preference order"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encoding=None):
+    """
+    Pick the content encoding for a request
+
+    Args:
+        accept_encoding: Accept-Encoding header value (defaults to the current request's)
+
+    Returns:
+        'br', 'gzip' or None when the client accepts neither
+    """
+    if accept_encoding is None:
+        accept_encoding = request.headers.get('Accept-Encoding', '')
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_bytes(data, encoding):
+    """Compress a payload with the given content encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+class CompressedPayloadCache:
+    """
+    Thread-safe LRU cache of compressed response bodies
+
+    Entries are keyed by (cache_key, encoding) and remember the source signature
+    (e.g. file mtime and size) they were built from, so a changed source file is
+    never served from a stale entry.
+    """
+
+    def __init__(self, max_bytes=COMPRESSED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, signature):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_signature, body, mimetype = entry
+            if entry_signature != signature:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body, mimetype
+
+    def put(self, key, signature, body, mimetype):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (signature, body, mimetype)
+            self._total_bytes += len(body)
+            while self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove(self, key):
+        _, body, _ = self._entries.pop(key)
+        self._total_bytes -= len(body)
+
+
+# Shared cache for this worker process
+compressed_payload_cache = CompressedPayloadCache()
+
+
+def enable_compressed_cache(cache_key, signature):
+    """
+    Mark the current response as cacheable in compressed form
+
+    Call from a route before building the response; compress_response() stores the
+    compressed body under (cache_key, encoding) on the way out.
+    """
+    g.compressed_cache_entry = (cache_key, signature)
+
+
+def get_cached_compressed_response(cache_key, signature, response_class):
+    """
+    Return a ready response from the compressed payload cache, or None on a miss
+
+    Args:
+        cache_key: Key identifying the payload (route, source path, query)
+        signature: Current signature of the source file
+        response_class: Response class used to build the response
+    """
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return None
+
+    cached = compressed_payload_cache.get((cache_key, encoding), signature)
+    if cached is None:
+        return None
+
+    body, mimetype = cached
+    response = response_class(body, mimetype=mimetype)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    g.compressed_cache_hit = True
+    return response
+
+
+def compress_response(response):
+    """Compress an outgoing response when the client accepts it (after_request hook)"""
+    if getattr(g, 'compressed_cache_hit', False):
+        return response
+
+    if (response.direct_passthrough
+            or response.is_streamed
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    # Whatever the outcome, the representation depends on Accept-Encoding
+    response.vary.add('Accept-Encoding')
+
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    compressed = compress_bytes(body, encoding)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+    cache_entry = getattr(g, 'compressed_cache_entry', None)
+    if cache_entry is not None:
+        cache_key, signature = cache_entry
+        compressed_payload_cache.put((cache_key, encoding), signature, compressed, response.mimetype)
+
+    return response
@@ -0,0 +1,179 @@
+"""
+Deep zoom images
+DZI tile pyramids of large measurement images: levels stored on disk once, tiles encoded lazily and cached
+"""
+import io
+import json
+import math
+
+import numpy as np
+from PIL import Image
+
+from .disk_cache import DiskCache, source_key
+from .executors import run_in_process
+from .thumbnails import to_displayable
+
+# DZI tile layout: 254 px tiles with a 1 px overlap (256 px images inside the pyramid)
+DZI_TILE_SIZE = 254
+DZI_OVERLAP = 1
+
+# Tile formats: extension -> (Pillow format, mimetype)
+DZI_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+DEFAULT_DZI_FORMAT = 'webp'
+DZI_TILE_QUALITY = 85
+
+# Measurement images are trusted; allow decoding sources far beyond Pillow's bomb limit
+MAX_DEEP_ZOOM_PIXELS = 1024 * 1024 * 1024
+
+DZI_NAMESPACE = 'http://schemas.microsoft.com/deepzoom/2008'
+
+# Levels (uint8 .npy, memory-mapped when tiled) and encoded tiles on the local disk
+deep_zoom_cache = DiskCache('deep-zoom', max_bytes=8 * 1024 * 1024 * 1024)
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def build_levels(source_path, key):
+    """
+    Decode an image once and store every DZI level under key
+
+    Level max_level is full size, each lower level halves it (rounding up) and
+    level 0 is 1x1. Writes straight to the disk cache, so level arrays never
+    cross the process boundary. Runs inside the process pool.
+
+    Returns:
+        Metadata dict (width, height, max_level, mode)
+    """
+    # Raise the bomb limit for this decode only: pool workers run other Pillow jobs too
+    previous_limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = MAX_DEEP_ZOOM_PIXELS
+    try:
+        with Image.open(source_path) as image:
+            image.seek(0)
+            image.load()
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous_limit
+
+    image = to_displayable(image)
+    width, height = image.size
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    for level in range(max_level, -1, -1):
+        deep_zoom_cache.put(f"{key}-{level}", _npy_bytes(np.asarray(image)), '.npy')
+        if level:
+            image = image.reduce(2)
+    return {'width': width, 'height': height, 'max_level': max_level, 'mode': image.mode}
+
+
+class DeepZoomImage:
+    """
+    Stored DZI pyramid of one image
+
+    Tile (col, row) of a level covers DZI_TILE_SIZE pixels from col*DZI_TILE_SIZE
+    and row*DZI_TILE_SIZE, plus DZI_OVERLAP pixels on every side that has a neighbour.
+    """
+
+    def __init__(self, key, meta):
+        self.key = key
+        self.meta = meta
+
+    def level_size(self, level):
+        scale = 2 ** (self.meta['max_level'] - level)
+        return -(-self.meta['width'] // scale), -(-self.meta['height'] // scale)
+
+    def has_tile(self, level, col, row):
+        if not 0 <= level <= self.meta['max_level']:
+            return False
+        width, height = self.level_size(level)
+        return 0 <= col < -(-width // DZI_TILE_SIZE) and 0 <= row < -(-height // DZI_TILE_SIZE)
+
+    def has_level(self, level):
+        """Whether a level is still stored (levels can be evicted independently)"""
+        return deep_zoom_cache.get(f"{self.key}-{level}", '.npy') is not None
+
+    def descriptor(self, tile_format):
+        """DZI XML descriptor (the .dzi file OpenSeadragon and other viewers open)"""
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="{DZI_NAMESPACE}" Format="{tile_format}" '
+            f'Overlap="{DZI_OVERLAP}" TileSize="{DZI_TILE_SIZE}">'
+            f'<Size Width="{self.meta["width"]}" Height="{self.meta["height"]}"/>'
+            '</Image>\n'
+        )
+
+    def _encode_tile(self, level, col, row, tile_format):
+        level_path = deep_zoom_cache.get(f"{self.key}-{level}", '.npy')
+        if level_path is None:
+            raise FileNotFoundError(f"Deep zoom level {level} not cached")
+        pixels = np.load(level_path, mmap_mode='r')
+
+        width, height = self.level_size(level)
+        left = max(0, col * DZI_TILE_SIZE - DZI_OVERLAP)
+        top = max(0, row * DZI_TILE_SIZE - DZI_OVERLAP)
+        right = min(width, (col + 1) * DZI_TILE_SIZE + DZI_OVERLAP)
+        bottom = min(height, (row + 1) * DZI_TILE_SIZE + DZI_OVERLAP)
+        tile = Image.fromarray(np.ascontiguousarray(pixels[top:bottom, left:right]))
+
+        pillow_format = DZI_FORMATS[tile_format][0]
+        if pillow_format == 'JPEG' and tile.mode == 'RGBA':
+            tile = tile.convert('RGB')
+        buffer = io.BytesIO()
+        if pillow_format == 'PNG':
+            tile.save(buffer, format='PNG')
+        else:
+            tile.save(buffer, format=pillow_format, quality=DZI_TILE_QUALITY)
+        return buffer.getvalue()
+
+    def tile(self, level, col, row, tile_format):
+        """
+        Get one encoded tile, encoding it from the stored level on first access
+
+        Returns:
+            Path of the cached tile file
+
+        Raises:
+            FileNotFoundError: When the level was evicted from the cache
+        """
+        return deep_zoom_cache.get_or_create(
+            f"{self.key}-{level}-{col}-{row}",
+            lambda: self._encode_tile(level, col, row, tile_format),
+            f".{tile_format}"
+        )
+
+
+def get_deep_zoom_image(source_path, missing_level=None):
+    """
+    Get the DZI pyramid of an image file, building its levels on first access
+
+    The full-size image is decoded once on the process pool; tiles are encoded
+    later, one at a time, as viewers ask for them.
+
+    Args:
+        missing_level: Level found evicted from the cache; the levels are rebuilt
+            unless another request has stored it again in the meantime
+    """
+    key = source_key(source_path, 'deep-zoom', DZI_TILE_SIZE)
+    if missing_level is None:
+        meta_path = deep_zoom_cache.get(key, '.json')
+        if meta_path is not None:
+            return DeepZoomImage(key, json.loads(meta_path.read_bytes()))
+
+    with deep_zoom_cache.lock(key):
+        # Another request (or worker) may have finished the build while we waited
+        meta_path = deep_zoom_cache.get(key, '.json')
+        if meta_path is not None:
+            deep_zoom_image = DeepZoomImage(key, json.loads(meta_path.read_bytes()))
+            if missing_level is None or deep_zoom_image.has_level(missing_level):
+                return deep_zoom_image
+
+        meta = run_in_process(build_levels, str(source_path), key)
+        # Metadata is written last: its presence means every level is stored
+        deep_zoom_cache.put(key, json.dumps(meta).encode('utf-8'), '.json')
+        return DeepZoomImage(key, meta)
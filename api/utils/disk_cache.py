@@ -0,0 +1,168 @@
+"""
+Local disk cache
+Generated artifacts (tiles, renders, thumbnails) stored under a local cache directory, keyed by their source file
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    # Cross-process locks (POSIX); without it concurrent builds are coalesced per process only
+    import fcntl
+except ImportError:  # pragma: no cover - depends on the platform
+    fcntl = None
+
+# Root of the local cache (relative to the working directory, like logs/)
+CACHE_ROOT = Path(os.getenv('AFM_CACHE_DIR', 'cache'))
+
+# Default size budget per cache namespace
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Minimum interval between eviction scans of one namespace
+EVICTION_INTERVAL_SECONDS = 60.0
+
+# Lock files per namespace that entry keys are striped over
+LOCK_STRIPES = 256
+
+
+def source_key(path, *variant):
+    """
+    Cache key for an artifact derived from a source file
+
+    Includes the file's mtime and size, so a changed source maps to a new entry.
+    """
+    stat = os.stat(path)
+    parts = [str(path), str(stat.st_mtime_ns), str(stat.st_size), *map(str, variant)]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """
+    Content cache on the local disk with LRU eviction by total size
+
+    Entries are files named by key (two-level fan-out). Reads refresh the entry's
+    mtime, and an occasional scan removes the least recently used entries once the
+    namespace grows beyond max_bytes. Writes are atomic (temp file + rename), so
+    concurrent uwsgi workers never see partial files, and lock() lets one worker
+    build an entry while the others wait for it instead of building it again.
+    """
+
+    def __init__(self, namespace, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self._last_eviction = 0.0
+        self._lock = threading.Lock()
+        self._stripe_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    @property
+    def root(self):
+        return CACHE_ROOT / self.namespace
+
+    def path_for(self, key, suffix=''):
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def get(self, key, suffix=''):
+        """Return the cached file for key (refreshing its LRU position), or None"""
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data, suffix=''):
+        """Store bytes under key and return the cached file path"""
+        path = self.path_for(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.maybe_evict()
+        return path
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Exclusive lock on key across the threads and uwsgi workers of this host
+
+        Keys are striped over LOCK_STRIPES lock files, so lock files never pile up
+        (unrelated keys occasionally wait on each other). POSIX record locks belong
+        to a process, so a thread lock per stripe orders the threads and lockf() the
+        processes; pool processes forked while a lock is held do not inherit it.
+        Locks do not nest: code holding one must not take another of this cache.
+        """
+        stripe = zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES
+        with self._stripe_locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            lock_dir = self.root / '.locks'
+            lock_dir.mkdir(parents=True, exist_ok=True)
+            with open(lock_dir / f"{stripe:03d}.lock", 'a+b') as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.lockf(f, fcntl.LOCK_UN)
+
+    def get_or_create(self, key, create, suffix=''):
+        """
+        Return the cached file for key, creating it with create() -> bytes on a miss
+
+        Concurrent misses, in this worker or others, call create() once; the rest
+        wait and read the stored entry. create() returning None is treated as
+        "nothing to cache" and returns None.
+        """
+        path = self.get(key, suffix)
+        if path is not None:
+            return path
+        with self.lock(key):
+            # Another thread or worker may have stored it while we waited
+            path = self.get(key, suffix)
+            if path is not None:
+                return path
+            data = create()
+            if data is None:
+                return None
+            return self.put(key, data, suffix)
+
+    def maybe_evict(self):
+        """Evict least recently used entries, at most once per EVICTION_INTERVAL_SECONDS"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_eviction < EVICTION_INTERVAL_SECONDS:
+                return
+            self._last_eviction = now
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the namespace fits in max_bytes"""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.lock'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
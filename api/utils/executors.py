@@ -0,0 +1,105 @@
+"""
+Shared worker pools
+Thread pool for blocking file I/O and process pool for CPU-heavy numpy work, one of each per worker process
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Threads used for concurrent artifact I/O (pickle reads, path resolution) per process
+IO_POOL_WORKERS = 8
+
+# Processes used for CPU-heavy transforms per uwsgi worker (uwsgi.ini runs 4 workers)
+PROCESS_POOL_WORKERS = max(1, min(2, os.cpu_count() or 1))
+
+_io_executor = None
+_process_executor = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked child (process pool worker) inherits the pool objects but not their
+    # threads; drop them so the child creates its own pools on first use
+    global _io_executor, _process_executor, _lock
+    _io_executor = None
+    _process_executor = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_io_executor():
+    """
+    Get the process-wide I/O thread pool
+
+    Created on first use rather than at import, so uwsgi workers forked from the
+    master each start their own threads.
+    """
+    global _io_executor
+    if _io_executor is None:
+        with _lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix='afm-io')
+    return _io_executor
+
+
+def get_process_executor():
+    """
+    Get the process-wide pool for CPU-heavy work
+
+    Uses the fork start method: under uwsgi sys.executable is the uwsgi binary, so
+    spawn/forkserver children cannot be started. Servers create it with
+    start_process_executor() before any request thread exists; the lazy creation
+    here is for single-threaded callers (scripts, job processes). Tasks submitted
+    here must be pure computations (numpy in, numpy out) that do not log or touch
+    Flask state.
+    """
+    global _process_executor
+    if _process_executor is None:
+        with _lock:
+            if _process_executor is None:
+                _process_executor = ProcessPoolExecutor(
+                    max_workers=PROCESS_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context('fork'),
+                )
+    return _process_executor
+
+
+def _noop():
+    return None
+
+
+def start_process_executor():
+    """
+    Create the process pool and fork all of its workers now
+
+    Call while the process is still single-threaded (uwsgi post-fork hook, dev
+    server before it serves): a fork from a threaded request worker can copy a
+    lock held by another thread into the child, which then deadlocks. The pool
+    forks every worker on its first task, so one no-op task starts them all.
+    """
+    get_process_executor().submit(_noop).result()
+
+
+def run_in_process(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the process pool and wait for its result
+
+    The calling request thread still waits for the result; what the pool buys is
+    that the transform runs outside this process's GIL, so the worker's other
+    request threads keep running meanwhile. A pool whose worker died is discarded;
+    its replacement is forked on the next call (from a threaded worker, the one
+    case where that is accepted over losing the pool until the worker restarts).
+    """
+    global _process_executor
+    executor = get_process_executor()
+    try:
+        return executor.submit(fn, *args, **kwargs).result()
+    except BrokenProcessPool:
+        with _lock:
+            if _process_executor is executor:
+                _process_executor = None
+        raise
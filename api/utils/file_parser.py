@@ -1,10 +1,23 @@
 """
 File parsing utilities using pathlib for cross-platform compatibility
 """
+import os
 import re
 from pathlib import Path
 import pickle
 
+from .artifact_locator import artifact_locator
+from .disk_cache import DiskCache
+from .single_flight import SingleFlight
+
+# Concurrent catalog loads of the same tool share one read of the parsed cache file
+# (per worker process: the loaded list lives in each worker's memory)
+_catalog_loads = SingleFlight()
+
+# Only its lock() is used: one uwsgi worker generates a missing catalog cache file
+# while the others wait and then load it
+_catalog_build_locks = DiskCache('catalog')
+
 # Old version of parse_filename (commented out)
 # def parse_filename(filename):
 #     """
@@ -247,21 +260,40 @@ def check_pickle_file_exists(parsed_file, tool_name='MAP608'):
         return False
 
 
+def get_file_list_cache_path(tool_name='MAP608'):
+    """Get the path of the pre-parsed file list cache for a tool"""
+    return Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'data_dir_list_parsed.pkl'
+
+
 def load_afm_file_list(tool_name='MAP608'):
-    """Load AFM file list from pre-parsed pickle file, generate cache if not exists"""
+    """
+    Load AFM file list from pre-parsed pickle file, generate cache if not exists
+
+    Concurrent calls for the same tool (a new lot makes every open page refresh)
+    share one load; the returned list must not be mutated.
+    """
+    return _catalog_loads.do(tool_name, lambda: _load_afm_file_list(tool_name))
+
+
+def _load_afm_file_list(tool_name):
     try:
         print(f"Loading AFM file list for tool: {tool_name}")
         
         # Use pathlib for cross-platform file paths
-        parsed_pickle_path = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'data_dir_list_parsed.pkl'
+        parsed_pickle_path = get_file_list_cache_path(tool_name)
         
         print(f"Loading parsed file list from: {parsed_pickle_path}")
         
         if not parsed_pickle_path.exists():
             print(f"Parsed pickle file not found: {parsed_pickle_path}")
-            print("Generating cache file for future use...")
-            # Parse and cache the data
-            success = parse_and_cache_afm_data(tool_name)
+            with _catalog_build_locks.lock(tool_name):
+                # Another worker may have generated it while we waited
+                if parsed_pickle_path.exists():
+                    success = True
+                else:
+                    print("Generating cache file for future use...")
+                    # Parse and cache the data
+                    success = parse_and_cache_afm_data(tool_name)
             if success and parsed_pickle_path.exists():
                 print("Cache file generated successfully")
                 # Now load from the newly created cache
@@ -378,15 +410,21 @@ def parse_and_cache_afm_data(tool_name='MAP608'):
         }
 
         # Save to cache file
-        cache_path = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'data_dir_list_parsed.pkl'
+        cache_path = get_file_list_cache_path(tool_name)
 
         # Ensure directory exists
         cache_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(cache_path, 'wb') as f:
+        # Write to a temp file and rename, so other workers never load a partial cache
+        temp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
             pickle.dump(cache_data, f)
+        os.replace(temp_path, cache_path)
 
         print(f"Successfully cached {len(measurements)} measurements to {cache_path}")
+        
+        # Rebuild the artifact indexes together with the catalog
+        artifact_locator.refresh(tool_name)
         print(f"Cache file size: {cache_path.stat().st_size / 1024:.2f} KB")
         
         # Print summary of file availability
@@ -487,112 +525,31 @@ def get_site_mapping_from_pickle(base_filename, tool_name='MAP608'):
         return {}
 
 
+def _find_point_artifact(kind, base_filename, site_id_param, tool_name, site_info):
+    """Resolve a per-point artifact through the directory index and log the outcome"""
+    label = 'PROFILE' if kind == 'profile' else 'IMAGE'
+    print(f"\n=== {label} FILE REQUEST ===")
+    print(f"Base filename: {base_filename}")
+    print(f"Site ID parameter: {site_id_param}")
+    print(f"Tool name: {tool_name}")
+    print(f"Complete site info: {site_info}")
+    
+    found_path, candidates = artifact_locator.find(kind, base_filename, site_id_param, tool_name, site_info)
+    
+    if found_path is not None:
+        print(f"=== {label} FILE MATCHED: {found_path.name} ===")
+        return found_path
+    
+    print(f"NO {label} FILE FOUND after trying {len(candidates)} patterns:")
+    for i, (suffix, description) in enumerate(candidates, 1):
+        print(f"  {i}. {description}: {suffix}")
+    return None
+
+
 def get_profile_file_path_by_filename(base_filename, site_id_param, tool_name='MAP608', site_info=None):
-    """Get the profile file path using comprehensive filename pattern matching"""
+    """Get the profile file path by matching filename patterns against the profile_dir index"""
     try:
-        print(f"\n=== PROFILE FILE REQUEST ===")
-        print(f"Base filename (before encoding): {base_filename}")
-        print(f"Site ID parameter: {site_id_param}")
-        print(f"Tool name: {tool_name}")
-        print(f"Complete site info: {site_info}")
-        
-        # Remove extension from base filename if present
-        filename_no_ext = base_filename.replace('.csv', '').replace('.pkl', '')
-        print(f"Cleaned filename: {filename_no_ext}")
-        
-        # Extract information from site_info or fallback to site_id_param
-        if site_info and site_info.get('point_no') is not None:
-            point_no = site_info['point_no']  # Already integer from Flask route
-            actual_site_id = site_info.get('site_id', site_id_param)  # String
-            site_x = site_info.get('site_x')  # String (could be like '-1578.2')
-            site_y = site_info.get('site_y')  # String (could be like '-310.6')
-        else:
-            # Fallback: extract point number from site_id_param (e.g., '1_UL' -> 1)
-            try:
-                if '_' in str(site_id_param):
-                    point_no = int(site_id_param.split('_')[0])
-                else:
-                    point_no = int(site_id_param)
-                actual_site_id = site_id_param
-                site_x = None
-                site_y = None
-            except (ValueError, TypeError):
-                point_no = 1
-                actual_site_id = site_id_param
-                site_x = None
-                site_y = None
-        
-        point_no_4digit = f"{point_no:04d}"
-        
-        print(f"Site ID: '{actual_site_id}' (type: {type(actual_site_id)})")
-        print(f"Point No: {point_no} -> 4-digit: {point_no_4digit}")
-        print(f"Site X: '{site_x}' (type: {type(site_x)}), Site Y: '{site_y}' (type: {type(site_y)})")
-        
-        # Build filename patterns based on site information
-        patterns_to_try = []
-        
-        # Pattern 1: With Site_ID, Site_X, Site_Y, Point_No (most specific)
-        if site_x is not None and site_y is not None:
-            pattern = f"_{actual_site_id}_{site_x}_{site_y}_{point_no_4digit}_Height.pkl"
-            patterns_to_try.append((pattern, "Site_ID + Site_X + Site_Y + Point_No"))
-        
-        # Pattern 2: With Site_ID and Point_No (actual_site_id like '1_UL')
-        if actual_site_id:
-            pattern = f"_{actual_site_id}_{point_no_4digit}_Height.pkl"
-            patterns_to_try.append((pattern, "Site_ID + Point_No"))
-        
-        # Pattern 3: Just Point_No (no Site_ID)
-        pattern = f"_{point_no_4digit}_Height.pkl"
-        patterns_to_try.append((pattern, "Point_No only"))
-        
-        # Pattern 4: Try extracting position from Site_ID and combining with point number
-        if '_' in str(actual_site_id):
-            try:
-                site_num, position = str(actual_site_id).split('_', 1)
-                pattern = f"_{site_num}_{position}_{point_no_4digit}_Height.pkl"
-                patterns_to_try.append((pattern, f"Site_Num + Position + Point_No"))
-            except ValueError:
-                pass
-        
-        # Pattern 5: Try with common position codes if Site_ID doesn't have position
-        if '_' not in str(actual_site_id):
-            position_codes = ['UL', 'UR', 'LL', 'LR', 'C']
-            for position in position_codes:
-                pattern = f"_{actual_site_id}_{position}_{point_no_4digit}_Height.pkl"
-                patterns_to_try.append((pattern, f"Site_ID + {position} + Point_No"))
-        
-        print(f"\nTRYING {len(patterns_to_try)} FILENAME PATTERNS:")
-        
-        # Try each pattern
-        for i, (pattern, description) in enumerate(patterns_to_try, 1):
-            # Handle filename ending with # or not
-            if filename_no_ext.endswith('#'):
-                test_filename = f"{filename_no_ext}{pattern}"
-            else:
-                test_filename = f"{filename_no_ext}#{pattern}"
-            
-            test_path = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'profile_dir' / test_filename
-            
-            print(f"  {i}. Pattern: {description}")
-            print(f"     Filename: {test_filename}")
-            print(f"     Path: {test_path}")
-            
-            if test_path.exists():
-                print(f"     FOUND!")
-                print(f"\n=== PROFILE FILE MATCHED ===")
-                print(f"Final filename: {test_filename}")
-                print(f"Full path: {test_path}")
-                return test_path
-            else:
-                print(f"     Not found")
-        
-        print(f"\nNO PROFILE FILE FOUND after trying {len(patterns_to_try)} patterns")
-        print(f"Summary:")
-        print(f"  Site ID: {actual_site_id}")
-        print(f"  Point No: {point_no} (4-digit: {point_no_4digit})")
-        print(f"  Site coordinates: X={site_x}, Y={site_y}")
-        return None
-            
+        return _find_point_artifact('profile', base_filename, site_id_param, tool_name, site_info)
     except Exception as e:
         print(f"Error getting profile file path: {e}")
         import traceback
@@ -601,113 +558,11 @@ def get_profile_file_path_by_filename(base_filename, site_id_param, tool_name='M
 
 
 def get_image_file_path_by_filename(base_filename, site_id_param, tool_name='MAP608', site_info=None):
-    """Get the image file path using comprehensive filename pattern matching"""
+    """Get the image file path by matching filename patterns against the tiff_dir index"""
     try:
-        print(f"\n=== IMAGE FILE REQUEST ===")
-        print(f"Base filename (before encoding): {base_filename}")
-        print(f"Site ID parameter: {site_id_param}")
-        print(f"Tool name: {tool_name}")
-        print(f"Complete site info: {site_info}")
-        
-        # Remove extension from base filename if present
-        filename_no_ext = base_filename.replace('.csv', '').replace('.pkl', '')
-        print(f"Cleaned filename: {filename_no_ext}")
-        
-        # Extract information from site_info or fallback to site_id_param
-        if site_info and site_info.get('point_no') is not None:
-            point_no = site_info['point_no']  # Already integer from Flask route
-            actual_site_id = site_info.get('site_id', site_id_param)  # String
-            site_x = site_info.get('site_x')  # String (could be like '-1578.2')
-            site_y = site_info.get('site_y')  # String (could be like '-310.6')
-        else:
-            # Fallback: extract point number from site_id_param (e.g., '1_UL' -> 1)
-            try:
-                if '_' in str(site_id_param):
-                    point_no = int(site_id_param.split('_')[0])
-                else:
-                    point_no = int(site_id_param)
-                actual_site_id = site_id_param
-                site_x = None
-                site_y = None
-            except (ValueError, TypeError):
-                point_no = 1
-                actual_site_id = site_id_param
-                site_x = None
-                site_y = None
-        
-        point_no_4digit = f"{point_no:04d}"
-        
-        print(f"Site ID: '{actual_site_id}' (type: {type(actual_site_id)})")
-        print(f"Point No: {point_no} -> 4-digit: {point_no_4digit}")
-        print(f"Site X: '{site_x}' (type: {type(site_x)}), Site Y: '{site_y}' (type: {type(site_y)})")
-        
-        # Build filename patterns based on site information
-        patterns_to_try = []
-        
-        # Pattern 1: With Site_ID, Site_X, Site_Y, Point_No (most specific)
-        if site_x is not None and site_y is not None:
-            pattern = f"_{actual_site_id}_{site_x}_{site_y}_{point_no_4digit}_Height.webp"
-            patterns_to_try.append((pattern, "Site_ID + Site_X + Site_Y + Point_No"))
-        
-        # Pattern 2: With Site_ID and Point_No (actual_site_id like '1_UL')
-        if actual_site_id:
-            pattern = f"_{actual_site_id}_{point_no_4digit}_Height.webp"
-            patterns_to_try.append((pattern, "Site_ID + Point_No"))
-        
-        # Pattern 3: Just Point_No (no Site_ID)
-        pattern = f"_{point_no_4digit}_Height.webp"
-        patterns_to_try.append((pattern, "Point_No only"))
-        
-        # Pattern 4: Try extracting position from Site_ID and combining with point number
-        if '_' in str(actual_site_id):
-            try:
-                site_num, position = str(actual_site_id).split('_', 1)
-                pattern = f"_{site_num}_{position}_{point_no_4digit}_Height.webp"
-                patterns_to_try.append((pattern, f"Site_Num + Position + Point_No"))
-            except ValueError:
-                pass
-        
-        # Pattern 5: Try with common position codes if Site_ID doesn't have position
-        if '_' not in str(actual_site_id):
-            position_codes = ['UL', 'UR', 'LL', 'LR', 'C']
-            for position in position_codes:
-                pattern = f"_{actual_site_id}_{position}_{point_no_4digit}_Height.webp"
-                patterns_to_try.append((pattern, f"Site_ID + {position} + Point_No"))
-        
-        print(f"\nTRYING {len(patterns_to_try)} FILENAME PATTERNS:")
-        
-        # Try each pattern
-        for i, (pattern, description) in enumerate(patterns_to_try, 1):
-            # Handle filename ending with # or not
-            if filename_no_ext.endswith('#'):
-                test_filename = f"{filename_no_ext}{pattern}"
-            else:
-                test_filename = f"{filename_no_ext}#{pattern}"
-            
-            test_path = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'tiff_dir' / test_filename
-            
-            print(f"  {i}. Pattern: {description}")
-            print(f"     Filename: {test_filename}")
-            print(f"     Path: {test_path}")
-            
-            if test_path.exists():
-                print(f"     FOUND!")
-                print(f"\n=== IMAGE FILE MATCHED ===")
-                print(f"Final filename: {test_filename}")
-                print(f"Full path: {test_path}")
-                return test_path
-            else:
-                print(f"     Not found")
-        
-        print(f"\nNO IMAGE FILE FOUND after trying {len(patterns_to_try)} patterns")
-        print(f"Summary:")
-        print(f"  Site ID: {actual_site_id}")
-        print(f"  Point No: {point_no} (4-digit: {point_no_4digit})")
-        print(f"  Site coordinates: X={site_x}, Y={site_y}")
-        return None
-            
+        return _find_point_artifact('tiff', base_filename, site_id_param, tool_name, site_info)
     except Exception as e:
         print(f"Error getting image file path: {e}")
         import traceback
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
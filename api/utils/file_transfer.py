@@ -0,0 +1,217 @@
+"""
+File transfer
+Serve artifact files (with byte ranges) from Python or hand the transfer to the front server
+"""
+import os
+import re
+import secrets
+from pathlib import Path
+from urllib.parse import quote
+
+from flask import current_app, request, send_file
+
+# How image/download responses deliver file bodies:
+#   none             - stream the file from the Python worker thread (default)
+#   x-sendfile       - empty response with X-Sendfile (Apache mod_xsendfile, lighttpd,
+#                      or uwsgi response routing onto its offload threads, see uwsgi.ini)
+#   x-accel-redirect - empty response with X-Accel-Redirect to an nginx internal location
+FILE_OFFLOAD_MODES = ('none', 'x-sendfile', 'x-accel-redirect')
+FILE_OFFLOAD_MODE = os.getenv('AFM_FILE_OFFLOAD', 'none').strip().lower()
+if FILE_OFFLOAD_MODE not in FILE_OFFLOAD_MODES:
+    print(f"Unknown AFM_FILE_OFFLOAD '{FILE_OFFLOAD_MODE}', serving files from Python")
+    FILE_OFFLOAD_MODE = 'none'
+
+# nginx maps ACCEL_REDIRECT_PREFIX (an `internal` location) onto ACCEL_REDIRECT_ROOT
+ACCEL_REDIRECT_ROOT = Path(os.getenv('AFM_ACCEL_REDIRECT_ROOT', '.')).resolve()
+ACCEL_REDIRECT_PREFIX = os.getenv('AFM_ACCEL_REDIRECT_PREFIX', '/afm-internal/')
+
+# Range requests with more ranges than this are answered with the full file
+MAX_BYTE_RANGES = 16
+
+# Read size when streaming byte ranges
+TRANSFER_CHUNK_BYTES = 256 * 1024
+
+_BYTE_RANGE_SPEC = re.compile(r'^(\d*)-(\d*)$', re.ASCII)
+
+
+def _offload_header(path):
+    """
+    Header that tells the front server to send a file
+
+    Returns:
+        (name, value), or None when the file is served from Python
+    """
+    if FILE_OFFLOAD_MODE == 'x-sendfile':
+        return 'X-Sendfile', str(path)
+
+    if FILE_OFFLOAD_MODE == 'x-accel-redirect':
+        try:
+            relative_path = path.relative_to(ACCEL_REDIRECT_ROOT)
+        except ValueError:
+            # Outside the location nginx can see (e.g. a cache directory elsewhere)
+            return None
+        return 'X-Accel-Redirect', ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relative_path.as_posix())
+
+    return None
+
+
+def parse_byte_ranges(header, size):
+    """
+    Parse a Range header against a file size (RFC 9110 section 14.1.2)
+
+    Ranges are clamped to the file, sorted, and overlapping or adjacent ranges
+    are coalesced, so a client cannot make the server send a byte twice.
+
+    Returns:
+        List of inclusive (start, end) tuples; an empty list when no range is
+        satisfiable (416); None when the header is absent, malformed or asks for
+        too many ranges, in which case the full file is sent
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_BYTE_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        match = _BYTE_RANGE_SPEC.match(spec)
+        if match is None or match.group(0) == '-':
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+        end = min(end, size - 1)
+        if start <= end:
+            ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _iter_file_ranges(path, parts, trailer=b''):
+    """Stream (prefix, start, end) parts of a file in bounded chunks"""
+    with open(path, 'rb') as f:
+        for prefix, start, end in parts:
+            if prefix:
+                yield prefix
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(TRANSFER_CHUNK_BYTES, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+        if trailer:
+            yield trailer
+
+
+def _partial_content_response(path, mimetype, byte_ranges, size):
+    """Build a 206 response for one range, or a multipart/byteranges response for several"""
+    if len(byte_ranges) == 1:
+        start, end = byte_ranges[0]
+        response = current_app.response_class(
+            _iter_file_ranges(path, [(b'', start, end)]),
+            status=206,
+            mimetype=mimetype,
+            direct_passthrough=True
+        )
+        response.headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response.content_length = end - start + 1
+        return response
+
+    boundary = secrets.token_hex(16)
+    parts = []
+    content_length = 0
+    for index, (start, end) in enumerate(byte_ranges):
+        prefix = (
+            ('\r\n' if index else '')
+            + f"--{boundary}\r\n"
+            + f"Content-Type: {mimetype}\r\n"
+            + f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode('latin-1')
+        parts.append((prefix, start, end))
+        content_length += len(prefix) + end - start + 1
+    trailer = f"\r\n--{boundary}--\r\n".encode('latin-1')
+    content_length += len(trailer)
+
+    response = current_app.response_class(
+        _iter_file_ranges(path, parts, trailer),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        direct_passthrough=True
+    )
+    response.content_length = content_length
+    return response
+
+
+def send_artifact(path, mimetype, validators, download_name=None):
+    """
+    Send a file with the given validators, offloading the body when configured
+
+    Callers answer conditional requests (304) before calling this. Range
+    requests get 206 (multipart/byteranges for several ranges) or 416 when
+    If-Range still matches. Offloaded responses carry headers only; the front
+    server reads the file itself and handles Range requests against it.
+
+    Args:
+        path: File to send; resolved to an absolute path so it does not depend
+            on Flask's root_path
+        mimetype: Content type of the response
+        validators: ResourceValidators of the response
+        download_name: Send as an attachment with this filename
+    """
+    path = Path(path).resolve()
+    offload = _offload_header(path)
+
+    if offload is None:
+        size = path.stat().st_size
+        byte_ranges = None
+        if request.method in ('GET', 'HEAD') and validators.if_range_matches():
+            byte_ranges = parse_byte_ranges(request.headers.get('Range'), size)
+
+        if byte_ranges is None:
+            response = send_file(
+                path,
+                mimetype=mimetype,
+                as_attachment=download_name is not None,
+                download_name=download_name,
+                etag=validators.etag,
+                last_modified=validators.last_modified,
+                conditional=False
+            )
+        elif not byte_ranges:
+            response = current_app.response_class(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+        else:
+            response = _partial_content_response(path, mimetype, byte_ranges, size)
+
+        if download_name is not None:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        response.accept_ranges = 'bytes'
+        return validators.apply(response)
+
+    header_name, header_value = offload
+    # direct_passthrough keeps the empty body away from the compression hook
+    response = current_app.response_class(mimetype=mimetype, direct_passthrough=True)
+    response.headers[header_name] = header_value
+    if download_name is not None:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return validators.apply(response)
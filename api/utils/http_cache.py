@@ -0,0 +1,107 @@
+"""
+HTTP caching utilities
+Builds ETag/Last-Modified validators from source file metadata and answers conditional requests
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from flask import current_app, request
+from werkzeug.http import is_resource_modified, parse_if_range_header
+
+# Bump when the way a source file is transformed into a response changes,
+# so clients holding old validators refetch
+TRANSFORM_VERSION = '1'
+
+# JSON built from measurement files: always revalidate (a stat call) before reuse
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# Measurement artifacts (images) are written once at ingest and never edited in place
+ARTIFACT_CACHE_CONTROL = 'public, max-age=86400'
+
+# Thumbnails of those artifacts: small, cheap to revalidate and requested in bulk
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=2592000, stale-while-revalidate=86400'
+
+# Background job results: private to the requester and removed when the job expires
+JOB_RESULT_CACHE_CONTROL = 'private, no-cache'
+
+
+class ResourceValidators:
+    """
+    Validators for a response derived from one source file
+
+    Args:
+        path: Source file the response is built from
+        variant: Distinguishes different representations of the same file
+            (e.g. query options); part of the ETag
+        weak: Use a weak ETag. JSON responses are weak because compression and
+            encoder changes alter bytes without changing meaning; raw files are strong.
+        cache_control: Cache-Control header value for responses
+    """
+
+    def __init__(self, path, variant='', weak=True, cache_control=REVALIDATE_CACHE_CONTROL):
+        stat = path.stat()
+        self.weak = weak
+        self.cache_control = cache_control
+        self.last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+        fingerprint = f"{TRANSFORM_VERSION}|{path.name}|{stat.st_mtime_ns}|{stat.st_size}|{variant}"
+        self.etag = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    def is_not_modified(self):
+        """Check the current request's If-None-Match/If-Modified-Since against these validators"""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        return not is_resource_modified(
+            request.environ,
+            etag=self.etag,
+            last_modified=self.last_modified,
+        )
+
+    def if_range_matches(self):
+        """
+        Check the current request's If-Range against these validators
+
+        A Range request is served as partial content only when If-Range is absent
+        or still matches; otherwise the full file is sent. Weak ETags never match.
+        """
+        header = request.headers.get('If-Range')
+        if not header:
+            return True
+        if_range = parse_if_range_header(header)
+        if if_range.date is not None:
+            return if_range.date == self.last_modified
+        return not self.weak and not header.startswith('W/') and if_range.etag == self.etag
+
+    def not_modified_response(self):
+        """Build a 304 response carrying the validators"""
+        response = current_app.response_class(status=304)
+        return self.apply(response)
+
+    def apply(self, response):
+        """Attach ETag, Last-Modified and Cache-Control to a response"""
+        response.set_etag(self.etag, weak=self.weak)
+        response.last_modified = self.last_modified
+        response.headers['Cache-Control'] = self.cache_control
+        if self.weak:
+            # Weak validators are used for JSON, which is compressed per Accept-Encoding
+            response.vary.add('Accept-Encoding')
+        return response
+
+
+def json_validators(path):
+    """Validators for a JSON response built from path for the current request's query"""
+    return ResourceValidators(path, variant=request.query_string.decode('utf-8', 'replace'))
+
+
+def artifact_validators(path, variant=''):
+    """Validators for a measurement artifact file served as-is (strong ETag, long-lived caching)"""
+    return ResourceValidators(path, variant=variant, weak=False, cache_control=ARTIFACT_CACHE_CONTROL)
+
+
+def thumbnail_validators(path, width):
+    """Validators for a thumbnail of an artifact file (strong ETag per width, long-lived caching)"""
+    return ResourceValidators(path, variant=f"thumbnail:{width}", weak=False, cache_control=THUMBNAIL_CACHE_CONTROL)
+
+
+def job_result_validators(path):
+    """Validators for the result file of a background job (strong ETag, so downloads can resume)"""
+    return ResourceValidators(path, variant='job-result', weak=False, cache_control=JOB_RESULT_CACHE_CONTROL)
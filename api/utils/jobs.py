@@ -0,0 +1,493 @@
+"""
+Background jobs
+Long-running exports, trend aggregations and catalog rebuilds run by a separate job runner process, with state and results on the local disk
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .file_parser import get_pickle_file_path_by_filename, parse_and_cache_afm_data
+from .json_provider import dumps
+from .measurement_data import read_measurement_pickle, summary_to_records
+from .measurement_export import (
+    EXPORT_FORMATS,
+    EXPORT_SECTIONS,
+    iter_csv_export,
+    iter_measurement_records,
+    iter_parquet_export,
+    pa,
+    select_measurements,
+)
+
+# Root of the job store (relative to the working directory, like cache/ and logs/)
+JOB_ROOT = Path(os.getenv('AFM_JOB_DIR', 'jobs'))
+
+# Finished jobs (and their result files) are removed this long after they end
+JOB_RESULT_TTL_SECONDS = 24 * 3600
+
+# Minimum interval between expiry scans of the job store
+JOB_SWEEP_INTERVAL_SECONDS = 300.0
+
+# Minimum interval between progress writes of a running job
+JOB_PROGRESS_INTERVAL_SECONDS = 1.0
+
+# Measurements one export or trend job may cover
+MAX_JOB_MEASUREMENTS = 50000
+
+JOB_STATES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATES = {'succeeded', 'failed', 'cancelled'}
+
+# How often the job runner looks for queued jobs
+JOB_POLL_INTERVAL_SECONDS = 1.0
+
+# Jobs the runner executes at the same time (each in its own process)
+MAX_RUNNING_JOBS = 2
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation was requested"""
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+class JobStore:
+    """
+    Job state and results on the local disk, shared by all uwsgi workers
+
+    Each job is a directory named by its id holding job.json (state, progress,
+    result metadata), the result file and, once cancellation was requested, a
+    'cancel' marker. job.json is replaced atomically, so readers in other workers
+    never see a partial document. Finished jobs expire after JOB_RESULT_TTL_SECONDS.
+    """
+
+    def __init__(self, root=JOB_ROOT):
+        self.root = root
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def job_dir(self, job_id):
+        # Ids are uuid4 hex; anything else never names a job (and never escapes root)
+        if not isinstance(job_id, str) or len(job_id) != 32 or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        return self.root / job_id
+
+    def read(self, job_id):
+        """Return the job document, or None for an unknown or expired job"""
+        job_dir = self.job_dir(job_id)
+        if job_dir is None:
+            return None
+        try:
+            return json.loads((job_dir / 'job.json').read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write(self, job):
+        job_dir = self.root / job['id']
+        job_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = job_dir / f".job.{uuid.uuid4().hex}.tmp"
+        temp_path.write_text(json.dumps(job), encoding='utf-8')
+        os.replace(temp_path, job_dir / 'job.json')
+
+    def update(self, job_id, **fields):
+        """Merge fields into a job document and return it (None when it is gone)"""
+        job = self.read(job_id)
+        if job is None:
+            return None
+        job.update(fields, updated_at=_now())
+        self.write(job)
+        return job
+
+    def create(self, job_type, params):
+        now = _now()
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'params': params,
+            'state': 'queued',
+            'progress': {'done': 0, 'total': None, 'message': None},
+            'result': None,
+            'error': None,
+            'created_at': now,
+            'updated_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': None,
+        }
+        self.write(job)
+        self.maybe_sweep()
+        return job
+
+    def finish(self, job_id, state, **fields):
+        """Move a job to a finished state and start its expiry clock"""
+        finished = datetime.now()
+        return self.update(
+            job_id,
+            state=state,
+            finished_at=finished.isoformat(),
+            expires_at=(finished + timedelta(seconds=JOB_RESULT_TTL_SECONDS)).isoformat(),
+            **fields
+        )
+
+    def claim(self, job_id):
+        """Take a queued job for running; False when another runner already has it"""
+        try:
+            os.close(os.open(self.root / job_id / 'claimed', os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def request_cancel(self, job_id):
+        (self.root / job_id / 'cancel').touch()
+
+    def cancel_requested(self, job_id):
+        return (self.root / job_id / 'cancel').exists()
+
+    def result_path(self, job):
+        if not job.get('result'):
+            return None
+        return self.root / job['id'] / job['result']['filename']
+
+    def list(self):
+        """All stored jobs, newest first"""
+        jobs = []
+        if self.root.is_dir():
+            for job_dir in self.root.iterdir():
+                job = self.read(job_dir.name)
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
+
+    def maybe_sweep(self):
+        """Remove expired jobs, at most once per JOB_SWEEP_INTERVAL_SECONDS"""
+        now = time.time()
+        if now - self._last_sweep < JOB_SWEEP_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            if now - self._last_sweep < JOB_SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        try:
+            self.sweep()
+        except OSError as e:
+            print(f"Job store sweep failed: {e}")
+
+    def sweep(self):
+        """
+        Remove finished jobs past their expiry, and jobs with no update for
+        JOB_RESULT_TTL_SECONDS (their worker was restarted mid-run)
+        """
+        if not self.root.is_dir():
+            return 0
+        now = datetime.now()
+        removed = 0
+        for job_dir in self.root.iterdir():
+            if not job_dir.is_dir():
+                continue
+            job = self.read(job_dir.name)
+            if job is None:
+                expired = time.time() - job_dir.stat().st_mtime > JOB_RESULT_TTL_SECONDS
+            elif job['state'] in FINISHED_STATES:
+                expired = datetime.fromisoformat(job['expires_at']) <= now
+            else:
+                expired = (now - datetime.fromisoformat(job['updated_at'])).total_seconds() > JOB_RESULT_TTL_SECONDS
+            if expired:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"Job store: removed {removed} expired jobs")
+        return removed
+
+
+job_store = JobStore()
+
+
+class JobContext:
+    """Handle a running job uses to report progress, notice cancellation and write its result"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self._last_progress = 0.0
+
+    def check_cancelled(self):
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled()
+
+    def progress(self, done, total=None, message=None):
+        """Record progress (throttled) and stop the job here if it was cancelled"""
+        self.check_cancelled()
+        now = time.monotonic()
+        if now - self._last_progress >= JOB_PROGRESS_INTERVAL_SECONDS or done == total:
+            self._last_progress = now
+            self.store.update(self.job_id, progress={'done': done, 'total': total, 'message': message})
+
+    def result_path(self, suffix):
+        """Where the job writes its result (renamed into place only on success)"""
+        return self.store.root / self.job_id / f"result{suffix}"
+
+
+def _write_chunks(path, chunks):
+    temp_path = path.with_name(f".{path.name}.partial")
+    with open(temp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+
+def _option_list(params, name):
+    values = params.get(name) or []
+    if not isinstance(values, list):
+        raise ValueError(f"{name} must be a list of measurement filenames")
+    return [str(value) for value in values]
+
+
+def _validate_selection(params):
+    """Measurement selection shared by export and trend jobs (as the export route takes it)"""
+    return {
+        'tool': str(params.get('tool') or 'MAP608'),
+        'filenames': _option_list(params, 'filenames'),
+        'q': params.get('q'),
+        'date_from': params.get('date_from'),
+        'date_to': params.get('date_to'),
+    }
+
+
+def _select(params, context):
+    measurements = select_measurements(
+        params['tool'], params['filenames'], params['q'], params['date_from'], params['date_to']
+    )
+    if len(measurements) > MAX_JOB_MEASUREMENTS:
+        raise ValueError(f"{len(measurements)} measurements selected; at most {MAX_JOB_MEASUREMENTS} per job")
+    context.progress(0, len(measurements), f"{len(measurements)} measurements selected")
+    return measurements
+
+
+def _validate_export(params):
+    export_format = str(params.get('format') or 'csv').lower()
+    section = str(params.get('section') or 'data').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)} (got '{export_format}')")
+    if export_format == 'parquet' and pa is None:
+        raise ValueError('pyarrow is not installed on the server; use format=csv')
+    if section not in EXPORT_SECTIONS:
+        raise ValueError(f"section must be one of: {', '.join(EXPORT_SECTIONS)} (got '{section}')")
+    return {**_validate_selection(params), 'format': export_format, 'section': section}
+
+
+def _run_export(params, context):
+    """CSV/Parquet export of a measurement selection (the /afm-files/export writer, to a file)"""
+    measurements = _select(params, context)
+    total = len(measurements)
+
+    def counted(batches):
+        for done, (measurement, records) in enumerate(batches, 1):
+            context.progress(done, total, measurement['filename'])
+            yield measurement, records
+
+    batches = counted(iter_measurement_records(measurements, params['tool'], params['section']))
+    chunks = iter_parquet_export(batches) if params['format'] == 'parquet' else iter_csv_export(batches)
+    mimetype, suffix = EXPORT_FORMATS[params['format']]
+    _write_chunks(context.result_path(suffix), chunks)
+    return {
+        'filename': f"result{suffix}",
+        'mimetype': mimetype,
+        'download_name': f"AFM_{params['tool']}_{params['section']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}",
+    }
+
+
+def load_trend_entry(filename, tool_name, section='summary'):
+    """Read the info and section records of one measurement (runs on the I/O pool)"""
+    pickle_path = get_pickle_file_path_by_filename(filename, tool_name)
+    if not pickle_path:
+        return None
+    data = read_measurement_pickle(pickle_path)
+    return {'info': data.get('info', {}), section: summary_to_records(data.get(section, {}))}
+
+
+def _run_trend_data(params, context):
+    """
+    Info and summary records of many measurements in one JSON document, the
+    per-file data DataTrendPage otherwise fetches one detail request at a time
+    """
+    measurements = _select(params, context)
+    total = len(measurements)
+    batches = iter_measurement_records(measurements, params['tool'], 'summary', load=load_trend_entry)
+
+    def chunks():
+        yield b'{"tool":' + dumps(params['tool']).encode('utf-8') + b',"measurements":['
+        for done, (measurement, entry) in enumerate(batches, 1):
+            context.progress(done, total, measurement['filename'])
+            document = {'filename': measurement['filename'], 'formatted_date': measurement.get('formatted_date'), **entry}
+            yield (b',' if done > 1 else b'') + dumps(document).encode('utf-8')
+        yield b']}'
+
+    _write_chunks(context.result_path('.json'), chunks())
+    return {
+        'filename': 'result.json',
+        'mimetype': 'application/json',
+        'download_name': f"AFM_{params['tool']}_trend_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+    }
+
+
+def _validate_catalog_rebuild(params):
+    return {'tool': str(params.get('tool') or 'MAP608')}
+
+
+def _run_catalog_rebuild(params, context):
+    """
+    Re-parse data_dir_list.txt into the catalog cache file
+
+    Workers read the new file on their next catalog load; their artifact indexes
+    follow directory changes on their own (DIRECTORY_RECHECK_SECONDS).
+    """
+    context.progress(0, 1, f"Parsing {params['tool']} catalog")
+    if not parse_and_cache_afm_data(params['tool']):
+        raise RuntimeError(f"Catalog rebuild for {params['tool']} failed; see the server log")
+    context.progress(1, 1, 'Catalog rebuilt')
+    return None
+
+
+# Job types: name -> (validate(params) -> params, run(params, context) -> result metadata or None)
+JOB_TYPES = {
+    'export': (_validate_export, _run_export),
+    'trend-data': (_validate_selection, _run_trend_data),
+    'catalog-rebuild': (_validate_catalog_rebuild, _run_catalog_rebuild),
+}
+
+
+def validate_job(job_type, params):
+    """
+    Check a submission and normalize its parameters
+
+    Raises:
+        ValueError: Unknown job type or invalid parameters (message is user-facing)
+    """
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"type must be one of: {', '.join(JOB_TYPES)} (got '{job_type}')")
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    return JOB_TYPES[job_type][0](params)
+
+
+def run_job(job_id):
+    """Run a claimed job to completion (in a child process of the job runner)"""
+    job = job_store.read(job_id)
+    if job is None:
+        return
+    context = JobContext(job_store, job_id)
+    try:
+        # Cancelled after the runner picked it up
+        context.check_cancelled()
+        job_store.update(job_id, state='running', started_at=_now(), pid=os.getpid())
+        result = JOB_TYPES[job['type']][1](job['params'], context)
+        if result is not None:
+            result['size'] = (job_store.root / job_id / result['filename']).stat().st_size
+        job_store.finish(job_id, 'succeeded', result=result)
+    except JobCancelled:
+        job_store.finish(job_id, 'cancelled')
+    except Exception as e:
+        print(f"Job {job_id} ({job['type']}) failed: {e}")
+        traceback.print_exc()
+        job_store.finish(job_id, 'failed', error=str(e))
+
+
+def submit_job(job_type, params):
+    """
+    Store a validated job for the job runner to pick up
+
+    Returns:
+        The job document (state 'queued')
+    """
+    return job_store.create(job_type, params)
+
+
+def cancel_job(job_id):
+    """
+    Request cancellation of a job
+
+    A queued job is cancelled at once; a running job stops at its next progress report.
+
+    Returns:
+        The job document, or None for an unknown job
+    """
+    job = job_store.read(job_id)
+    if job is None or job['state'] in FINISHED_STATES:
+        return job
+    job_store.request_cancel(job_id)
+    if job['state'] == 'queued':
+        # If the runner claims it meanwhile, run_job sees the marker and stops
+        return job_store.finish(job_id, 'cancelled')
+    return job_store.read(job_id)
+
+
+def _next_queued_job():
+    """Claim the oldest queued job, or return None when there is none"""
+    queued = [job for job in job_store.list() if job['state'] == 'queued']
+    for job in reversed(queued):
+        if job_store.claim(job['id']):
+            return job
+    return None
+
+
+def _record_exit(job_id, exitcode):
+    """Mark a job failed when its process died before recording an outcome"""
+    job = job_store.read(job_id)
+    if job is not None and job['state'] not in FINISHED_STATES:
+        job_store.finish(job_id, 'failed', error=f"Job process exited with code {exitcode}")
+
+
+def run_job_runner(poll_interval=JOB_POLL_INTERVAL_SECONDS, max_running=MAX_RUNNING_JOBS):
+    """
+    Run queued jobs until the process is stopped
+
+    Each job runs in a child forked from this loop. The loop itself never runs
+    application code, so it has no threads or held locks a fork could copy;
+    uwsgi worker processes serving requests must never fork jobs themselves.
+    Started as a uwsgi mule (see uwsgi.ini) or by run_dev_server().
+    """
+    context = multiprocessing.get_context('fork')
+    running = {}
+    print(f"Job runner started (pid {os.getpid()}, store {job_store.root.resolve()})")
+    while True:
+        for job_id, process in list(running.items()):
+            if not process.is_alive():
+                process.join()
+                del running[job_id]
+                if process.exitcode != 0:
+                    _record_exit(job_id, process.exitcode)
+
+        job_store.maybe_sweep()
+        while len(running) < max_running:
+            job = _next_queued_job()
+            if job is None:
+                break
+            process = context.Process(target=run_job, args=(job['id'],), name=f"afm-job-{job['id'][:8]}")
+            process.start()
+            running[job['id']] = process
+            print(f"Started {job['type']} job {job['id']} (pid {process.pid})")
+
+        time.sleep(poll_interval)
+
+
+def start_job_runner():
+    """
+    Start the job runner in a child process (development server)
+
+    Call before the server starts its request threads, so the fork copies none.
+    """
+    # Not daemonic: daemonic processes cannot start the job processes
+    process = multiprocessing.get_context('fork').Process(target=run_job_runner, name='afm-job-runner')
+    process.start()
+    # Stop it with the server; running jobs finish and record their outcome on their own
+    atexit.register(process.terminate)
+    return process
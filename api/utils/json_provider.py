@@ -0,0 +1,128 @@
+"""
+JSON provider for AFM API responses
+Encodes numpy/pandas values coming from measurement pickles without per-request conversion passes
+"""
+import datetime
+import decimal
+import json
+import math
+import uuid
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    # Optional faster encoder backend
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def _encode_default(o):
+    """Convert values the JSON encoder does not know natively"""
+    if isinstance(o, np.ndarray):
+        return _sanitize(o.tolist())
+    if isinstance(o, np.generic):
+        return _sanitize(o.item())
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        # pandas NaT is a datetime subclass whose isoformat() is 'NaT'
+        if o != o:
+            return None
+        return o.isoformat()
+    if isinstance(o, datetime.timedelta):
+        return o.total_seconds()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if hasattr(o, 'to_dict'):
+        # pandas Series/DataFrame
+        return _sanitize(o.to_dict())
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _sanitize(value):
+    """Replace NaN/Inf floats (not valid JSON) with None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _sanitize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_sanitize(item) for item in value]
+    return value
+
+
+# orjson options matching the standard library path below
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+# Standard library arguments with no effect on the encoded value: the orjson path
+# ignores them (orjson always writes UTF-8 and maps NaN/Inf to null)
+_ORJSON_IGNORED_KWARGS = {'ensure_ascii', 'allow_nan', 'check_circular'}
+
+
+def _orjson_dumps(obj, kwargs):
+    """
+    Encode with orjson when the stdlib arguments allow it
+
+    Layout arguments map onto orjson: indent -> OPT_INDENT_2, separators -> compact
+    (orjson's only layout). Returns None when another argument (default, cls,
+    sort_keys...) needs the standard library encoder.
+    """
+    option = _ORJSON_OPTIONS
+    for name, value in kwargs.items():
+        if name == 'indent':
+            if value:
+                option |= orjson.OPT_INDENT_2
+        elif name == 'sort_keys':
+            if value:
+                option |= orjson.OPT_SORT_KEYS
+        elif name != 'separators' and name not in _ORJSON_IGNORED_KWARGS:
+            return None
+    try:
+        return orjson.dumps(obj, default=_encode_default, option=option).decode('utf-8')
+    except TypeError:
+        # e.g. integers beyond 64 bits or non-contiguous arrays; use the stdlib path
+        return None
+
+
+def dumps(obj, **kwargs):
+    """
+    Encode obj as JSON text the way API responses are encoded
+
+    Needs no app context, so background jobs writing JSON results use it directly.
+    """
+    if orjson is not None:
+        encoded = _orjson_dumps(obj, kwargs)
+        if encoded is not None:
+            return encoded
+
+    kwargs.setdefault('default', _encode_default)
+    kwargs.setdefault('ensure_ascii', False)
+    # Keep record keys in DataFrame column order (and skip the sorting cost)
+    kwargs.setdefault('sort_keys', False)
+    try:
+        # Fast path: the common payload has no NaN/Inf and encodes in one pass
+        return json.dumps(obj, allow_nan=False, **kwargs)
+    except ValueError:
+        return json.dumps(_sanitize(obj), allow_nan=False, **kwargs)
+
+
+class AFMJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider with native numpy, pandas, NaN/Inf and datetime support
+
+    Uses orjson when it is installed and the standard library encoder otherwise.
+    NaN and Inf are always encoded as null so browsers can parse every response.
+    """
+
+    # Keep record keys in DataFrame column order (and skip the sorting cost)
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
@@ -0,0 +1,53 @@
+"""
+Incremental JSON encoding for large API responses
+Encodes a response document piece by piece so arrays of records never exist as one big string
+"""
+
+
+class StreamedArray:
+    """Marks a document value that is encoded incrementally from an iterable of record chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+def _contains_stream(obj):
+    """Check whether a document value holds a StreamedArray anywhere below it"""
+    if isinstance(obj, StreamedArray):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_stream(value) for value in obj.values())
+    return False
+
+
+def iter_json(obj, dumps):
+    """
+    Yield the JSON text of obj in pieces
+
+    Args:
+        obj: Document to encode. Dict values may be StreamedArray instances.
+        dumps: Function encoding a plain value to a JSON string (e.g. current_app.json.dumps)
+    """
+    if isinstance(obj, StreamedArray):
+        yield '['
+        first = True
+        for chunk in obj.chunks:
+            if not chunk:
+                continue
+            # Encode the whole chunk in one call and drop its enclosing brackets
+            encoded = dumps(list(chunk))
+            if not first:
+                yield ','
+            yield encoded[1:-1]
+            first = False
+        yield ']'
+    elif isinstance(obj, dict) and _contains_stream(obj):
+        yield '{'
+        for index, (key, value) in enumerate(obj.items()):
+            if index:
+                yield ','
+            yield dumps(str(key)) + ':'
+            yield from iter_json(value, dumps)
+        yield '}'
+    else:
+        yield dumps(obj)
@@ -0,0 +1,182 @@
+"""
+Measurement data helpers
+Convert the contents of a measurement pickle (info/summary/data) into JSON-ready records
+"""
+import pickle
+import re
+
+from .result_cache import file_signature
+from .single_flight import SingleFlight
+
+# Number of detail rows encoded per chunk when streaming
+DETAIL_CHUNK_ROWS = 500
+
+# Concurrent requests for the same unchanged pickle share one read / one conversion.
+# Per worker process only: results live in worker memory, so each uwsgi worker still
+# parses a file once itself (a cross-worker lock would only serialize those parses)
+_pickle_reads = SingleFlight()
+_detail_loads = SingleFlight()
+
+
+def summary_to_records(data_summary):
+    """Convert the 'summary' section of a measurement pickle to a list of records"""
+    if hasattr(data_summary, 'to_dict'):
+        # It's a DataFrame
+        return data_summary.to_dict('records')
+
+    if isinstance(data_summary, dict) and 'Site' in data_summary and 'ITEM' in data_summary:
+        # Dict with columnar data - convert to records
+        summary_records = []
+        num_rows = len(data_summary.get('Site', []))
+        for i in range(num_rows):
+            record = {}
+            for key, values in data_summary.items():
+                if isinstance(values, list) and i < len(values):
+                    record[key] = values[i]
+            if record:
+                summary_records.append(record)
+        return summary_records
+
+    if isinstance(data_summary, list):
+        # Already in records format
+        return data_summary
+
+    return []
+
+
+def iter_detail_record_chunks(data_detail, chunk_size=DETAIL_CHUNK_ROWS):
+    """
+    Yield the 'data' section of a measurement pickle as lists of records
+
+    Only one chunk of records exists at a time, so callers that encode each chunk
+    before asking for the next keep memory bounded by chunk_size rows.
+    """
+    if hasattr(data_detail, 'to_dict'):
+        # It's a DataFrame
+        for start in range(0, len(data_detail), chunk_size):
+            yield data_detail.iloc[start:start + chunk_size].to_dict('records')
+
+    elif isinstance(data_detail, dict):
+        # Dict with measurement points as keys
+        chunk = []
+        for point_key, point_data in data_detail.items():
+            if isinstance(point_data, dict) and any(isinstance(v, list) for v in point_data.values()):
+                # Convert columnar data to records
+                num_rows = max(len(v) for v in point_data.values() if isinstance(v, list))
+                for i in range(num_rows):
+                    record = {'measurement_point': point_key}
+                    for key, values in point_data.items():
+                        if isinstance(values, list) and i < len(values):
+                            record[key] = values[i]
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    elif isinstance(data_detail, list):
+        # Already in records format
+        for start in range(0, len(data_detail), chunk_size):
+            yield data_detail[start:start + chunk_size]
+
+
+def detail_to_records(data_detail):
+    """Convert the 'data' section of a measurement pickle to a list of records"""
+    detail_records = []
+    for chunk in iter_detail_record_chunks(data_detail):
+        detail_records.extend(chunk)
+    return detail_records
+
+
+def get_available_points(data_detail, summary_records):
+    """Get the sorted measurement points of a measurement"""
+    if isinstance(data_detail, dict):
+        # Get measurement points directly from data keys
+        return sorted(list(data_detail.keys()))
+    if summary_records:
+        # Extract unique sites from summary records
+        sites = {record.get('Site') for record in summary_records if 'Site' in record}
+        return sorted(list(sites))
+    return []
+
+
+def read_measurement_pickle(pickle_path):
+    """
+    Unpickle a measurement file
+
+    Callers reading the same unchanged file at the same time (several users opening
+    a new lot) share one read; the returned data must not be mutated.
+    """
+    def read():
+        with open(pickle_path, 'rb') as f:
+            return pickle.load(f)
+
+    return _pickle_reads.do((str(pickle_path), file_signature(pickle_path)), read)
+
+
+def load_measurement_detail(pickle_path):
+    """
+    Load a measurement pickle as the detail payload served by /afm-files/detail
+
+    Concurrent calls for the same unchanged file share one load and conversion;
+    the returned payload must not be mutated.
+
+    Returns:
+        Dict with information, summary, data (records) and available_points
+    """
+    def load():
+        data = read_measurement_pickle(pickle_path)
+        data_detail = data.get('data', {})
+        summary_records = summary_to_records(data.get('summary', {}))
+        return {
+            'information': data.get('info', {}),
+            'summary': summary_records,
+            'data': detail_to_records(data_detail),
+            'available_points': get_available_points(data_detail, summary_records),
+        }
+
+    return _detail_loads.do((str(pickle_path), file_signature(pickle_path)), load)
+
+
+def _query_value(value):
+    """Format a site value the way the frontend puts it in a query string"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # JavaScript renders 100.0 as '100'
+        return str(int(value))
+    return str(value)
+
+
+def _point_number(measurement_point):
+    """Extract the leading point number of a measurement point name ('1_UL' -> 1)"""
+    match = re.match(r'^(\d+)', str(measurement_point))
+    return int(match.group(1)) if match else None
+
+
+def site_info_for_point(detail_records, measurement_point):
+    """
+    Build the site info of a measurement point from its detail records
+
+    Mirrors extractSiteInfo() in MeasurementPoints.vue so server-side lookups
+    resolve the same profile/image files as the per-point requests.
+    """
+    for record in detail_records:
+        if (record.get('measurement_point') == measurement_point
+                or record.get('Site ID') == measurement_point
+                or record.get('Site_ID') == measurement_point):
+            point_no = record.get('Point No') or record.get('Point_No') or _point_number(measurement_point)
+            return {
+                'site_id': _query_value(record.get('Site ID') or record.get('Site_ID') or measurement_point),
+                'site_x': _query_value(record.get('Site X') or record.get('Site_X')),
+                'site_y': _query_value(record.get('Site Y') or record.get('Site_Y')),
+                'point_no': int(point_no) if point_no is not None else None,
+            }
+
+    return {
+        'site_id': str(measurement_point),
+        'site_x': None,
+        'site_y': None,
+        'point_no': _point_number(measurement_point),
+    }
@@ -0,0 +1,329 @@
+"""
+Measurement export
+Stream the detail or summary rows of many measurements as CSV or Parquet, reading pickles concurrently
+"""
+import csv
+import datetime
+import io
+import json
+import math
+from collections import deque
+
+import numpy as np
+
+from .executors import get_io_executor
+from .file_parser import get_pickle_file_path_by_filename, load_afm_file_list
+from .measurement_data import detail_to_records, read_measurement_pickle, summary_to_records
+
+try:
+    # Optional: Parquet export
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None
+    pq = None
+
+# Export formats: name -> (mimetype, file suffix)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+# Pickle sections that can be exported
+EXPORT_SECTIONS = ('data', 'summary')
+
+# Catalog fields written in front of every row to identify its measurement
+EXPORT_ID_COLUMNS = ('filename', 'recipe_name', 'lot_id', 'slot_number', 'formatted_date')
+
+# Fields of later measurements missing from the first one's columns go here as JSON
+EXTRA_COLUMN = 'extra'
+
+# Rows per CSV flush / Parquet row group
+EXPORT_ROW_GROUP_ROWS = 10000
+
+# Measurements read ahead of the one being written (bounds memory per export)
+EXPORT_PREFETCH = 4
+
+
+def filter_catalog(records, query=None, date_from=None, date_to=None):
+    """
+    Filter catalog records the way the search page does, newest first
+
+    query matches lot ID, recipe, dates, slot and measured info as a case-insensitive
+    substring (ignored below 2 characters, like filterMeasurementsLocally);
+    date_from/date_to bound formatted_date (YYYY-MM-DD, inclusive).
+    """
+    query = (query or '').strip().lower()
+    selected = []
+    for record in records:
+        formatted_date = record.get('formatted_date') or ''
+        if date_from and formatted_date < date_from:
+            continue
+        if date_to and formatted_date > date_to:
+            continue
+        if len(query) >= 2:
+            searchable = ' '.join(str(record.get(key) or '') for key in (
+                'lot_id', 'recipe_name', 'date', 'formatted_date', 'slot_number', 'measured_info'
+            )).lower()
+            if query not in searchable:
+                continue
+        selected.append(record)
+    return sorted(selected, key=lambda record: record.get('formatted_date') or '', reverse=True)
+
+
+def select_measurements(tool_name, filenames=None, query=None, date_from=None, date_to=None):
+    """
+    Catalog records of the measurements to export
+
+    Explicit filenames win (in the given order, deduplicated; names missing from
+    the catalog are kept with only a filename); otherwise the catalog is filtered.
+    """
+    catalog = load_afm_file_list(tool_name)
+    if filenames:
+        catalog_by_filename = {record['filename']: record for record in catalog}
+        return [
+            catalog_by_filename.get(filename, {'filename': filename})
+            for filename in dict.fromkeys(str(filename) for filename in filenames)
+        ]
+    return filter_catalog(catalog, query, date_from, date_to)
+
+
+def load_export_records(filename, tool_name, section):
+    """
+    Read one measurement's rows for an export (runs on the I/O pool)
+
+    Returns:
+        List of records, or None when the measurement has no pickle
+    """
+    pickle_path = get_pickle_file_path_by_filename(filename, tool_name)
+    if not pickle_path:
+        return None
+    data = read_measurement_pickle(pickle_path)
+    if section == 'summary':
+        return summary_to_records(data.get('summary', {}))
+    return detail_to_records(data.get('data', {}))
+
+
+def iter_measurement_records(measurements, tool_name, section, prefetch=EXPORT_PREFETCH, load=load_export_records):
+    """
+    Yield (measurement, records) in selection order
+
+    Pickles are read on the I/O pool at most prefetch measurements ahead of the
+    one being written, so memory stays bounded however many are selected.
+    Measurements without a pickle, or whose pickle cannot be read, are logged and
+    skipped: the file is already streaming, so one bad measurement must not cut it
+    short. load(filename, tool_name, section) reads one measurement (None when it
+    has no pickle).
+    """
+    executor = get_io_executor()
+    remaining = iter(measurements)
+    pending = deque()
+
+    def submit_next():
+        measurement = next(remaining, None)
+        if measurement is not None:
+            future = executor.submit(load, measurement['filename'], tool_name, section)
+            pending.append((measurement, future))
+
+    for _ in range(prefetch):
+        submit_next()
+
+    try:
+        while pending:
+            measurement, future = pending.popleft()
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Export: error reading {measurement['filename']}, skipped: {e}")
+                continue
+            finally:
+                submit_next()
+            if records is None:
+                print(f"Export: no pickle file for {measurement['filename']}, skipped")
+                continue
+            yield measurement, records
+    finally:
+        # Client went away: drop the reads that have not started yet
+        for _, future in pending:
+            future.cancel()
+
+
+def _plain(value):
+    """Unwrap numpy/pandas scalars; missing values become None"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is None or (isinstance(value, datetime.datetime) and value != value):
+        # pandas NaT compares unequal to itself
+        return None
+    return value
+
+
+def _text(value):
+    value = _plain(value)
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, dict, np.ndarray)):
+        return json.dumps(value.tolist() if isinstance(value, np.ndarray) else value, default=str)
+    return str(value)
+
+
+def _number(value):
+    value = _plain(value)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ExportLayout:
+    """
+    Column layout of an export, fixed by the first measurement with rows
+
+    A streamed file cannot grow columns after its header, so fields that only
+    later measurements have are written to the EXTRA_COLUMN as a JSON object.
+    """
+
+    def __init__(self, first_records):
+        columns = dict.fromkeys(key for record in first_records for key in record)
+        self.data_columns = [column for column in columns if column not in EXPORT_ID_COLUMNS and column != EXTRA_COLUMN]
+        self.columns = [*EXPORT_ID_COLUMNS, *self.data_columns, EXTRA_COLUMN]
+        self._known = set(self.data_columns)
+
+        # Parquet types: float64 when every value of the first measurement is numeric
+        self.numeric_columns = set()
+        for column in self.data_columns:
+            values = [_plain(record.get(column)) for record in first_records]
+            values = [value for value in values if value is not None]
+            if values and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+                self.numeric_columns.add(column)
+
+    def row(self, measurement, record):
+        """Values of one record in column order (the extra column is JSON text or None)"""
+        extra = {str(key): _text(value) for key, value in record.items()
+                 if key not in self._known and key not in EXPORT_ID_COLUMNS}
+        return [
+            *(measurement.get(column) for column in EXPORT_ID_COLUMNS),
+            *(record.get(column) for column in self.data_columns),
+            json.dumps(extra) if extra else None,
+        ]
+
+
+def iter_csv_export(batches):
+    """Yield a CSV file (UTF-8) of (measurement, records) batches in bounded chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    layout = None
+
+    for measurement, records in batches:
+        if not records:
+            continue
+        if layout is None:
+            layout = ExportLayout(records)
+            writer.writerow(layout.columns)
+        for start in range(0, len(records), EXPORT_ROW_GROUP_ROWS):
+            for record in records[start:start + EXPORT_ROW_GROUP_ROWS]:
+                # csv writes None as an empty field
+                writer.writerow([_text(value) for value in layout.row(measurement, record)])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if layout is None:
+        # Nothing to export: header of the identification columns only
+        writer.writerow([*EXPORT_ID_COLUMNS, EXTRA_COLUMN])
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _StreamSink:
+    """Write-only file object whose contents are drained as they are written"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(layout):
+    fields = [pa.field(column, pa.string()) for column in EXPORT_ID_COLUMNS]
+    fields += [
+        pa.field(column, pa.float64() if column in layout.numeric_columns else pa.string())
+        for column in layout.data_columns
+    ]
+    fields.append(pa.field(EXTRA_COLUMN, pa.string()))
+    return pa.schema(fields)
+
+
+def _parquet_table(layout, schema, rows):
+    columns = list(zip(*rows))
+    arrays = {}
+    for index, field in enumerate(schema):
+        convert = _number if pa.types.is_floating(field.type) else _text
+        arrays[field.name] = [convert(value) for value in columns[index]]
+    return pa.Table.from_pydict(arrays, schema=schema)
+
+
+def iter_parquet_export(batches):
+    """
+    Yield a Parquet file of (measurement, records) batches, one row group at a time
+
+    Requires pyarrow. Column types come from the first measurement (float64 for
+    numeric columns, string otherwise); later values that do not fit are null.
+    """
+    sink = _StreamSink()
+    writer = None
+    layout = schema = None
+    rows = []
+
+    try:
+        for measurement, records in batches:
+            if not records:
+                continue
+            if writer is None:
+                layout = ExportLayout(records)
+                schema = _parquet_schema(layout)
+                writer = pq.ParquetWriter(sink, schema)
+            rows.extend(layout.row(measurement, record) for record in records)
+            while len(rows) >= EXPORT_ROW_GROUP_ROWS:
+                writer.write_table(_parquet_table(layout, schema, rows[:EXPORT_ROW_GROUP_ROWS]))
+                del rows[:EXPORT_ROW_GROUP_ROWS]
+                yield sink.drain()
+
+        if writer is None:
+            # Nothing to export: an empty file with the identification columns
+            writer = pq.ParquetWriter(sink, pa.schema(
+                [pa.field(column, pa.string()) for column in (*EXPORT_ID_COLUMNS, EXTRA_COLUMN)]
+            ))
+        elif rows:
+            writer.write_table(_parquet_table(layout, schema, rows))
+            rows = []
+    finally:
+        if writer is not None:
+            # Footer
+            writer.close()
+    yield sink.drain()
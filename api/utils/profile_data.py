@@ -0,0 +1,272 @@
+"""
+Profile data utilities
+Extract X/Y/Z arrays from profile pickles and detect regular measurement grids
+"""
+import base64
+import pickle
+
+import numpy as np
+
+from .result_cache import file_signature
+from .single_flight import SingleFlight
+
+# Tolerance (as a fraction of the grid spacing) for snapping coordinates to a lattice
+GRID_TOLERANCE = 1e-2
+
+# Response headers describing binary profile bodies (exposed to the browser via CORS)
+BINARY_PROFILE_HEADERS = [
+    'X-Profile-Layout',
+    'X-Profile-Shape',
+    'X-Profile-Origin',
+    'X-Profile-Spacing',
+    'X-Profile-Count',
+    'X-Profile-Dtype',
+    'X-Profile-Original-Count',
+    'X-Profile-Leveling',
+]
+
+# Concurrent requests for the same unchanged profile file share one read / one conversion.
+# Per worker process only, as for measurement pickles (see measurement_data)
+_profile_reads = SingleFlight()
+_profile_array_loads = SingleFlight()
+
+
+class ProfileGrid:
+    """
+    Height map sampled on a regular lattice
+
+    Attributes:
+        origin: (x0, y0) coordinate of z[0, 0]
+        spacing: (dx, dy) lattice spacing (0.0 along an axis with a single sample)
+        z: 2D float array of shape (ny, nx), rows along Y and columns along X
+    """
+
+    def __init__(self, origin, spacing, z):
+        self.origin = origin
+        self.spacing = spacing
+        self.z = z
+
+    @property
+    def shape(self):
+        return self.z.shape
+
+    def x_coordinates(self):
+        return self.origin[0] + self.spacing[0] * np.arange(self.z.shape[1])
+
+    def y_coordinates(self):
+        return self.origin[1] + self.spacing[1] * np.arange(self.z.shape[0])
+
+
+def _find_coordinate_keys(mapping):
+    """Find the X/Y/Z keys of a mapping (case-insensitive)"""
+    keys = {}
+    for key in mapping.keys():
+        lowered = str(key).lower()
+        if lowered in ('x', 'y', 'z'):
+            keys[lowered] = key
+    return keys
+
+
+def profile_to_arrays(profile_data):
+    """
+    Convert a loaded profile pickle to float arrays
+
+    Supports the same layouts as the profile endpoint: a list of point dicts,
+    or a dict holding X/Y/Z columns (optionally nested under 'data', 'profile'
+    or 'coordinates').
+
+    Returns:
+        (x, y, z) tuple of 1D float64 arrays, or None for unsupported layouts
+    """
+    if isinstance(profile_data, dict):
+        for nested_key in ('data', 'profile', 'coordinates'):
+            if nested_key in profile_data:
+                return profile_to_arrays(profile_data[nested_key])
+
+        keys = _find_coordinate_keys(profile_data)
+        if len(keys) != 3:
+            return None
+        columns = [np.atleast_1d(np.asarray(profile_data[keys[axis]], dtype=np.float64)) for axis in ('x', 'y', 'z')]
+        count = min(len(column) for column in columns)
+        return tuple(column[:count] for column in columns)
+
+    if isinstance(profile_data, list):
+        if not profile_data:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty, empty
+        first = profile_data[0]
+        if not isinstance(first, dict):
+            return None
+        keys = _find_coordinate_keys(first)
+        if len(keys) != 3:
+            return None
+        return tuple(
+            np.fromiter((point[keys[axis]] for point in profile_data), dtype=np.float64, count=len(profile_data))
+            for axis in ('x', 'y', 'z')
+        )
+
+    return None
+
+
+def read_profile_pickle(profile_path):
+    """
+    Unpickle a profile file
+
+    Callers reading the same unchanged file at the same time (the viewer, heatmap
+    and analysis panels of one point) share one read; the data must not be mutated.
+    """
+    def read():
+        with open(profile_path, 'rb') as f:
+            return pickle.load(f)
+
+    return _profile_reads.do((str(profile_path), file_signature(profile_path)), read)
+
+
+def load_profile_arrays(profile_path):
+    """
+    Load a profile pickle and return its (x, y, z) arrays, or None for unsupported layouts
+
+    Concurrent calls for the same unchanged file share one load; the arrays must not be mutated.
+    """
+    return _profile_array_loads.do(
+        (str(profile_path), file_signature(profile_path)),
+        lambda: profile_to_arrays(read_profile_pickle(profile_path))
+    )
+
+
+def _axis_lattice(values):
+    """
+    Describe the sorted unique values of one axis as a lattice
+
+    Returns:
+        (origin, spacing, count) or None when the values are not evenly spaced
+    """
+    unique = np.unique(values)
+    if len(unique) == 1:
+        return float(unique[0]), 0.0, 1
+
+    steps = np.diff(unique)
+    spacing = float(np.median(steps))
+    if spacing <= 0 or np.max(np.abs(steps - spacing)) > GRID_TOLERANCE * spacing:
+        return None
+    return float(unique[0]), spacing, len(unique)
+
+
+def detect_regular_grid(x, y, z):
+    """
+    Detect whether scattered X/Y/Z samples lie on a regular lattice
+
+    Returns:
+        ProfileGrid, or None when the points are not a complete regular grid
+        (including when any X/Y coordinate is NaN or infinite)
+    """
+    if len(z) == 0:
+        return None
+    # Missing coordinates cannot be placed on a lattice; such profiles stay point clouds
+    if not (np.isfinite(x).all() and np.isfinite(y).all()):
+        return None
+
+    x_axis = _axis_lattice(x)
+    y_axis = _axis_lattice(y)
+    if x_axis is None or y_axis is None:
+        return None
+
+    (x0, dx, nx), (y0, dy, ny) = x_axis, y_axis
+    if nx * ny != len(z):
+        return None
+
+    # Snap every sample to its lattice cell and require an exact one-to-one fill
+    ix = np.rint((x - x0) / dx).astype(np.int64) if dx else np.zeros(len(x), dtype=np.int64)
+    iy = np.rint((y - y0) / dy).astype(np.int64) if dy else np.zeros(len(y), dtype=np.int64)
+    if dx and np.max(np.abs(x - (x0 + ix * dx))) > GRID_TOLERANCE * dx:
+        return None
+    if dy and np.max(np.abs(y - (y0 + iy * dy))) > GRID_TOLERANCE * dy:
+        return None
+
+    flat_index = iy * nx + ix
+    if np.any(np.bincount(flat_index, minlength=nx * ny) != 1):
+        return None
+
+    grid_z = np.empty(nx * ny, dtype=np.float64)
+    grid_z[flat_index] = z
+    return ProfileGrid((x0, y0), (dx, dy), grid_z.reshape(ny, nx))
+
+
+def encode_float32(values):
+    """Encode an array as base64 little-endian float32"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+
+def build_grid_payload(grid):
+    """Build the compact JSON representation of a ProfileGrid (origin/spacing/shape plus float32 Z)"""
+    return {
+        'layout': 'grid',
+        'origin': {'x': grid.origin[0], 'y': grid.origin[1]},
+        'spacing': {'x': grid.spacing[0], 'y': grid.spacing[1]},
+        'shape': list(grid.shape),
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'encoding': 'base64',
+        'z': encode_float32(grid.z),
+    }
+
+
+def build_grid_binary_body(grid):
+    """
+    Build the raw binary representation of a ProfileGrid
+
+    Returns:
+        (row-major float32 Z bytes, headers dict describing shape/origin/spacing)
+    """
+    body = np.ascontiguousarray(grid.z, dtype='<f4').tobytes()
+    headers = {
+        'X-Profile-Layout': 'grid',
+        'X-Profile-Shape': f"{grid.shape[0]},{grid.shape[1]}",
+        'X-Profile-Origin': f"{grid.origin[0]!r},{grid.origin[1]!r}",
+        'X-Profile-Spacing': f"{grid.spacing[0]!r},{grid.spacing[1]!r}",
+        'X-Profile-Dtype': 'float32',
+    }
+    return body, headers
+
+
+def build_typed_profile_payload(x, y, z):
+    """
+    Build the compact JSON representation of a profile
+
+    Regular grids are sent as origin, spacing and shape plus a row-major float32
+    Z array; anything else falls back to explicit float32 X/Y/Z arrays.
+    """
+    grid = detect_regular_grid(x, y, z)
+    if grid is not None:
+        return build_grid_payload(grid)
+    return {
+        'layout': 'points',
+        'count': len(z),
+        'dtype': 'float32',
+        'byte_order': 'little',
+        'encoding': 'base64',
+        'x': encode_float32(x),
+        'y': encode_float32(y),
+        'z': encode_float32(z),
+    }
+
+
+def build_binary_profile_body(x, y, z):
+    """
+    Build the raw binary representation of a profile
+
+    Returns:
+        (body bytes, headers dict). Grids send only Z (row-major, shape in headers);
+        other layouts send X, Y and Z back to back.
+    """
+    grid = detect_regular_grid(x, y, z)
+    if grid is not None:
+        body, headers = build_grid_binary_body(grid)
+    else:
+        body = b''.join(np.ascontiguousarray(column, dtype='<f4').tobytes() for column in (x, y, z))
+        headers = {
+            'X-Profile-Layout': 'points',
+            'X-Profile-Count': str(len(z)),
+            'X-Profile-Dtype': 'float32',
+        }
+    return body, headers
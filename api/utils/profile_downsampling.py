@@ -0,0 +1,164 @@
+"""
+Profile downsampling
+Reduce profiles to a point budget while keeping their visible shape (peaks, valleys, steps)
+"""
+import math
+
+import numpy as np
+
+from .profile_data import detect_regular_grid
+from .profile_leveling import load_profile_arrays_leveled
+from .result_cache import FileResultCache
+
+# Downsampled profiles kept per worker process, keyed by (profile file, max_points, leveling)
+downsampled_profile_cache = FileResultCache(max_entries=256)
+
+
+class DownsampledProfile:
+    """
+    Result of downsampling a profile
+
+    Attributes:
+        x, y, z: 1D float arrays of the retained (or aggregated) samples
+        method: 'none', 'block-minmax' or 'lttb'
+        original_count: Number of samples in the source profile
+    """
+
+    def __init__(self, x, y, z, method, original_count):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.method = method
+        self.original_count = original_count
+
+    def summary(self):
+        return {
+            'method': self.method,
+            'original_count': self.original_count,
+            'count': len(self.z),
+        }
+
+
+def decimate_grid_minmax(z, max_points):
+    """
+    Shrink a 2D height map with min/max-preserving block decimation
+
+    The grid is split into blocks of by x bx cells. Each block is replaced by its
+    minimum or its maximum, whichever lies further from the block mean, so narrow
+    peaks and trenches survive instead of being averaged away.
+
+    Returns:
+        (reduced z, (by, bx) block size)
+    """
+    ny, nx = z.shape
+    factor = max(1, math.ceil(math.sqrt(ny * nx / max_points)))
+    by, bx = min(factor, ny), min(factor, nx)
+    while math.ceil(ny / by) * math.ceil(nx / bx) > max_points:
+        if by < ny:
+            by += 1
+        if bx < nx:
+            bx += 1
+
+    out_y, out_x = math.ceil(ny / by), math.ceil(nx / bx)
+    padded = np.full((out_y * by, out_x * bx), np.nan)
+    padded[:ny, :nx] = z
+    blocks = padded.reshape(out_y, by, out_x, bx).transpose(0, 2, 1, 3).reshape(out_y, out_x, by * bx)
+
+    # Every block holds at least one real sample, so the nan-reductions never see an empty block
+    block_min = np.nanmin(blocks, axis=2)
+    block_max = np.nanmax(blocks, axis=2)
+    block_mean = np.nanmean(blocks, axis=2)
+    reduced = np.where(block_max - block_mean >= block_mean - block_min, block_max, block_min)
+    return reduced, (by, bx)
+
+
+def lttb_indices(position, values, max_points):
+    """
+    Select sample indices with Largest-Triangle-Three-Buckets
+
+    Keeps the first and last samples and, from each of max_points - 2 buckets, the
+    sample forming the largest triangle with the previously kept sample and the
+    mean of the next bucket.
+
+    Args:
+        position: 1D increasing coordinate of each sample (e.g. distance along the line)
+        values: 1D sample values
+        max_points: Number of samples to keep (>= 3)
+    """
+    count = len(values)
+    if max_points >= count or max_points < 3:
+        return np.arange(count)
+
+    # Bucket edges over the interior samples [1, count - 1)
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Mean point of every bucket, computed once with reduceat
+    sizes = ends - starts
+    mean_position = np.add.reduceat(position[1:count - 1], starts - 1) / sizes
+    mean_values = np.add.reduceat(values[1:count - 1], starts - 1) / sizes
+    # The bucket after the last one is the final sample itself
+    next_position = np.append(mean_position[1:], position[-1])
+    next_values = np.append(mean_values[1:], values[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    previous = 0
+    for bucket, (start, end) in enumerate(zip(starts, ends)):
+        candidate_position = position[start:end]
+        candidate_values = values[start:end]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs(
+            (position[previous] - next_position[bucket]) * (candidate_values - values[previous])
+            - (position[previous] - candidate_position) * (next_values[bucket] - values[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    selected[-1] = count - 1
+    return selected
+
+
+def downsample_arrays(x, y, z, max_points):
+    """
+    Downsample profile arrays to at most max_points samples
+
+    Regular 2D grids use min/max-preserving block decimation; line profiles
+    (single-row grids and scattered scans) use LTTB along the scan path.
+    """
+    original_count = len(z)
+    if original_count <= max_points:
+        return DownsampledProfile(x, y, z, 'none', original_count)
+
+    grid = detect_regular_grid(x, y, z)
+    if grid is not None and min(grid.shape) > 1:
+        reduced, (by, bx) = decimate_grid_minmax(grid.z, max_points)
+        (x0, y0), (dx, dy) = grid.origin, grid.spacing
+        # Place every reduced cell at the centre of its block
+        block_x = x0 + dx * (np.arange(reduced.shape[1]) * bx + (bx - 1) / 2)
+        block_y = y0 + dy * (np.arange(reduced.shape[0]) * by + (by - 1) / 2)
+        grid_x, grid_y = np.meshgrid(block_x, block_y)
+        return DownsampledProfile(grid_x.ravel(), grid_y.ravel(), reduced.ravel(), 'block-minmax', original_count)
+
+    # Line profile: distance along the scan path as the LTTB axis
+    if grid is not None:
+        order = np.lexsort((x, y))
+        x, y, z = x[order], y[order], z[order]
+    distance = np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(x), np.diff(y)))))
+    indices = lttb_indices(distance, z, max_points)
+    return DownsampledProfile(x[indices], y[indices], z[indices], 'lttb', original_count)
+
+
+def get_downsampled_profile(profile_path, max_points, leveling=None):
+    """
+    Load, optionally level, and downsample a profile file, cached per (file, max_points, leveling)
+
+    Returns:
+        DownsampledProfile, or None when the file has no X/Y/Z coordinates
+    """
+    def compute():
+        arrays = load_profile_arrays_leveled(profile_path, leveling)
+        if arrays is None:
+            return None
+        return downsample_arrays(*arrays, max_points)
+
+    return downsampled_profile_cache.get_or_compute(profile_path, (str(profile_path), max_points, leveling), compute)
@@ -0,0 +1,158 @@
+"""
+Profile leveling
+Tilt and bow removal for AFM height maps (plane, polynomial surface, line-by-line flatten)
+"""
+import numpy as np
+
+from .profile_data import detect_regular_grid, load_profile_arrays
+from .result_cache import FileResultCache
+
+# Selectable leveling methods and their default polynomial order
+LEVELING_METHODS = {
+    'plane': 1,         # Least-squares plane (tilt)
+    'polynomial': 2,    # Least-squares polynomial surface (tilt and bow)
+    'line': 1,          # Per-scan-line polynomial (line-by-line flatten)
+}
+MAX_LEVELING_ORDER = 5
+
+# Leveled profiles kept per worker process, keyed by (profile file, method, order)
+leveled_profile_cache = FileResultCache(max_entries=128)
+
+
+def parse_leveling(method, order=None):
+    """
+    Validate leveling request parameters
+
+    Args:
+        method: Leveling method name, or None/'none' for raw data
+        order: Polynomial order (string or int); defaults per method
+
+    Returns:
+        (method, order) tuple, or None when no leveling is requested
+
+    Raises:
+        ValueError: For unknown methods or orders out of range
+    """
+    if method is None or method.lower() in ('', 'none'):
+        return None
+    method = method.lower()
+    if method not in LEVELING_METHODS:
+        raise ValueError(f"level must be one of: none, {', '.join(LEVELING_METHODS)} (got '{method}')")
+
+    if method == 'plane':
+        order = 1
+    elif order is None or order == '':
+        order = LEVELING_METHODS[method]
+    else:
+        try:
+            order = int(order)
+        except (TypeError, ValueError):
+            order = -1
+        if not 0 <= order <= MAX_LEVELING_ORDER:
+            raise ValueError(f'order must be an integer between 0 and {MAX_LEVELING_ORDER}')
+    return method, order
+
+
+def leveling_summary(leveling):
+    """JSON description of a (method, order) leveling"""
+    method, order = leveling
+    return {'method': method, 'order': order}
+
+
+def _normalize(values):
+    """Map coordinates onto [-1, 1] to keep polynomial fits well conditioned"""
+    low, high = float(np.min(values)), float(np.max(values))
+    if high == low:
+        return np.zeros_like(values, dtype=np.float64)
+    return (2.0 * values - (high + low)) / (high - low)
+
+
+def fit_polynomial_surface(x, y, z, order):
+    """
+    Least-squares fit of a 2D polynomial surface sum(c_ij * x^i * y^j), i + j <= order
+
+    Non-finite heights are ignored by the fit; the surface is evaluated everywhere.
+    """
+    u, v = _normalize(x), _normalize(y)
+    terms = np.stack([u ** i * v ** j for i in range(order + 1) for j in range(order + 1 - i)], axis=1)
+    valid = np.isfinite(z)
+    if np.count_nonzero(valid) < terms.shape[1]:
+        raise ValueError(f'Not enough valid samples for an order-{order} fit')
+    coefficients, *_ = np.linalg.lstsq(terms[valid], z[valid], rcond=None)
+    return terms @ coefficients
+
+
+def flatten_lines(z_grid, order):
+    """
+    Subtract a least-squares polynomial of the given order from every row of a height map
+
+    Rows without gaps are fitted together in a single solve; rows containing
+    non-finite samples are fitted one by one on their valid samples.
+    """
+    ny, nx = z_grid.shape
+    if nx < order + 1:
+        raise ValueError(f'Scan lines have {nx} samples, too few for an order-{order} fit')
+
+    vander = np.vander(_normalize(np.arange(nx, dtype=np.float64)), order + 1)
+    fitted = np.empty_like(z_grid)
+
+    complete = np.all(np.isfinite(z_grid), axis=1)
+    if np.any(complete):
+        coefficients, *_ = np.linalg.lstsq(vander, z_grid[complete].T, rcond=None)
+        fitted[complete] = (vander @ coefficients).T
+
+    for row in np.flatnonzero(~complete):
+        valid = np.isfinite(z_grid[row])
+        if np.count_nonzero(valid) < order + 1:
+            fitted[row] = np.nanmean(z_grid[row]) if np.any(valid) else 0.0
+            continue
+        coefficients, *_ = np.linalg.lstsq(vander[valid], z_grid[row, valid], rcond=None)
+        fitted[row] = vander @ coefficients
+
+    return z_grid - fitted
+
+
+def level_arrays(x, y, z, leveling):
+    """
+    Apply a (method, order) leveling to profile arrays
+
+    Returns:
+        Leveled Z array in the same sample order as the input
+
+    Raises:
+        ValueError: When the profile cannot be leveled with the method
+    """
+    method, order = leveling
+    if method in ('plane', 'polynomial'):
+        return z - fit_polynomial_surface(x, y, z, order)
+
+    # Line-by-line flatten needs scan lines: rows of a regular grid
+    grid = detect_regular_grid(x, y, z)
+    if grid is None:
+        raise ValueError('Line leveling requires a profile sampled on a regular grid')
+    flattened = flatten_lines(grid.z, order)
+
+    (x0, y0), (dx, dy) = grid.origin, grid.spacing
+    ix = np.rint((x - x0) / dx).astype(np.int64) if dx else np.zeros(len(x), dtype=np.int64)
+    iy = np.rint((y - y0) / dy).astype(np.int64) if dy else np.zeros(len(y), dtype=np.int64)
+    return flattened[iy, ix]
+
+
+def load_profile_arrays_leveled(profile_path, leveling=None):
+    """
+    Load a profile file's (x, y, z) arrays, leveled and cached per (file, method, order)
+
+    Returns:
+        (x, y, z) arrays, or None when the file has no X/Y/Z coordinates
+    """
+    if leveling is None:
+        return load_profile_arrays(profile_path)
+
+    def compute():
+        arrays = load_profile_arrays(profile_path)
+        if arrays is None:
+            return None
+        x, y, z = arrays
+        return x, y, level_arrays(x, y, z, leveling)
+
+    return leveled_profile_cache.get_or_compute(profile_path, (str(profile_path), leveling), compute)
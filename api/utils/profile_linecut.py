@@ -0,0 +1,152 @@
+"""
+Profile line cuts
+Bilinearly interpolated cross-sections through gridded AFM height maps
+"""
+import math
+
+import numpy as np
+
+from .profile_data import detect_regular_grid
+from .profile_leveling import load_profile_arrays_leveled
+from .result_cache import FileResultCache
+
+# Upper bound for samples along one cut
+MAX_LINECUT_SAMPLES = 8192
+
+# Slack, in grid spacings, for points on the grid edge that rounding puts just outside it
+GRID_EDGE_TOLERANCE = 1e-6
+
+# Gridded profiles kept per worker process, keyed by (profile file, leveling)
+gridded_profile_cache = FileResultCache(max_entries=64)
+
+
+def get_profile_grid(profile_path, leveling=None):
+    """
+    Load a profile file as a ProfileGrid, cached until the file changes
+
+    Returns:
+        ProfileGrid, or None when the file has no X/Y/Z coordinates
+
+    Raises:
+        ValueError: When the profile is not sampled on a regular grid
+    """
+    def compute():
+        arrays = load_profile_arrays_leveled(profile_path, leveling)
+        if arrays is None:
+            return None
+        grid = detect_regular_grid(*arrays)
+        if grid is None or min(grid.shape) < 2:
+            raise ValueError('Line cuts require a 2D profile sampled on a regular grid')
+        return grid
+
+    return gridded_profile_cache.get_or_compute(profile_path, ('grid', str(profile_path), leveling), compute)
+
+
+def grid_extent(grid):
+    """(x_min, y_min, x_max, y_max) of a grid's sample positions"""
+    (x0, y0), (dx, dy) = grid.origin, grid.spacing
+    ny, nx = grid.shape
+    return x0, y0, x0 + dx * (nx - 1), y0 + dy * (ny - 1)
+
+
+def line_from_angle(grid, angle_degrees, offset=0.0):
+    """
+    Endpoints of a line across the whole grid at an angle, shifted from its centre
+
+    Args:
+        angle_degrees: Direction of the cut, counter-clockwise from +X
+        offset: Perpendicular distance of the cut from the grid centre
+
+    Returns:
+        (x0, y0, x1, y1)
+
+    Raises:
+        ValueError: When the line misses the grid
+    """
+    x_min, y_min, x_max, y_max = grid_extent(grid)
+    theta = math.radians(angle_degrees)
+    ux, uy = math.cos(theta), math.sin(theta)
+    cx = (x_min + x_max) / 2 - uy * offset
+    cy = (y_min + y_max) / 2 + ux * offset
+
+    # Clip the infinite line c + t * u against the bounding box (slab method)
+    t_low, t_high = -math.inf, math.inf
+    for origin, direction, low, high in ((cx, ux, x_min, x_max), (cy, uy, y_min, y_max)):
+        if abs(direction) < 1e-12:
+            if not low <= origin <= high:
+                raise ValueError('Line cut does not cross the height map')
+            continue
+        t1, t2 = (low - origin) / direction, (high - origin) / direction
+        t_low, t_high = max(t_low, min(t1, t2)), min(t_high, max(t1, t2))
+    if t_low > t_high:
+        raise ValueError('Line cut does not cross the height map')
+    return cx + t_low * ux, cy + t_low * uy, cx + t_high * ux, cy + t_high * uy
+
+
+def bilinear_sample(grid, x, y):
+    """
+    Bilinearly interpolate grid heights at coordinates (x, y)
+
+    Points outside the grid are NaN; points within GRID_EDGE_TOLERANCE of an edge
+    are snapped onto it.
+    """
+    (x0, y0), (dx, dy) = grid.origin, grid.spacing
+    ny, nx = grid.shape
+    u = (np.asarray(x, dtype=np.float64) - x0) / dx
+    v = (np.asarray(y, dtype=np.float64) - y0) / dy
+    tol = GRID_EDGE_TOLERANCE
+    outside = (u < -tol) | (u > nx - 1 + tol) | (v < -tol) | (v > ny - 1 + tol)
+    u = np.clip(u, 0.0, nx - 1)
+    v = np.clip(v, 0.0, ny - 1)
+
+    i = np.clip(np.floor(u).astype(np.int64), 0, nx - 2)
+    j = np.clip(np.floor(v).astype(np.int64), 0, ny - 2)
+    s = np.clip(u - i, 0.0, 1.0)
+    t = np.clip(v - j, 0.0, 1.0)
+    z = grid.z
+    heights = ((1 - s) * (1 - t) * z[j, i] + s * (1 - t) * z[j, i + 1]
+               + (1 - s) * t * z[j + 1, i] + s * t * z[j + 1, i + 1])
+    heights[outside] = np.nan
+    return heights
+
+
+def extract_line_cut(grid, start, end, samples=None):
+    """
+    Sample the height map along the segment from start to end
+
+    Args:
+        start, end: (x, y) endpoints in profile coordinates
+        samples: Number of samples; defaults to one per grid spacing
+
+    Returns:
+        JSON-ready dict with distance, x, y, z lists and a height summary
+    """
+    (xa, ya), (xb, yb) = start, end
+    length = math.hypot(xb - xa, yb - ya)
+    if samples is None:
+        step = min(grid.spacing)
+        samples = int(math.ceil(length / step)) + 1 if step > 0 else 2
+    samples = max(2, min(int(samples), MAX_LINECUT_SAMPLES))
+
+    fraction = np.linspace(0.0, 1.0, samples)
+    x = xa + (xb - xa) * fraction
+    y = ya + (yb - ya) * fraction
+    z = bilinear_sample(grid, x, y)
+
+    finite = z[np.isfinite(z)]
+    summary = {
+        'length': length,
+        'samples': samples,
+        'start': {'x': xa, 'y': ya},
+        'end': {'x': xb, 'y': yb},
+        'min': float(finite.min()) if finite.size else None,
+        'max': float(finite.max()) if finite.size else None,
+        'range': float(finite.max() - finite.min()) if finite.size else None,
+    }
+    return {
+        'distance': (fraction * length).tolist(),
+        'x': x.tolist(),
+        'y': y.tolist(),
+        'z': z.tolist(),
+        'summary': summary,
+    }
@@ -0,0 +1,155 @@
+"""
+Profile rendering
+Colormapped PNG/WebP previews of profile height maps, rendered with numpy and Pillow and cached on disk
+"""
+import io
+import math
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from .disk_cache import DiskCache, source_key
+from .profile_data import detect_regular_grid
+from .profile_leveling import load_profile_arrays_leveled
+
+# Same palettes as HeatmapChart.vue (anchor colors, low to high)
+COLORMAPS = {
+    'spectral': ['#313695', '#4575b4', '#74add1', '#abd9e9', '#e0f3f8', '#ffffbf', '#fee090', '#fdae61', '#f46d43', '#d73027', '#a50026'],
+    'viridis': ['#440154', '#482777', '#3f4a8a', '#31678e', '#26838f', '#1f9d8a', '#6cce5a', '#b6de2b', '#fee825'],
+    'plasma': ['#0d0887', '#46039f', '#7201a8', '#9c179e', '#bd3786', '#d8576b', '#ed7953', '#fb9f3a', '#fdca26', '#f0f921'],
+    'coolwarm': ['#3b4cc0', '#6788ee', '#9abbff', '#c9ddff', '#f7f7f7', '#ffddaa', '#ffaa77', '#ee6644', '#b40426'],
+    'rainbow': ['#ff0000', '#ff7f00', '#ffff00', '#00ff00', '#0000ff', '#4b0082', '#9400d3'],
+    'jet': ['#000083', '#003caa', '#0055d4', '#0071ff', '#008cff', '#00a6ff', '#00c1ff', '#00dbff', '#00f6ff', '#1fffea', '#42ffca', '#65ffa9', '#88ff88', '#abff66', '#ceff44', '#f1ff22', '#ffee00', '#ffcc00', '#ffaa00', '#ff8800', '#ff6600', '#ff4400', '#ff2200', '#ff0000', '#dd0000', '#bb0000', '#990000', '#770000'],
+    'thermal': ['#000000', '#200080', '#4000c0', '#6000ff', '#8040ff', '#a080ff', '#c0c0ff', '#ffffff', '#ffc0c0', '#ff8080', '#ff4040', '#ff0000', '#c00000', '#800000', '#400000'],
+    'grayscale': ['#000000', '#1a1a1a', '#333333', '#4d4d4d', '#666666', '#808080', '#999999', '#b3b3b3', '#cccccc', '#e6e6e6', '#ffffff'],
+}
+DEFAULT_COLORMAP = 'spectral'
+
+# Output formats: Pillow format name and mimetype
+RENDER_FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+DEFAULT_RENDER_FORMAT = 'webp'
+
+# Color range modes: full min..max, or trimmed to percentiles (robust to spikes)
+RANGE_MODES = ('minmax', 'percentile')
+PERCENTILE_RANGE = (2.0, 98.0)
+
+# Scattered profiles are binned onto a square raster of at most this many pixels per side
+MAX_RASTER_SIZE = 512
+
+# Rendered images on the local disk, keyed by source file and render options
+render_cache = DiskCache('renders', max_bytes=1024 * 1024 * 1024)
+
+
+@lru_cache(maxsize=None)
+def colormap_lut(name):
+    """256-entry RGB lookup table interpolated between a colormap's anchor colors"""
+    anchors = np.array([[int(color[i:i + 2], 16) for i in (1, 3, 5)] for color in COLORMAPS[name]], dtype=np.float64)
+    positions = np.linspace(0.0, 1.0, len(anchors))
+    samples = np.linspace(0.0, 1.0, 256)
+    lut = np.stack([np.interp(samples, positions, anchors[:, channel]) for channel in range(3)], axis=1)
+    return np.rint(lut).astype(np.uint8)
+
+
+def rasterize_points(x, y, z, max_size=MAX_RASTER_SIZE):
+    """
+    Bin scattered X/Y/Z samples onto a square raster (mean Z per cell, NaN where empty)
+
+    Same binning as the browser-side heatmap fallback for irregular data.
+    """
+    size = max(2, min(max_size, int(math.ceil(math.sqrt(len(z))))))
+    x_min, x_max = float(np.min(x)), float(np.max(x))
+    y_min, y_max = float(np.min(y)), float(np.max(y))
+    col = np.minimum(((x - x_min) / ((x_max - x_min) or 1.0) * size).astype(np.int64), size - 1)
+    row = np.minimum(((y - y_min) / ((y_max - y_min) or 1.0) * size).astype(np.int64), size - 1)
+    cell = row * size + col
+
+    valid = np.isfinite(z)
+    sums = np.bincount(cell[valid], weights=z[valid], minlength=size * size)
+    counts = np.bincount(cell[valid], minlength=size * size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts).reshape(size, size)
+
+
+def load_height_map(profile_path, leveling=None):
+    """
+    Load a profile file as a 2D height map (rows along +Y)
+
+    Regular grids are used as-is; line profiles and scattered data are rasterized.
+
+    Returns:
+        2D float array, or None when the file has no X/Y/Z coordinates
+    """
+    arrays = load_profile_arrays_leveled(profile_path, leveling)
+    if arrays is None:
+        return None
+    grid = detect_regular_grid(*arrays)
+    if grid is not None and min(grid.shape) > 1:
+        return grid.z
+    return rasterize_points(*arrays)
+
+
+def color_range(z, range_mode='minmax', vmin=None, vmax=None):
+    """Resolve the (low, high) heights mapped to the ends of the colormap"""
+    finite = z[np.isfinite(z)]
+    if finite.size == 0:
+        return 0.0, 1.0
+    if range_mode == 'percentile':
+        low, high = (float(v) for v in np.percentile(finite, PERCENTILE_RANGE))
+    else:
+        low, high = float(finite.min()), float(finite.max())
+    return (low if vmin is None else vmin), (high if vmax is None else vmax)
+
+
+def colorize(z, colormap=DEFAULT_COLORMAP, low=0.0, high=1.0):
+    """
+    Map a height map to RGBA pixels
+
+    Heights are clipped to [low, high]; missing samples are transparent. The image
+    is flipped vertically so +Y points up, as in the heatmap view.
+    """
+    lut = colormap_lut(colormap)
+    span = (high - low) or 1.0
+    valid = np.isfinite(z)
+    index = np.clip((np.where(valid, z, low) - low) / span * 255.0, 0, 255).astype(np.uint8)
+
+    rgba = np.empty(z.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = lut[index]
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba[::-1]
+
+
+def encode_image(rgba, image_format=DEFAULT_RENDER_FORMAT):
+    """Encode RGBA pixels as PNG or (lossless) WebP bytes"""
+    image = Image.fromarray(np.ascontiguousarray(rgba), mode='RGBA')
+    if rgba[..., 3].min() == 255:
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    if image_format == 'webp':
+        image.save(buffer, format='WEBP', lossless=True)
+    else:
+        image.save(buffer, format=RENDER_FORMATS[image_format][0])
+    return buffer.getvalue()
+
+
+def render_profile_image(profile_path, colormap=DEFAULT_COLORMAP, image_format=DEFAULT_RENDER_FORMAT,
+                         range_mode='minmax', vmin=None, vmax=None, leveling=None):
+    """
+    Render a profile as a colormapped image, cached on disk until the profile changes
+
+    Returns:
+        Path of the cached image file, or None when the profile has no X/Y/Z data
+    """
+    key = source_key(profile_path, 'render', colormap, image_format, range_mode, vmin, vmax, leveling)
+
+    def create():
+        z = load_height_map(profile_path, leveling)
+        if z is None:
+            return None
+        low, high = color_range(z, range_mode, vmin, vmax)
+        return encode_image(colorize(z, colormap, low, high), image_format)
+
+    return render_cache.get_or_create(key, create, f'.{image_format}')
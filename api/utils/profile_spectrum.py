@@ -0,0 +1,181 @@
+"""
+Profile spectral analysis
+Power spectral density (1D, 2D and radially averaged) and dominant spatial frequencies of height maps
+"""
+import numpy as np
+
+from .executors import run_in_process
+from .profile_data import detect_regular_grid, encode_float32
+from .profile_leveling import load_profile_arrays_leveled
+from .result_cache import FileResultCache
+
+# Window functions applied before the FFT
+SPECTRUM_WINDOWS = {
+    'none': np.ones,
+    'hann': np.hanning,
+    'hamming': np.hamming,
+    'blackman': np.blackman,
+}
+DEFAULT_WINDOW = 'hann'
+
+# Radial averaging bins (default: half the shorter grid side)
+MIN_RADIAL_BINS = 8
+MAX_RADIAL_BINS = 1024
+
+# Number of dominant spatial frequencies reported
+DOMINANT_FREQUENCY_COUNT = 5
+
+# Spectra kept per worker process, keyed by (profile file, leveling, window, bins, include_2d)
+spectrum_cache = FileResultCache(max_entries=64)
+
+
+def _windowed(values, window):
+    """Remove the mean and apply a window along the last axis (and the first for 2D maps)"""
+    window_fn = SPECTRUM_WINDOWS[window]
+    if values.ndim == 1:
+        weights = window_fn(values.size)
+    else:
+        weights = np.outer(window_fn(values.shape[0]), window_fn(values.shape[1]))
+    centered = values - values.mean()
+    # Window power correction keeps the integrated PSD equal to the height variance
+    return centered * weights, float(np.mean(weights ** 2))
+
+
+def _dominant_frequencies(frequency, psd, count=DOMINANT_FREQUENCY_COUNT):
+    """Local maxima of a 1D spectrum (DC excluded), strongest first"""
+    if psd.size < 3:
+        return []
+    interior = np.flatnonzero((psd[1:-1] > psd[:-2]) & (psd[1:-1] >= psd[2:])) + 1
+    interior = interior[frequency[interior] > 0]
+    strongest = interior[np.argsort(psd[interior])[::-1][:count]]
+    return [
+        {'frequency': float(frequency[i]), 'wavelength': float(1.0 / frequency[i]), 'power': float(psd[i])}
+        for i in strongest
+    ]
+
+
+def _fill_gaps(z_grid):
+    """Replace non-finite heights with the mean of the finite ones"""
+    valid = np.isfinite(z_grid)
+    if valid.all():
+        return z_grid
+    if not valid.any():
+        raise ValueError('Profile has no finite height values')
+    return np.where(valid, z_grid, z_grid[valid].mean())
+
+
+def compute_line_psd(z_line, spacing, window=DEFAULT_WINDOW):
+    """
+    One-sided PSD of a single scan line
+
+    Returns:
+        (frequency, psd) arrays; frequency in 1/(coordinate unit)
+
+    Raises:
+        ValueError: When the line has fewer than 2 samples (no spacing to scale by)
+    """
+    n = z_line.size
+    if n < 2 or spacing <= 0:
+        raise ValueError('Spectral analysis requires at least 2 samples along the profile')
+    windowed, power = _windowed(z_line, window)
+    spectrum = np.abs(np.fft.rfft(windowed)) ** 2 * spacing / (n * power)
+    # Fold negative frequencies onto positive ones (DC and Nyquist appear once)
+    spectrum[1:(n + 1) // 2] *= 2
+    return np.fft.rfftfreq(n, spacing), spectrum
+
+
+def compute_spectrum(x, y, z, window=DEFAULT_WINDOW, radial_bins=None, include_2d=False):
+    """
+    Compute the PSD of a profile sampled on a regular grid
+
+    Line profiles (a single row or column) get a one-sided 1D PSD. Height maps
+    get the 2D PSD and its radial (azimuthal) average, from DC up to the lower of
+    the two Nyquist frequencies. Pure numpy: runs inside the process pool.
+
+    Returns:
+        JSON-ready dict with the spectrum, dominant frequencies and the RMS
+        height recovered from the integrated PSD
+
+    Raises:
+        ValueError: When the profile is not a regular grid or is a single sample
+    """
+    grid = detect_regular_grid(x, y, z)
+    if grid is None:
+        raise ValueError('Spectral analysis requires a profile sampled on a regular grid')
+
+    z_grid = _fill_gaps(grid.z)
+    ny, nx = z_grid.shape
+    dx, dy = grid.spacing
+
+    if ny == 1 or nx == 1:
+        spacing = dx if nx > 1 else dy
+        frequency, psd = compute_line_psd(z_grid.ravel(), spacing, window)
+        return {
+            'type': '1d',
+            'window': window,
+            'frequency': frequency.tolist(),
+            'psd': psd.tolist(),
+            'dominant_frequencies': _dominant_frequencies(frequency, psd),
+            'rms_from_psd': float(np.sqrt(np.sum(psd) / (z_grid.size * spacing))),
+        }
+
+    windowed, power = _windowed(z_grid, window)
+    psd_2d = np.abs(np.fft.fft2(windowed)) ** 2 * dx * dy / (nx * ny * power)
+    fx = np.fft.fftfreq(nx, dx)
+    fy = np.fft.fftfreq(ny, dy)
+    radius = np.hypot(fy[:, None], fx[None, :])
+
+    # Radial average over annuli up to the lower Nyquist frequency
+    if radial_bins is None:
+        radial_bins = max(MIN_RADIAL_BINS, min(nx, ny) // 2)
+    f_max = min(0.5 / dx, 0.5 / dy)
+    edges = np.linspace(0.0, f_max, radial_bins + 1)
+    ring = np.digitize(radius.ravel(), edges) - 1
+    inside = (ring >= 0) & (ring < radial_bins) & (radius.ravel() > 0)
+    sums = np.bincount(ring[inside], weights=psd_2d.ravel()[inside], minlength=radial_bins)
+    counts = np.bincount(ring[inside], minlength=radial_bins)
+    radii = np.bincount(ring[inside], weights=radius.ravel()[inside], minlength=radial_bins)
+    populated = counts > 0
+    # Each ring is reported at the mean frequency of the samples it averages
+    radial_frequency = radii[populated] / counts[populated]
+    radial_psd = sums[populated] / counts[populated]
+
+    result = {
+        'type': '2d',
+        'window': window,
+        'shape': [ny, nx],
+        'frequency': radial_frequency.tolist(),
+        'psd': radial_psd.tolist(),
+        'dominant_frequencies': _dominant_frequencies(radial_frequency, radial_psd),
+        'rms_from_psd': float(np.sqrt(np.sum(psd_2d) / (nx * ny * dx * dy))),
+    }
+    if include_2d:
+        # Centred spectrum (zero frequency in the middle), row-major float32 like grid profiles
+        shifted = np.fft.fftshift(psd_2d)
+        result['psd_2d'] = {
+            'origin': {'x': float(np.fft.fftshift(fx)[0]), 'y': float(np.fft.fftshift(fy)[0])},
+            'spacing': {'x': 1.0 / (nx * dx), 'y': 1.0 / (ny * dy)},
+            'shape': [ny, nx],
+            'dtype': 'float32',
+            'byte_order': 'little',
+            'encoding': 'base64',
+            'psd': encode_float32(shifted),
+        }
+    return result
+
+
+def get_profile_spectrum(profile_path, window=DEFAULT_WINDOW, radial_bins=None, include_2d=False, leveling=None):
+    """
+    PSD of a profile file, computed on the process pool and cached until the file changes
+
+    Returns:
+        Spectrum dict, or None when the file has no X/Y/Z coordinates
+    """
+    def compute():
+        arrays = load_profile_arrays_leveled(profile_path, leveling)
+        if arrays is None:
+            return None
+        return run_in_process(compute_spectrum, *arrays, window=window, radial_bins=radial_bins, include_2d=include_2d)
+
+    key = ('spectrum', str(profile_path), leveling, window, radial_bins, include_2d)
+    return spectrum_cache.get_or_compute(profile_path, key, compute)
@@ -0,0 +1,116 @@
+"""
+Profile statistics
+Surface-roughness parameters and height histograms of AFM profiles, computed with numpy
+"""
+import numpy as np
+
+from .profile_leveling import load_profile_arrays_leveled
+from .result_cache import FileResultCache
+
+# Histogram bin count limits (same range the HistogramChart accepts)
+DEFAULT_HISTOGRAM_BINS = 30
+MIN_HISTOGRAM_BINS = 5
+MAX_HISTOGRAM_BINS = 200
+
+# Number of highest peaks / deepest valleys averaged for the ten-point height Rz
+RZ_EXTREMES = 5
+
+# Statistics kept per worker process, keyed by (profile file, bins, leveling)
+profile_stats_cache = FileResultCache(max_entries=1024)
+
+
+def compute_histogram(z, bins):
+    """
+    Histogram of height values with equal-width bins from min to max
+
+    The last bin includes the maximum, matching the HistogramChart binning.
+    """
+    counts, edges = np.histogram(z, bins=bins)
+    return {
+        'bins': int(bins),
+        'edges': edges.tolist(),
+        'centers': ((edges[:-1] + edges[1:]) / 2).tolist(),
+        'counts': counts.tolist(),
+    }
+
+
+def compute_profile_stats(z, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    Compute roughness parameters and distribution statistics of height values
+
+    Heights are taken relative to their mean line. Ra and Rq are the arithmetic
+    and root-mean-square deviations, Rp/Rv the highest peak and deepest valley,
+    Rt their sum and Rz the ten-point height (mean of the RZ_EXTREMES highest
+    peaks plus mean of the RZ_EXTREMES deepest valleys). Skewness and (excess)
+    kurtosis use population moments like the browser-side statistics did.
+
+    Returns:
+        Dict of statistics, or None when there are no finite heights
+    """
+    z = np.asarray(z, dtype=np.float64).ravel()
+    z = z[np.isfinite(z)]
+    n = z.size
+    if n == 0:
+        return None
+
+    mean = float(z.mean())
+    deviation = z - mean
+    std = float(np.sqrt(np.mean(deviation ** 2)))
+    z_sorted = np.sort(z)
+
+    if std > 0 and n > 2:
+        standardized = deviation / std
+        skewness = float(np.mean(standardized ** 3))
+        kurtosis = float(np.mean(standardized ** 4) - 3)
+        outliers = int(np.count_nonzero(np.abs(standardized) > 3))
+    else:
+        skewness = kurtosis = 0.0
+        outliers = 0
+
+    extremes = max(1, min(RZ_EXTREMES, n // 2))
+    peak = float(z_sorted[-1] - mean)
+    valley = float(mean - z_sorted[0])
+
+    if z_sorted[0] == z_sorted[-1]:
+        histogram = {'bins': 1, 'edges': [float(z_sorted[0])] * 2, 'centers': [float(z_sorted[0])], 'counts': [n]}
+    else:
+        histogram = compute_histogram(z, bins)
+
+    return {
+        'count': int(n),
+        'mean': mean,
+        'std': std,
+        'min': float(z_sorted[0]),
+        'max': float(z_sorted[-1]),
+        'range': float(z_sorted[-1] - z_sorted[0]),
+        'q1': float(z_sorted[int(n * 0.25)]),
+        'median': float(z_sorted[int(n * 0.5)]),
+        'q3': float(z_sorted[min(int(n * 0.75), n - 1)]),
+        'cv': abs(std / mean) * 100 if mean != 0 else 0.0,
+        'outliers': outliers,
+        'Ra': float(np.mean(np.abs(deviation))),
+        'Rq': std,
+        'Rp': peak,
+        'Rv': valley,
+        'Rt': peak + valley,
+        'Rz': float(z_sorted[-extremes:].mean() - z_sorted[:extremes].mean()),
+        'skewness': skewness,
+        'kurtosis': kurtosis,
+        'histogram': histogram,
+    }
+
+
+def get_profile_stats(profile_path, bins=DEFAULT_HISTOGRAM_BINS, leveling=None):
+    """
+    Statistics of a profile file (optionally leveled first), cached until the file changes
+
+    Returns:
+        Dict of statistics, or None if the profile has no X/Y/Z data
+    """
+    def compute():
+        arrays = load_profile_arrays_leveled(profile_path, leveling)
+        if arrays is None:
+            return None
+        return compute_profile_stats(arrays[2], bins)
+
+    return profile_stats_cache.get_or_compute(profile_path, ('stats', str(profile_path), bins, leveling), compute)
@@ -0,0 +1,178 @@
+"""
+Profile tile pyramids
+Multi-resolution, fixed-size tiles of large height maps stored as memory-mapped .npy files
+"""
+import io
+import json
+import warnings
+
+import numpy as np
+
+from .disk_cache import DiskCache, source_key
+from .profile_data import ProfileGrid
+from .profile_linecut import get_profile_grid
+
+# Tile edge length in samples
+TILE_SIZE = 256
+
+# Pyramid levels stored on the local disk (float32 .npy per level, memory-mapped when served)
+tile_cache = DiskCache('tiles', max_bytes=4 * 1024 * 1024 * 1024)
+
+
+def halve_grid(z):
+    """
+    Reduce a height map by 2 along both axes, preserving extremes
+
+    Each 2x2 block becomes its minimum or maximum, whichever lies further from the
+    block mean (as in profile downsampling), so narrow features survive zooming
+    out. Odd edges are padded with NaN; all-NaN blocks stay NaN.
+    """
+    ny, nx = z.shape
+    padded = np.full((ny + ny % 2, nx + nx % 2), np.nan, dtype=z.dtype)
+    padded[:ny, :nx] = z
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        low = np.nanmin(blocks, axis=(1, 3))
+        high = np.nanmax(blocks, axis=(1, 3))
+        mean = np.nanmean(blocks, axis=(1, 3))
+    return np.where(high - mean >= mean - low, high, low)
+
+
+def build_pyramid(z):
+    """
+    Build pyramid levels from the full-resolution map up to a single tile
+
+    Returns:
+        List of float32 arrays, index 0 = coarsest level (fits in one tile)
+    """
+    levels = [np.asarray(z, dtype=np.float32)]
+    while max(levels[-1].shape) > TILE_SIZE:
+        levels.append(halve_grid(levels[-1]))
+    return levels[::-1]
+
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+class TilePyramid:
+    """
+    Stored tile pyramid of one profile
+
+    Level 0 is the coarsest (a single tile); the last level is full resolution.
+    Tile (x, y) at level z covers columns x*TILE_SIZE... and rows y*TILE_SIZE...
+    of that level, rows running along +Y.
+    """
+
+    def __init__(self, key, meta):
+        self.key = key
+        self.meta = meta
+
+    @property
+    def level_count(self):
+        return len(self.meta['levels'])
+
+    def describe(self):
+        return self.meta
+
+    def has_tile(self, z, x, y):
+        if not 0 <= z < self.level_count:
+            return False
+        rows, cols = self.meta['levels'][z]['tiles']
+        return 0 <= y < rows and 0 <= x < cols
+
+    def has_level(self, z):
+        """Whether a level is still stored (levels can be evicted independently)"""
+        return tile_cache.get(f"{self.key}-{z}", '.npy') is not None
+
+    def tile(self, z, x, y):
+        """
+        Read one tile as a ProfileGrid (edge tiles may be smaller than TILE_SIZE)
+
+        Raises:
+            FileNotFoundError: When the level file was evicted from the cache
+        """
+        level_path = tile_cache.get(f"{self.key}-{z}", '.npy')
+        if level_path is None:
+            raise FileNotFoundError(f"Tile level {z} not cached")
+        level = np.load(level_path, mmap_mode='r')
+
+        row, col = y * TILE_SIZE, x * TILE_SIZE
+        block = np.array(level[row:row + TILE_SIZE, col:col + TILE_SIZE], dtype=np.float64)
+
+        info = self.meta['levels'][z]
+        dx, dy = info['spacing']['x'], info['spacing']['y']
+        origin = (info['origin']['x'] + col * dx, info['origin']['y'] + row * dy)
+        return ProfileGrid(origin, (dx, dy), block)
+
+
+def _build_meta(grid, levels):
+    (x0, y0), (dx, dy) = grid.origin, grid.spacing
+    finest = len(levels) - 1
+    level_meta = []
+    for z, level in enumerate(levels):
+        factor = 2 ** (finest - z)
+        ny, nx = level.shape
+        level_meta.append({
+            'z': z,
+            'shape': [ny, nx],
+            # Reduced cells sit at the centre of the block they summarize
+            'origin': {'x': x0 + dx * (factor - 1) / 2, 'y': y0 + dy * (factor - 1) / 2},
+            'spacing': {'x': dx * factor, 'y': dy * factor},
+            'tiles': [-(-ny // TILE_SIZE), -(-nx // TILE_SIZE)],
+        })
+
+    finite = grid.z[np.isfinite(grid.z)]
+    return {
+        'tile_size': TILE_SIZE,
+        'full_shape': list(grid.shape),
+        'z_range': {
+            'min': float(finite.min()) if finite.size else None,
+            'max': float(finite.max()) if finite.size else None,
+        },
+        'levels': level_meta,
+    }
+
+
+def get_tile_pyramid(profile_path, leveling=None, missing_level=None):
+    """
+    Get the tile pyramid of a profile, building and storing it on first access
+
+    Args:
+        missing_level: Level found evicted from the cache; the pyramid is rebuilt
+            unless another request has stored it again in the meantime
+
+    Returns:
+        TilePyramid, or None when the file has no X/Y/Z coordinates
+
+    Raises:
+        ValueError: When the profile is not a 2D regular grid
+    """
+    key = source_key(profile_path, 'tiles', leveling, TILE_SIZE)
+    if missing_level is None:
+        meta_path = tile_cache.get(key, '.json')
+        if meta_path is not None:
+            return TilePyramid(key, json.loads(meta_path.read_bytes()))
+
+    with tile_cache.lock(key):
+        # Another request (or worker) may have finished the build while we waited
+        meta_path = tile_cache.get(key, '.json')
+        if meta_path is not None:
+            pyramid = TilePyramid(key, json.loads(meta_path.read_bytes()))
+            if missing_level is None or pyramid.has_level(missing_level):
+                return pyramid
+
+        grid = get_profile_grid(profile_path, leveling)
+        if grid is None:
+            return None
+        levels = build_pyramid(grid.z)
+        for z, level in enumerate(levels):
+            tile_cache.put(f"{key}-{z}", _npy_bytes(level), '.npy')
+        meta = _build_meta(grid, levels)
+        # Metadata is written last: its presence means every level is stored
+        tile_cache.put(key, json.dumps(meta).encode('utf-8'), '.json')
+        return TilePyramid(key, meta)
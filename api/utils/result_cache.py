@@ -0,0 +1,77 @@
+"""
+In-process result caching
+LRU caches for values derived from source files, invalidated when the file changes
+"""
+import threading
+from collections import OrderedDict
+
+from .single_flight import SingleFlight
+
+
+def file_signature(path):
+    """Signature of a source file used to validate cached results"""
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileResultCache:
+    """
+    Thread-safe LRU cache of results computed from source files
+
+    Each entry remembers the signature (mtime and size) of the file it was computed
+    from; a lookup with a different signature is a miss and drops the stale entry.
+    Concurrent misses for the same key and signature share one computation.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._computations = SingleFlight()
+
+    def get(self, key, signature):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_signature, value = entry
+            if entry_signature != signature:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, signature, value):
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, path, key, compute):
+        """
+        Return the cached result for key, computing it from path on a miss
+
+        Args:
+            path: Source file the result is derived from
+            key: Cache key (should include the path and any parameters)
+            compute: Zero-argument callable producing the result
+        """
+        signature = file_signature(path)
+        value = self.get(key, signature)
+        if value is None:
+            value = self._computations.do((key, signature), lambda: self._compute(key, signature, compute))
+        return value
+
+    def _compute(self, key, signature, compute):
+        # A caller that was computing this key may have stored it since our lookup
+        value = self.get(key, signature)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, signature, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,72 @@
+"""
+Request coalescing
+Concurrent callers asking for the same key share one in-flight computation instead of repeating it
+"""
+import os
+import threading
+import weakref
+
+# Every SingleFlight, so a forked child can drop the calls it inherited
+_instances = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    # Calls in flight in other threads at fork time never finish in the child;
+    # waiting on them would block forever, so the child starts with none
+    for instance in list(_instances):
+        instance._calls = {}
+        instance._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _Call:
+    """One in-flight computation and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Per-key coalescing of concurrent calls within a worker process
+
+    The first caller for a key runs the function; callers arriving while it runs
+    wait for it and get the same result (or exception). Nothing is kept once the
+    call returns: caching stays with the caller, this only removes the duplicate
+    work of simultaneous misses. Results are shared, so callers must not mutate them.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def do(self, key, fn):
+        """Return fn() for key, joining a call for the same key already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
@@ -0,0 +1,76 @@
+"""
+Image thumbnails
+Downscaled WebP variants of measurement images, generated on the process pool and cached on disk
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from .disk_cache import DiskCache, source_key
+from .executors import run_in_process
+
+# Thumbnail widths produced; requested widths snap up to the next one to bound cache variants
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+
+# Lossy WebP is plenty for previews
+THUMBNAIL_QUALITY = 80
+
+# Thumbnails on the local disk, keyed by source file and width
+thumbnail_cache = DiskCache('thumbnails', max_bytes=512 * 1024 * 1024)
+
+
+def snap_thumbnail_width(width):
+    """Smallest supported thumbnail width >= width (the largest one for bigger requests)"""
+    for candidate in THUMBNAIL_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def to_displayable(image):
+    """Convert high bit-depth and exotic modes to 8-bit RGB(A)/L"""
+    if image.mode in ('I;16', 'I;16B', 'I;16L', 'I', 'F'):
+        # Stretch the data range to 8 bits (AFM TIFFs are often 16-bit or float)
+        values = np.asarray(image, dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        low, high = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+        scaled = np.clip((values - low) / ((high - low) or 1.0) * 255.0, 0, 255)
+        return Image.fromarray(np.nan_to_num(scaled).astype(np.uint8), mode='L')
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA')
+    if image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    return image
+
+
+def make_thumbnail(source_path, width):
+    """
+    Build a WebP thumbnail no wider than width, keeping the aspect ratio
+
+    Images narrower than width are re-encoded at their own size (never upscaled).
+    Pure Pillow work: runs inside the process pool.
+    """
+    with Image.open(source_path) as image:
+        # Let JPEG decoders skip detail we are about to throw away
+        image.draft('RGB', (width, width * 4))
+        image = to_displayable(image)
+        image.thumbnail((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format='WEBP', quality=THUMBNAIL_QUALITY, method=4)
+        return buffer.getvalue()
+
+
+def get_thumbnail(source_path, width):
+    """
+    Get the cached thumbnail of an image file, generating it on a miss
+
+    Returns:
+        Path of the cached WebP thumbnail
+    """
+    key = source_key(source_path, 'thumbnail', width)
+    return thumbnail_cache.get_or_create(
+        key,
+        lambda: run_in_process(make_thumbnail, str(source_path), width),
+        '.webp'
+    )
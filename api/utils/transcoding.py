@@ -0,0 +1,169 @@
+"""
+Image transcoding
+Full-size WebP/PNG versions of TIFF measurement images for browsers, built on the process pool and cached on disk
+"""
+import io
+import threading
+from functools import partial
+
+from PIL import Image
+
+from .disk_cache import DiskCache, source_key
+from .executors import get_process_executor, run_in_process
+from .result_cache import FileResultCache
+from .thumbnails import to_displayable
+
+# Web formats TIFFs can be transcoded to: name -> (Pillow format, mimetype, suffix)
+TRANSCODE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'png': ('PNG', 'image/png', '.png'),
+}
+DEFAULT_TRANSCODE_FORMAT = 'webp'
+
+# Source files browsers cannot display
+TRANSCODABLE_EXTENSIONS = {'.tif', '.tiff'}
+
+# Lossy WebP for viewing; PNG stays lossless (and keeps 16-bit height data)
+TRANSCODE_WEBP_QUALITY = 90
+
+# Largest width/height WebP can encode; bigger images are transcoded to PNG instead
+WEBP_MAX_DIMENSION = 16383
+WEBP_FALLBACK_FORMAT = 'png'
+
+# Image dimensions per source file, read from the file header
+image_size_cache = FileResultCache(max_entries=1024)
+
+# Transcoded images on the local disk, keyed by source file (path, mtime, size) and format
+transcode_cache = DiskCache('transcoded', max_bytes=2 * 1024 * 1024 * 1024)
+
+# Background transcodes outstanding per process
+MAX_BACKGROUND_TRANSCODES = 4
+
+# Background transcodes queued in this process, so a file is not queued twice
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def is_transcodable(path):
+    """Whether a file is a TIFF that is served transcoded to browsers"""
+    return path.suffix.lower() in TRANSCODABLE_EXTENSIONS
+
+
+def _read_image_size(source_path):
+    """(width, height) from an image file's header, or None when Pillow refuses to open it as too large"""
+    try:
+        with Image.open(source_path) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        return None
+
+
+def resolve_transcode_format(source_path, image_format):
+    """
+    Format an image is actually transcoded to when image_format is requested
+
+    WebP is swapped for PNG when the image exceeds WEBP_MAX_DIMENSION. Returns
+    None when the image is too large for Pillow to decode at all, in which case
+    the original file should be sent.
+    """
+    size = image_size_cache.get_or_compute(
+        source_path, ('size', str(source_path)), lambda: _read_image_size(source_path))
+    if size is None:
+        return None
+    if image_format == 'webp' and max(size) > WEBP_MAX_DIMENSION:
+        return WEBP_FALLBACK_FORMAT
+    return image_format
+
+
+def transcode_image(source_path, image_format):
+    """
+    Encode the first frame of an image file as WebP or PNG at full size
+
+    16-bit grayscale TIFFs stay 16-bit in PNG; for WebP (8-bit only) their data
+    range is stretched to 8 bits. Pure Pillow work: runs inside the process pool.
+    """
+    pillow_format = TRANSCODE_FORMATS[image_format][0]
+    with Image.open(source_path) as image:
+        image.seek(0)
+        if pillow_format == 'PNG' and image.mode in ('I;16', 'I;16B', 'I;16L'):
+            image = image.convert('I;16')
+        else:
+            image = to_displayable(image)
+        buffer = io.BytesIO()
+        if pillow_format == 'WEBP':
+            image.save(buffer, format='WEBP', quality=TRANSCODE_WEBP_QUALITY, method=4)
+        else:
+            image.save(buffer, format='PNG', compress_level=6)
+        return buffer.getvalue()
+
+
+def _transcode_key(source_path, image_format):
+    return source_key(source_path, 'transcode', image_format)
+
+
+def get_transcoded_image(source_path, image_format=DEFAULT_TRANSCODE_FORMAT):
+    """
+    Get the cached web version of an image file, transcoding it on a miss
+
+    The cache key includes the source mtime and size, so a rewritten TIFF is
+    transcoded again.
+
+    Returns:
+        Path of the cached WebP/PNG file
+    """
+    suffix = TRANSCODE_FORMATS[image_format][2]
+    return transcode_cache.get_or_create(
+        _transcode_key(source_path, image_format),
+        lambda: run_in_process(transcode_image, str(source_path), image_format),
+        suffix
+    )
+
+
+def _store_transcode(key, suffix, marker, future):
+    """Done callback of a background transcode: cache the result"""
+    try:
+        transcode_cache.put(key, future.result(), suffix)
+    except Exception as e:
+        print(f"Error transcoding {marker[0]}: {e}")
+    finally:
+        with _scheduled_lock:
+            _scheduled.discard(marker)
+
+
+def schedule_transcodes(source_paths, image_format=DEFAULT_TRANSCODE_FORMAT):
+    """
+    Transcode TIFFs on the process pool ahead of their first request
+
+    Files already cached or already queued are skipped, and at most
+    MAX_BACKGROUND_TRANSCODES are outstanding so on-demand work is not queued
+    behind a long backlog. Images over the WebP size limit are queued in the
+    format they will be served in. Returns the number queued.
+    """
+    queued = 0
+    for source_path in source_paths:
+        if not is_transcodable(source_path):
+            continue
+        try:
+            target_format = resolve_transcode_format(source_path, image_format)
+            if target_format is None:
+                continue
+            key = _transcode_key(source_path, target_format)
+        except FileNotFoundError:
+            continue
+        suffix = TRANSCODE_FORMATS[target_format][2]
+        if transcode_cache.path_for(key, suffix).exists():
+            continue
+        marker = (str(source_path), target_format)
+        with _scheduled_lock:
+            if marker in _scheduled or len(_scheduled) >= MAX_BACKGROUND_TRANSCODES:
+                continue
+            _scheduled.add(marker)
+        try:
+            future = get_process_executor().submit(transcode_image, str(source_path), target_format)
+        except Exception:
+            with _scheduled_lock:
+                _scheduled.discard(marker)
+            raise
+        future.add_done_callback(partial(_store_transcode, key, suffix, marker))
+        queued += 1
+    return queued
@@ -0,0 +1,95 @@
+"""
+Streaming ZIP archives
+Build a ZIP archive on the fly and yield it in chunks, without staging it on disk or in memory
+"""
+import time
+import zipfile
+
+# Read size when copying files into an archive
+ZIP_CHUNK_BYTES = 256 * 1024
+
+# Already-compressed formats are stored; deflating them costs CPU and saves nothing
+STORED_EXTENSIONS = {'.webp', '.png', '.jpg', '.jpeg', '.gif', '.zip'}
+
+
+class _ChunkSink:
+    """
+    Write-only file object collecting what ZipFile writes until it is drained
+
+    It has no tell()/seek(), so ZipFile writes data descriptors after each entry
+    instead of seeking back to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    @property
+    def pending(self):
+        return bool(self._chunks)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _zip_info(arcname, path):
+    """ZipInfo for a file, stored or deflated by extension"""
+    stat = path.stat()
+    date_time = time.localtime(stat.st_mtime)[:6]
+    if date_time[0] < 1980:
+        # Earliest timestamp ZIP can represent
+        date_time = (1980, 1, 1, 0, 0, 0)
+    zinfo = zipfile.ZipInfo(arcname, date_time=date_time)
+    zinfo.external_attr = 0o644 << 16
+    # Declared size lets ZipFile pick ZIP64 headers up front for very large files
+    zinfo.file_size = stat.st_size
+    if path.suffix.lower() in STORED_EXTENSIONS:
+        zinfo.compress_type = zipfile.ZIP_STORED
+    else:
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+    return zinfo
+
+
+def iter_zip_stream(entries, chunk_size=ZIP_CHUNK_BYTES):
+    """
+    Yield a ZIP archive of the given entries in bounded chunks
+
+    Args:
+        entries: Iterable of (arcname, source) where source is a Path (copied in
+            chunk_size reads) or bytes; it is consumed lazily, so sources can be
+            resolved while earlier entries are being sent
+        chunk_size: Read size for file sources
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+        for arcname, source in entries:
+            if isinstance(source, (bytes, bytearray)):
+                archive.writestr(arcname, source, compress_type=zipfile.ZIP_DEFLATED)
+            else:
+                zinfo = _zip_info(arcname, source)
+                with open(source, 'rb') as f, archive.open(zinfo, mode='w') as entry:
+                    while True:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        entry.write(chunk)
+                        if sink.pending:
+                            yield sink.drain()
+            # Data descriptor of the entry
+            if sink.pending:
+                yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+def safe_archive_name(name):
+    """Make a measurement or point name usable as a ZIP path component"""
+    return name.replace('#', '_').replace('/', '_').replace('\\', '_')
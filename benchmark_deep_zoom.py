@@ -0,0 +1,89 @@
+"""
+Benchmark deep zoom first-tile latency against downloading the full image
+Times the DZI pyramid build, the first tile a viewer shows and the initial viewport's tiles,
+and compares them with reading and transferring the whole file
+
+Usage: python benchmark_deep_zoom.py [IMAGE_PATH] [BANDWIDTH_MBIT] [VIEWPORT_PX]
+Without IMAGE_PATH a synthetic 8192x8192 16-bit TIFF is used.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Keep the benchmark's pyramid away from the server's cache
+os.environ.setdefault('AFM_CACHE_DIR', tempfile.mkdtemp(prefix='afm-dzi-bench-'))
+
+from api.utils.deep_zoom import DZI_TILE_SIZE, get_deep_zoom_image  # noqa: E402
+
+
+def make_synthetic_tiff(size=8192):
+    """Write a 16-bit height-map-like TIFF to a temp file"""
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    z = np.sin(x * 40) * np.cos(y * 30) + (x - 0.5) ** 2 + np.random.default_rng(0).normal(0, 0.02, (size, size))
+    z = ((z - z.min()) / (z.max() - z.min()) * 65535).astype(np.uint16)
+    path = Path(tempfile.mkdtemp(prefix='afm-dzi-src-')) / f'synthetic_{size}.tiff'
+    Image.fromarray(z).save(path)
+    return path
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def tiles_at(deep_zoom_image, level):
+    width, height = deep_zoom_image.level_size(level)
+    return [(col, row) for row in range(-(-height // DZI_TILE_SIZE)) for col in range(-(-width // DZI_TILE_SIZE))]
+
+
+def run_benchmark(image_path, bandwidth_mbit=100, viewport=1024):
+    file_bytes = image_path.stat().st_size
+    bytes_per_ms = bandwidth_mbit * 1e6 / 8 / 1000
+    print(f"Image: {image_path.name} ({file_bytes / 1e6:.1f} MB), link {bandwidth_mbit} Mbit/s, viewport {viewport}px")
+
+    # Full download: the server reads the file, the client waits for every byte
+    _, read_ms = timed(image_path.read_bytes)
+    download_ms = read_ms + file_bytes / bytes_per_ms
+    print(f"\nfull download              {download_ms:9.1f} ms  ({read_ms:.1f} ms read + transfer of {file_bytes / 1e6:.1f} MB)")
+
+    # First tile, cold: decode + store levels, then encode the single-tile overview level
+    deep_zoom_image, build_ms = timed(get_deep_zoom_image, image_path)
+    meta = deep_zoom_image.meta
+    overview_level = next(level for level in range(meta['max_level'] + 1) if len(tiles_at(deep_zoom_image, level)) > 1) - 1
+    tile_path, tile_ms = timed(deep_zoom_image.tile, overview_level, 0, 0, 'webp')
+    tile_bytes = tile_path.stat().st_size
+    first_tile_ms = build_ms + tile_ms + tile_bytes / bytes_per_ms
+    print(f"first tile (cold)          {first_tile_ms:9.1f} ms  ({build_ms:.1f} ms pyramid build + {tile_ms:.1f} ms encode, {tile_bytes / 1e3:.1f} kB)")
+    print(f"  pyramid: {meta['width']}x{meta['height']}, levels 0..{meta['max_level']}")
+
+    # First tile once the pyramid exists (other viewers, later sessions)
+    deep_zoom_image, lookup_ms = timed(get_deep_zoom_image, image_path)
+    cached_path, cached_ms = timed(deep_zoom_image.tile, overview_level, 0, 0, 'webp')
+    print(f"first tile (warm)          {lookup_ms + cached_ms + tile_bytes / bytes_per_ms:9.1f} ms  ({lookup_ms + cached_ms:.2f} ms server)")
+
+    # Initial viewport: the level whose size matches the viewport, every tile encoded cold
+    viewport_level = min(meta['max_level'], overview_level + max(0, int(np.ceil(np.log2(viewport / DZI_TILE_SIZE)))))
+    viewport_tiles = tiles_at(deep_zoom_image, viewport_level)
+    start = time.perf_counter()
+    viewport_bytes = sum(deep_zoom_image.tile(viewport_level, col, row, 'webp').stat().st_size for col, row in viewport_tiles)
+    viewport_encode_ms = (time.perf_counter() - start) * 1000
+    print(f"viewport tiles (cold)      {viewport_encode_ms + viewport_bytes / bytes_per_ms:9.1f} ms  "
+          f"(level {viewport_level}: {len(viewport_tiles)} tiles, {viewport_encode_ms:.1f} ms encode, {viewport_bytes / 1e3:.1f} kB)")
+
+    # A full-resolution tile after zooming in: encode cost only
+    _, deep_tile_ms = timed(deep_zoom_image.tile, meta['max_level'], 0, 0, 'webp')
+    print(f"full-resolution tile       {deep_tile_ms:9.1f} ms  (encode)")
+
+
+if __name__ == "__main__":
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] else make_synthetic_tiff()
+    bandwidth = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    viewport_px = int(sys.argv[3]) if len(sys.argv) > 3 else 1024
+    run_benchmark(source, bandwidth, viewport_px)
@@ -0,0 +1,120 @@
+"""
+Benchmark JSON serialization of real detail and profile payloads
+Compares Flask's default JSON provider with the AFM provider (stdlib and orjson backends),
+encoding through provider.response() exactly as jsonify() does
+
+Usage: python benchmark_json_serialization.py [TOOL] [MAX_FILES] [REPEAT]
+"""
+
+import pickle
+import sys
+import time
+from pathlib import Path
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from api.utils import json_provider
+from api.utils.json_provider import AFMJSONProvider
+from api.utils.measurement_data import detail_to_records, get_available_points, summary_to_records
+
+
+def load_detail_payloads(tool_name, max_files):
+    """Build detail responses the same way /afm-files/detail does"""
+    pickle_dir = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'data_dir_pickle'
+    payloads = []
+    for pickle_path in sorted(pickle_dir.glob('*.pkl'))[:max_files]:
+        with open(pickle_path, 'rb') as f:
+            data = pickle.load(f)
+        summary_records = summary_to_records(data.get('summary', {}))
+        data_detail = data.get('data', {})
+        payloads.append({
+            'success': True,
+            'data': {
+                'filename': pickle_path.stem,
+                'information': data.get('info', {}),
+                'summary': summary_records,
+                'data': detail_to_records(data_detail),
+                'available_points': get_available_points(data_detail, summary_records),
+            },
+        })
+    return payloads
+
+
+def load_profile_payloads(tool_name, max_files):
+    """Build profile responses the same way /afm-files/profile does"""
+    profile_dir = Path('itc-afm-data-platform-pjt-shared') / 'AFM_DB' / tool_name / 'profile_dir'
+    payloads = []
+    for profile_path in sorted(profile_dir.glob('*.pkl'))[:max_files]:
+        with open(profile_path, 'rb') as f:
+            profile_data = pickle.load(f)
+        if not isinstance(profile_data, dict) or not {'X', 'Y', 'Z'} <= set(profile_data):
+            continue
+        points = [
+            {'x': x, 'y': y, 'z': z}
+            for x, y, z in zip(profile_data['X'], profile_data['Y'], profile_data['Z'])
+        ]
+        payloads.append({'success': True, 'data': points, 'count': len(points)})
+    return payloads
+
+
+def time_encoder(name, dumps, payloads, repeat):
+    """Encode every payload `repeat` times and print throughput"""
+    try:
+        total_bytes = sum(len(dumps(payload)) for payload in payloads)
+    except (TypeError, ValueError) as e:
+        print(f"  {name:<28} failed: {type(e).__name__}: {e}")
+        return
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in payloads:
+            dumps(payload)
+    elapsed = time.perf_counter() - start
+
+    per_payload_ms = elapsed / (repeat * len(payloads)) * 1000
+    mb_per_s = total_bytes * repeat / elapsed / 1e6
+    print(f"  {name:<28} {per_payload_ms:9.3f} ms/payload {mb_per_s:9.1f} MB/s")
+
+
+def response_encoder(provider):
+    """Encode a payload the way jsonify() does: provider.response() with Flask's layout arguments"""
+    return lambda payload: provider.response(payload).get_data()
+
+
+def run_benchmark(tool_name='MAP608', max_files=20, repeat=20):
+    app = Flask(__name__)
+    default_encode = response_encoder(DefaultJSONProvider(app))
+    afm_encode = response_encoder(AFMJSONProvider(app))
+
+    def afm_stdlib_encode(obj):
+        # Force the standard library backend even when orjson is installed
+        saved, json_provider.orjson = json_provider.orjson, None
+        try:
+            return afm_encode(obj)
+        finally:
+            json_provider.orjson = saved
+
+    suites = {
+        'detail': load_detail_payloads(tool_name, max_files),
+        'profile': load_profile_payloads(tool_name, max_files),
+    }
+
+    for suite_name, payloads in suites.items():
+        print(f"\n{suite_name} payloads: {len(payloads)} ({tool_name})")
+        if not payloads:
+            print("  no payloads found, skipping")
+            continue
+        time_encoder('flask default', default_encode, payloads, repeat)
+        time_encoder('afm provider (json)', afm_stdlib_encode, payloads, repeat)
+        if json_provider.orjson is not None:
+            time_encoder('afm provider (orjson)', afm_encode, payloads, repeat)
+        else:
+            print("  afm provider (orjson)        skipped: orjson not installed")
+
+
+if __name__ == "__main__":
+    tool = sys.argv[1] if len(sys.argv) > 1 else 'MAP608'
+    max_files = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    run_benchmark(tool, max_files, repeat)
@@ -1,10 +1,28 @@
-import { computed } from 'vue'
+import { computed, ref } from 'vue'
 import { downloadCSV, formatMeasurementInfo, formatSummaryStatistics, formatProfileData, generateFilename } from '@/utils/exportUtils.js'
+import { afmService } from '@/services/afmService.js'
+import { imageService } from '@/services/imageService.js'
+
+// Selections up to this many measurements are exported through a direct download link;
+// larger ones run as a background export job on the server
+const DIRECT_EXPORT_LIMIT = 20
+const JOB_POLL_INTERVAL_MS = 1000
+
+// Start a browser download of a server URL
+function downloadUrl(url) {
+  const link = document.createElement('a')
+  link.href = url
+  link.download = ''
+
+  document.body.appendChild(link)
+  link.click()
+  document.body.removeChild(link)
+}
 
 /**
  * Composable for handling data downloads in ResultPage
  */
-export function useDataDownload(measurementInfo, summaryData, detailedData, profileData, selectedPoint) {
+export function useDataDownload(measurementInfo, summaryData, detailedData, profileData, selectedPoint, filename = null, toolName = null) {
   // Check if we have any data to download
   const hasData = computed(() => {
     return (measurementInfo.value && Object.keys(measurementInfo.value).length > 0) ||
@@ -73,12 +91,84 @@ export function useDataDownload(measurementInfo, summaryData, detailedData, prof
     }
   }
 
+  // Download the raw images of every point as one ZIP archive (built and streamed by the server)
+  function downloadRawImages() {
+    if (!filename?.value) {
+      return
+    }
+    downloadUrl(imageService.getRawImageExportUrl(filename.value, toolName?.value || 'MAP608'))
+  }
+
   return {
     hasData,
     downloadMeasurementInfo,
     downloadSummaryStatistics,
     downloadDetailedData,
     downloadProfileData,
-    downloadAllData
+    downloadAllData,
+    downloadRawImages
+  }
+}
+
+/**
+ * Composable for exporting many measurements as one CSV/Parquet file built on the server
+ * Small selections download directly; large ones run as a background job that is polled
+ */
+export function useMeasurementExport(toolName) {
+  const isExporting = ref(false)
+  const exportProgress = ref(null)
+  const exportError = ref(null)
+  let activeJobId = null
+
+  async function exportMeasurements(filenames, { format = 'csv', section = 'data' } = {}) {
+    if (!filenames || filenames.length === 0 || isExporting.value) {
+      return
+    }
+
+    const tool = toolName.value || 'MAP608'
+    exportError.value = null
+
+    if (filenames.length <= DIRECT_EXPORT_LIMIT) {
+      downloadUrl(afmService.getMeasurementExportUrl({ toolName: tool, format, section, filenames }))
+      return
+    }
+
+    isExporting.value = true
+    exportProgress.value = null
+    try {
+      let job = await afmService.submitJob('export', { tool, format, section, filenames })
+      activeJobId = job.id
+      while (!['succeeded', 'failed', 'cancelled'].includes(job.state)) {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+        job = await afmService.getJob(job.id)
+        exportProgress.value = job.progress
+      }
+
+      if (job.state === 'succeeded') {
+        downloadUrl(afmService.getJobResultUrl(job.id))
+      } else if (job.state === 'failed') {
+        exportError.value = job.error || 'Export failed'
+      }
+    } catch (error) {
+      console.error('❌ Error exporting measurements:', error)
+      exportError.value = error.message
+    } finally {
+      activeJobId = null
+      isExporting.value = false
+    }
+  }
+
+  async function cancelExport() {
+    if (activeJobId) {
+      await afmService.cancelJob(activeJobId)
+    }
+  }
+
+  return {
+    isExporting,
+    exportProgress,
+    exportError,
+    exportMeasurements,
+    cancelExport
   }
 }
\ No newline at end of file
@@ -1,5 +1,8 @@
 import api from './api'
 
+// Detail requests in flight, so pages asking for the same measurement at once share one request
+const pendingDetailRequests = new Map()
+
 /**
  * AFM Data Service
  * Handles AFM file data retrieval and profile data operations
@@ -15,12 +18,22 @@ export const afmService = {
   },
 
   // Get detailed AFM measurement data for a specific tool
+  // Concurrent calls for the same measurement (trend page, heatmap) share one request
   async getAfmFileDetail(filename, toolName = 'MAP608') {
+    const key = `${toolName}|${filename}`
+    if (pendingDetailRequests.has(key)) {
+      return pendingDetailRequests.get(key)
+    }
     console.log(`🔍 Fetching AFM detail for filename: "${filename}" from tool: ${toolName}`)
     const params = new URLSearchParams({ tool: toolName })
-    const response = await api.get(`/afm-files/detail/${encodeURIComponent(filename)}?${params}`)
-    console.log('📊 Detail response:', response)
-    return response
+    const request = api.get(`/afm-files/detail/${encodeURIComponent(filename)}?${params}`)
+      .then(response => {
+        console.log('📊 Detail response:', response)
+        return response
+      })
+      .finally(() => pendingDetailRequests.delete(key))
+    pendingDetailRequests.set(key, request)
+    return request
   },
 
   // Get profile data (x, y, z) for a specific measurement point and tool
@@ -134,5 +147,43 @@ export const afmService = {
         data: []
       }
     }
+  },
+
+  // Get the URL of a server-side CSV/Parquet export (streamed; open it as a download link)
+  // Either pass filenames or filter the catalog with query / dateFrom / dateTo
+  getMeasurementExportUrl({ toolName = 'MAP608', format = 'csv', section = 'data', filenames = [], query = '', dateFrom = '', dateTo = '' } = {}) {
+    const baseUrl = import.meta.env.VITE_API_BASE_URL || '/api'
+    const params = new URLSearchParams({ tool: toolName, format, section })
+    filenames.forEach(filename => params.append('filename', filename))
+    if (query) params.append('q', query)
+    if (dateFrom) params.append('date_from', dateFrom)
+    if (dateTo) params.append('date_to', dateTo)
+    return `${baseUrl}/afm-files/export?${params}`
+  },
+
+  // Submit a background job ('export', 'trend-data' or 'catalog-rebuild'); resolves to the queued job
+  // Poll getJob(job.id) until job.state is succeeded, failed or cancelled
+  async submitJob(type, params = {}) {
+    console.log(`🔍 Submitting ${type} job`, params)
+    const response = await api.post('/jobs', { type, params })
+    return response.job
+  },
+
+  // Get a background job's state and progress
+  async getJob(jobId) {
+    const response = await api.get(`/jobs/${jobId}`)
+    return response.job
+  },
+
+  // Cancel a queued or running background job
+  async cancelJob(jobId) {
+    const response = await api.post(`/jobs/${jobId}/cancel`)
+    return response.job
+  },
+
+  // Get the download URL of a finished job's result file
+  getJobResultUrl(jobId) {
+    const baseUrl = import.meta.env.VITE_API_BASE_URL || '/api'
+    return `${baseUrl}/jobs/${jobId}/result`
   }
-}
\ No newline at end of file
+}
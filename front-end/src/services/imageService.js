@@ -58,12 +58,27 @@ export const imageService = {
   },
 
   // Get URL for serving image by type (NEW: for AdditionalAnalysisImages component)
-  getImageUrlByType(filename, pointId, imageType, imageName, toolName = 'MAP608') {
+  // Pass width to get a cached WebP thumbnail instead of the full-size original
+  getImageUrlByType(filename, pointId, imageType, imageName, toolName = 'MAP608', width = null) {
     const baseUrl = import.meta.env.VITE_API_BASE_URL || '/api'
     const params = new URLSearchParams({ tool: toolName })
+    if (width) {
+      params.append('w', width)
+    }
     
     const url = `${baseUrl}/afm-files/image-file/${encodeURIComponent(filename)}/${encodeURIComponent(pointId)}/${imageType}/${encodeURIComponent(imageName)}?${params}`
     console.log(`🔗 [API] Typed image URL generated: ${url}`)
     return url
+  },
+
+  // Get the URL of a ZIP archive with the raw images of a measurement (optionally some points only)
+  getRawImageExportUrl(filename, toolName = 'MAP608', points = null) {
+    const baseUrl = import.meta.env.VITE_API_BASE_URL || '/api'
+    const params = new URLSearchParams({ tool: toolName })
+    if (points && points.length) {
+      params.append('points', points.join(','))
+    }
+    
+    return `${baseUrl}/afm-files/export-raw-images/${encodeURIComponent(filename)}?${params}`
   }
 }
\ No newline at end of file
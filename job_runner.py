@@ -0,0 +1,11 @@
+"""
+AFM Data Platform Backend - Background Job Runner
+Runs jobs queued through /api/jobs; under uwsgi it runs as a mule (see uwsgi.ini)
+Run with: python job_runner.py
+"""
+
+from api.utils.jobs import run_job_runner
+
+
+if __name__ == "__main__":
+    run_job_runner()